@@ -1,9 +1,112 @@
 # agents/sherlock.py
 from agents.base import OllamaBaseAgent
-import json
+from agents.results import AnomalyReport
+from utils.llm_scheduler import PRIORITY_CRITICAL
 import numpy as np
+import pandas as pd
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+# Detection rules from Sherlock's system prompt: (flag column, severity, anomaly type)
+RULES = [
+    ('zero_occupancy_waste', 'high', 'waste'),
+    ('consumption_spike', 'high', 'suspicious'),
+    ('sensor_out_of_range', 'critical', 'sensor_error'),
+    ('hvac_saturated', 'medium', 'malfunction'),
+    ('solar_at_night', 'medium', 'sensor_error'),
+]
+
+RECOMMENDED_ACTIONS = {
+    'waste': "Check HVAC schedule and lighting for the unoccupied zone",
+    'suspicious': "Investigate the consumption spike against equipment logs",
+    'sensor_error': "Inspect and recalibrate the sensor before trusting this data",
+    'malfunction': "Inspect the HVAC unit: it has been running at full capacity",
+}
+
+def evaluate_rules(frame, hvac_capacity=None, spike_ratio=3.0, ambiguous_ratio=2.0, waste_ratio=1.5,
+                   temp_limits=(-10, 50), max_hvac_hours=2.0, step_hours=0.25):
+    """
+    Apply Sherlock's detection rules to a whole zone/time DataFrame at once
+    
+    frame needs timestamp, total_consumption, occupancy, indoor_temp,
+    outdoor_temp and hvac_power; solar_generation (or solar_forecast),
+    zone_id and avg_consumption (historical same-hour average) are optional.
+    If avg_consumption is missing it is computed per zone and hour of day.
+    hvac_capacity: scalar, {zone_id: kW} dict, or None to skip the HVAC rule.
+    
+    Returns a DataFrame aligned with frame: one boolean column per rule,
+    consumption_ratio, anomaly_detected, severity, anomaly_type and
+    ambiguous (no rule fired but the row is borderline; ask the LLM).
+    """
+    timestamps = pd.to_datetime(frame['timestamp'])
+    hour = timestamps.dt.hour
+    zone = frame['zone_id'] if 'zone_id' in frame else pd.Series('zone', index=frame.index)
+    consumption = frame['total_consumption'].astype(float)
+    
+    if 'avg_consumption' in frame:
+        baseline = frame['avg_consumption'].astype(float)
+    else:
+        baseline = consumption.groupby([zone, hour]).transform('mean')
+    ratio = consumption / np.maximum(baseline, 1)
+    
+    out = pd.DataFrame(index=frame.index)
+    out['consumption_ratio'] = ratio
+    
+    # 1. High consumption + zero occupancy
+    out['zero_occupancy_waste'] = (frame['occupancy'] == 0) & (ratio > waste_ratio)
+    
+    # 2. Consumption 3x the hourly average
+    out['consumption_spike'] = ratio > spike_ratio
+    
+    # 3. Temperature sensors outside physical limits
+    low, high = temp_limits
+    out['sensor_out_of_range'] = (
+        ~frame['indoor_temp'].between(low, high) | ~frame['outdoor_temp'].between(low, high)
+    )
+    
+    # 4. HVAC at max capacity for too long (consecutive run per zone, in time order)
+    run_hours = pd.Series(0.0, index=frame.index)
+    if hvac_capacity is not None:
+        capacity = zone.map(hvac_capacity).astype(float) if isinstance(hvac_capacity, dict) else hvac_capacity
+        saturated = frame['hvac_power'].abs() >= 0.99 * capacity
+        order = np.lexsort((timestamps.to_numpy(), zone.to_numpy()))
+        sat = saturated.iloc[order]
+        zone_sorted = zone.iloc[order]
+        run_id = (sat != sat.groupby(zone_sorted).shift()).cumsum()
+        run_hours.iloc[order] = (sat.groupby([zone_sorted, run_id]).cumsum() * step_hours).to_numpy()
+    out['hvac_saturated'] = run_hours > max_hvac_hours
+    
+    # 5. Solar generation during nighttime
+    solar = frame['solar_generation'] if 'solar_generation' in frame else frame.get('solar_forecast')
+    if solar is not None:
+        out['solar_at_night'] = (solar > 0.5) & ((hour < 6) | (hour > 18))
+    else:
+        out['solar_at_night'] = False
+    
+    # Highest-severity rule wins
+    severity_rank = pd.Series(-1, index=frame.index)
+    out['anomaly_type'] = None
+    for column, severity, anomaly_type in RULES:
+        stronger = out[column] & (SEVERITY_RANK[severity] > severity_rank)
+        severity_rank = severity_rank.where(~stronger, SEVERITY_RANK[severity])
+        out.loc[stronger, 'anomaly_type'] = anomaly_type
+    
+    names = {rank: name for name, rank in SEVERITY_RANK.items()}
+    out['anomaly_detected'] = severity_rank >= 0
+    out['severity'] = severity_rank.map(names).fillna('low')
+    out['ambiguous'] = ~out['anomaly_detected'] & (
+        (ratio > ambiguous_ratio) | (run_hours > max_hvac_hours / 2)
+    )
+    return out
+
 
 class SherlockAgent(OllamaBaseAgent):
+    # Response fields callers use: streaming stops once they are complete
+    required_fields = ('anomaly_detected', 'severity', 'description', 'recommended_action',
+                       'block_optimization', 'alert_message')
+    num_predict = 320
+    priority = PRIORITY_CRITICAL  # scheduled ahead of advisory agents
+    
     def __init__(self):
         super().__init__(
             name="Sherlock",
@@ -40,8 +143,167 @@ Respond in JSON format:
 }
 """
     
+        # Rule fast path: severities listed here still go to the LLM
+        self.use_rules = True
+        self.llm_severities = ('critical',)
+    
+    def screen(self, frame, hvac_capacity=None):
+        """Evaluate the detection rules over a zone/time DataFrame (no LLM)"""
+        return evaluate_rules(frame, hvac_capacity)
+    
+    def rule_report(self, flags, row, current_time=None):
+        """Deterministic anomaly report for a row the rules have settled"""
+        if not flags['anomaly_detected']:
+            return AnomalyReport(
+                anomaly_detected=False,
+                severity="low",
+                description="All detection rules passed",
+                block_optimization=False,
+                consumption_ratio=float(flags['consumption_ratio']),
+                timestamp=str(current_time if current_time is not None else row.get('timestamp')),
+                source="rules"
+            )
+        
+        evidence = []
+        if flags['zero_occupancy_waste']:
+            evidence.append(f"{row['total_consumption']:.1f} kW with zero occupancy")
+        if flags['consumption_spike'] or flags['zero_occupancy_waste']:
+            evidence.append(f"Consumption {flags['consumption_ratio']:.1f}x the hourly average")
+        if flags['sensor_out_of_range']:
+            evidence.append(f"Temperature reading out of range (indoor {row['indoor_temp']:.1f}°C, "
+                            f"outdoor {row['outdoor_temp']:.1f}°C)")
+        if flags['hvac_saturated']:
+            evidence.append(f"HVAC at max capacity ({row['hvac_power']:.1f} kW) for over 2 hours")
+        if flags['solar_at_night']:
+            evidence.append("Solar generation reported at night")
+        
+        location = row.get('zone_name', row.get('zone_id', 'building'))
+        description = "; ".join(evidence)
+        return AnomalyReport(
+            anomaly_detected=True,
+            severity=flags['severity'],
+            anomaly_type=flags['anomaly_type'],
+            location=location,
+            description=description,
+            evidence=evidence,
+            recommended_action=RECOMMENDED_ACTIONS[flags['anomaly_type']],
+            block_optimization=flags['severity'] == 'critical',
+            alert_message=f"{location}: {description}",
+            consumption_ratio=float(flags['consumption_ratio']),
+            timestamp=str(current_time if current_time is not None else row.get('timestamp')),
+            source="rules"
+        )
+    
+    def needs_llm(self, flags):
+        """True if the rules can't settle this row on their own"""
+        return bool(flags['ambiguous']) or (
+            bool(flags['anomaly_detected']) and flags['severity'] in self.llm_severities
+        )
+    
+    def analyze_frame(self, frame, hvac_capacity=None, max_llm_calls=None, include_normal=False):
+        """
+        Screen every row of a zone/time DataFrame with the rules and escalate
+        only ambiguous rows (and severities in llm_severities) to the LLM
+        Returns a list of anomaly reports (flagged rows only unless include_normal)
+        """
+        flags = self.screen(frame, hvac_capacity)
+        if 'avg_consumption' in frame:
+            baseline = frame['avg_consumption']
+        else:
+            baseline = frame['total_consumption'] / np.maximum(flags['consumption_ratio'], 1e-9)
+        
+        escalate = flags['ambiguous'] | (flags['anomaly_detected'] & flags['severity'].isin(self.llm_severities))
+        selected = flags['anomaly_detected'] | escalate
+        if include_normal:
+            selected[:] = True
+        
+        reports = []
+        llm_calls = 0
+        for idx in flags.index[selected]:
+            row = frame.loc[idx]
+            row_flags = flags.loc[idx]
+            if escalate[idx] and (max_llm_calls is None or llm_calls < max_llm_calls):
+                llm_calls += 1
+                state = {
+                    'total_consumption': float(row['total_consumption']),
+                    'occupancy': int(row['occupancy']),
+                    'indoor_temp': float(row['indoor_temp']),
+                    'outdoor_temp': float(row['outdoor_temp']),
+                    'hvac_power': float(row['hvac_power']),
+                    'solar_generation': float(row.get('solar_generation', row.get('solar_used', 0)))
+                }
+                historical_avg = {'avg_consumption': float(baseline[idx]), 'avg_occupancy': float(row['occupancy'])}
+                report = self._analyze_llm(pd.to_datetime(row['timestamp']), state, historical_avg)
+            else:
+                report = self.rule_report(row_flags, row)
+            report.setdefault('zone_id', row.get('zone_id'))
+            reports.append(report)
+        return reports
+    
     def analyze(self, current_time, building_state, historical_avg):
-        """Detect anomalies in building data"""
+        """Detect anomalies in building data (rules first, LLM only when needed)"""
+        
+        if self.use_rules:
+            state = {**building_state, 'timestamp': current_time,
+                     'avg_consumption': historical_avg['avg_consumption']}
+            flags = self.screen(pd.DataFrame([state])).iloc[0]
+            if not self.needs_llm(flags):
+                return self.rule_report(flags, state, current_time)
+        
+        return self._analyze_llm(current_time, building_state, historical_avg)
+    
+    def analyze_batch(self, current_time, zone_states, historical_avgs):
+        """
+        Anomaly reports for many zones at one timestamp
+        
+        The rules screen every zone; only the zones they can't settle go to
+        the LLM, together in one request. Returns {zone_id: report}.
+        """
+        reports = {}
+        escalated = {}
+        for zone_id, building_state in zone_states.items():
+            historical_avg = historical_avgs[zone_id]
+            state = {**building_state, 'timestamp': current_time,
+                     'avg_consumption': historical_avg['avg_consumption']}
+            flags = self.screen(pd.DataFrame([state])).iloc[0]
+            if self.use_rules and not self.needs_llm(flags):
+                reports[zone_id] = self.rule_report(flags, state, current_time)
+            else:
+                escalated[zone_id] = (flags, state)
+        if not escalated:
+            return reports
+        
+        header = "zone_id | consumption kW | avg kW | ratio | occupancy | indoor °C | HVAC kW | solar kW"
+        rows = {}
+        for zone_id in escalated:
+            state = zone_states[zone_id]
+            avg = historical_avgs[zone_id]['avg_consumption']
+            rows[zone_id] = (
+                f"{zone_id} | {state['total_consumption']:.1f} | {avg:.1f} | "
+                f"{state['total_consumption'] / max(avg, 1):.2f} | {state['occupancy']} | "
+                f"{state['indoor_temp']:.1f} | {state['hvac_power']:.1f} | {state['solar_generation']:.1f}"
+            )
+        outdoor = next(iter(zone_states.values()))['outdoor_temp']
+        shared_context = f"""
+Current Time: {current_time} | Outdoor Temperature: {outdoor:.1f}°C
+Averages are the last 24h at the same hour. Analyze each zone for anomalies,
+equipment malfunctions, or wasteful situations.
+"""
+        llm_reports = self.think_batch(shared_context, header, rows, self.system_prompt,
+                                       schema=AnomalyReport)
+        for zone_id, report in llm_reports.items():
+            flags, state = escalated[zone_id]
+            if report.get('fallback'):
+                reports[zone_id] = self.rule_report(flags, state, current_time)
+                continue
+            report['consumption_ratio'] = float(flags['consumption_ratio'])
+            report['timestamp'] = str(current_time)
+            report['source'] = 'llm'
+            reports[zone_id] = report
+        return reports
+    
+    def _analyze_llm(self, current_time, building_state, historical_avg):
+        """Ask the LLM for an anomaly analysis"""
         
         # Calculate anomaly indicators
         consumption_ratio = building_state['total_consumption'] / max(historical_avg['avg_consumption'], 1)
@@ -67,24 +329,17 @@ Historical Context (last 24h same hour):
 Analyze this data for anomalies, equipment malfunctions, or wasteful situations.
 """
         
-        response = self.think(context, self.system_prompt)
+        # Fallback: no anomaly detected
+        anomaly_report = self.think_result(context, self.system_prompt, AnomalyReport, fallback={
+            "anomaly_detected": False,
+            "severity": "low",
+            "description": "Analysis completed normally",
+            "block_optimization": False
+        })
         
-        try:
-            anomaly_report = json.loads(response)
-            
-            # Add computed metrics
-            anomaly_report['consumption_ratio'] = consumption_ratio
-            anomaly_report['timestamp'] = str(current_time)
-            
-            return anomaly_report
+        # Add computed metrics
+        anomaly_report['consumption_ratio'] = consumption_ratio
+        anomaly_report['timestamp'] = str(current_time)
+        anomaly_report['source'] = 'llm'
             
-        except json.JSONDecodeError as e:
-            print(f"⚠️  Sherlock JSON parse error: {e}")
-            print(f"Raw response: {response[:200]}")
-            # Fallback: no anomaly detected
-            return {
-                "anomaly_detected": False,
-                "severity": "low",
-                "description": "Analysis completed normally",
-                "block_optimization": False
-            }
\ No newline at end of file
+        return anomaly_report
\ No newline at end of file
@@ -1,62 +1,529 @@
 # agents/ollama_base_agent.py
+import asyncio
+import os
 import requests
 import json
+import threading
 import time
+from requests.adapters import HTTPAdapter
+from utils.llm_cache import LLMResponseCache
+from utils.json_stream import JSONObjectStream
+from utils.agent_metrics import AgentMetrics, metric_tags
+from utils.llm_scheduler import LLMScheduler, PRIORITY_ADVISORY
+
+
+def generate_url(host=None):
+    """
+    Generate-API endpoint for a model server: host is "host:port" or a URL,
+    defaulting to $OLLAMA_HOST (as for the Ollama CLI), then localhost:11434
+    """
+    host = host or os.environ.get('OLLAMA_HOST') or 'localhost:11434'
+    if '://' not in host:
+        host = f"http://{host}"
+    scheme, _, address = host.rstrip('/').partition('://')
+    if ':' not in address:
+        address += ':11434'
+    return f"{scheme}://{address}/api/generate"
+
 
 class OllamaBaseAgent:
+    # Model server every new agent talks to (see generate_url)
+    default_url = generate_url()
+    
+    # Max simultaneous requests per model server, shared by every agent instance
+    default_concurrency = 2
+    _backend_limits = {}
+    _backend_limits_lock = threading.Lock()
+    
+    # Shared keep-alive HTTP transport (one pooled session for all agents)
+    pool_size = 16
+    _session = None
+    _async_sessions = {}
+    _transport_lock = threading.Lock()
+    
+    # Shared response cache (None = disabled), see enable_cache()
+    cache = None
+    
+    # Shared call/parse instrumentation (None = disabled), see enable_metrics()
+    metrics = None
+    
+    # Shared priority queue and request coalescing (None = disabled), see enable_scheduler()
+    scheduler = None
+    priority = PRIORITY_ADVISORY
+    
+    # Streaming early exit: generation stops once these top-level fields are
+    # complete; num_predict caps the tokens generated (None = model default)
+    required_fields = ()
+    num_predict = None
+    stream = True
+    
+    # Returned by think() when the model server can't be reached
+    FAILED_RESPONSE = '{"error": "Agent failed to respond"}'
+    
+    # Appended to the system prompt when several zones share one request
+    BATCH_INSTRUCTIONS = """
+BATCH MODE: the context describes several zones, one table row per zone.
+Return ONE JSON object whose keys are the zone_id values from the table.
+Each value is a JSON object in the single-zone format above.
+Include every zone_id exactly once.
+"""
+    
     def __init__(self, name, role, model="mistral:latest"): 
         self.name = name
         self.role = role
         self.model = model
-        self.ollama_url = "http://localhost:11434/api/generate"
+        self.ollama_url = self.default_url
         self.max_retries = 4
+        self.max_reasks = 1  # follow-up calls for fields a reply got wrong (think_result)
+        self.request_timeout = 120  # seconds per attempt
+        self.options = {
+            "temperature": 0.7,
+        }
+        if self.num_predict is not None:
+            self.options["num_predict"] = self.num_predict  # Limit response length for speed
     
-    def think(self, context, system_prompt):
-        """Make agent think using Ollama with retry logic"""
+    @classmethod
+    def set_concurrency_limit(cls, limit, url=None):
+        """Cap concurrent requests to a model server (all servers if url is None)"""
+        with cls._backend_limits_lock:
+            if url is None:
+                cls.default_concurrency = limit
+                cls._backend_limits.clear()
+            else:
+                cls._backend_limits[url] = threading.BoundedSemaphore(limit)
+    
+    def _backend_slot(self):
+        """Semaphore guarding this agent's model server (a priority slot when the scheduler is on)"""
+        if self.scheduler is not None:
+            return self.scheduler.slot(self.ollama_url, self.priority)
+        with self._backend_limits_lock:
+            if self.ollama_url not in self._backend_limits:
+                self._backend_limits[self.ollama_url] = threading.BoundedSemaphore(self.default_concurrency)
+            return self._backend_limits[self.ollama_url]
+    
+    @classmethod
+    def configure_transport(cls, pool_size=None):
+        """Set the connection pool size and rebuild the shared HTTP session"""
+        with cls._transport_lock:
+            if pool_size is not None:
+                cls.pool_size = pool_size
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
         
+    @classmethod
+    def session(cls):
+        """Shared requests.Session with a keep-alive connection pool"""
+        with cls._transport_lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cls.pool_size, pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._session = session
+            return cls._session
+    
+    @classmethod
+    def enable_cache(cls, path='agent_cache.sqlite', **kwargs):
+        """Cache responses on disk for every agent (kwargs go to LLMResponseCache)"""
+        OllamaBaseAgent.cache = LLMResponseCache(path, **kwargs)
+        return OllamaBaseAgent.cache
+    
+    @classmethod
+    def disable_cache(cls):
+        if OllamaBaseAgent.cache is not None:
+            OllamaBaseAgent.cache.close()
+        OllamaBaseAgent.cache = None
+    
+    @classmethod
+    def enable_metrics(cls, path=None, **kwargs):
+        """Record latency, tokens, retries and parse outcomes for every agent (kwargs go to AgentMetrics)"""
+        OllamaBaseAgent.disable_metrics()
+        OllamaBaseAgent.metrics = AgentMetrics(path, **kwargs)
+        return OllamaBaseAgent.metrics
+    
+    @classmethod
+    def disable_metrics(cls):
+        if OllamaBaseAgent.metrics is not None:
+            OllamaBaseAgent.metrics.close()
+        OllamaBaseAgent.metrics = None
+    
+    @classmethod
+    def enable_scheduler(cls, concurrency=None, **kwargs):
+        """
+        Route every agent's requests through one LLMScheduler: duplicate
+        in-flight prompts are sent once and each model server gets
+        `concurrency` slots (default_concurrency by default), granted by
+        agent priority. Replaces the set_concurrency_limit() semaphores.
+        """
+        concurrency = cls.default_concurrency if concurrency is None else concurrency
+        OllamaBaseAgent.scheduler = LLMScheduler(concurrency, **kwargs)
+        return OllamaBaseAgent.scheduler
+    
+    @classmethod
+    def disable_scheduler(cls):
+        OllamaBaseAgent.scheduler = None
+    
+    def _record(self, event='call', **fields):
+        if self.metrics is not None:
+            self.metrics.record(self.name, event, **fields)
+    
+    def _cached(self, context, system_prompt, options, required=()):
+        """
+        (cache key, cached response or None); key is None when caching is off
+        
+        The key covers the request's options (token budget included) and its
+        early-exit fields, so a reply cut short for one request is never
+        served to a request that wants more of the object.
+        """
+        if self.cache is None:
+            return None, None
+        key = self.cache.key(self.model, system_prompt, context, {**options, 'required': list(required)})
+        return key, self.cache.get(key)
+    
+    def _store(self, key, text):
+        """Cache a response if caching is on and the response is valid JSON"""
+        if key is None:
+            return
+        try:
+            json.loads(text)
+        except ValueError:
+            return
+        self.cache.put(key, text, self.model)
+    
+    @classmethod
+    async def close_async_sessions(cls):
+        """Close the aiohttp session athink() opened on the running event loop"""
+        loop = asyncio.get_running_loop()
+        session_loop, session = cls._async_sessions.pop(id(loop), (None, None))
+        if session_loop is loop:
+            await session.close()
+    
+    def _payload(self, context, system_prompt, num_predict=None):
+        """Generate-API request body for this agent"""
         full_prompt = f"""{system_prompt}
 
 {context}
 
 Respond ONLY with valid JSON. No markdown, no code blocks, just pure JSON."""
 
-        payload = {
+        options = self.options
+        if num_predict is not None:
+            options = {**options, "num_predict": num_predict}
+        return {
             "model": self.model,
             "prompt": full_prompt,
-            "stream": False,
+            "stream": self.stream,
             "format": "json",  # Force JSON output
-            "options": {
-                "temperature": 0.7,
-                #"num_predict": 256  # Limit response length for speed
-            }
+            "options": options
         }
+    
+    @staticmethod
+    def _extract_text(result):
+        """Generated text from a generate-API response, without markdown artifacts"""
+        generated_text = result.get('response', '{}')
+        return generated_text.replace('```json', '').replace('```', '').strip()
+    
+    @staticmethod
+    def _usage(result, usage):
+        """Copy the server's token counts (if reported) into usage"""
+        if result.get('prompt_eval_count') is not None:
+            usage['prompt_tokens'] = result['prompt_eval_count']
+        if result.get('eval_count') is not None:
+            usage['completion_tokens'] = result['eval_count']
+    
+    @classmethod
+    def _stream_chunk(cls, parser, line, required, usage=None):
+        """
+        Feed one line of a streamed generate-API response (one JSON chunk per
+        line) to the parser; returns True when reading can stop: the model is
+        done or the required fields are complete. A non-streamed reply is a
+        single line and reads the same way.
+        usage: dict collecting token counts; until the final chunk reports
+        them, completion tokens are estimated as one per chunk. The prompt
+        count only arrives with the final chunk, so it stays None when
+        reading stops early.
+        """
+        if not line or not line.strip():
+            return False
+        chunk = json.loads(line)
+        if chunk.get('error'):
+            raise RuntimeError(chunk['error'])
+        parser.feed(chunk.get('response', ''))
+        if usage is not None:
+            if chunk.get('response'):
+                usage['completion_tokens'] = (usage.get('completion_tokens') or 0) + 1
+            cls._usage(chunk, usage)
+        return bool(chunk.get('done')) or bool(required and parser.has(required))
+    
+    @classmethod
+    def _stream_text(cls, parser):
+        """Generated text of a streamed response (closed at the last complete field on early exit)"""
+        text = parser.result() if parser.closed or parser.fields else parser.text
+        return cls._extract_text({'response': text})
+    
+    def think(self, context, system_prompt, required=None, num_predict=None):
+        """
+        Make agent think using Ollama with retry logic
+        required: fields that end a streamed response early (default required_fields)
+        num_predict: token budget for this call (default from the agent's options)
+        """
+        
+        started = time.perf_counter()
+        required = self.required_fields if required is None else required
+        payload = self._payload(context, system_prompt, num_predict)
+        cache_key, cached = self._cached(context, system_prompt, payload['options'], required)
+        if cached is not None:
+            self._record(latency_s=time.perf_counter() - started, cached=True)
+            return cached
+        
+        if self.scheduler is None:
+            return self._generate(payload, required, cache_key, started)
+        
+        # Identical requests already in flight share that reply
+        generated_text, sent = self.scheduler.run(
+            self.scheduler.key(self.ollama_url, payload, required),
+            lambda: self._generate(payload, required, cache_key, started)
+        )
+        if not sent:
+            self._record(latency_s=time.perf_counter() - started, coalesced=True)
+        return generated_text
+    
+    def _generate(self, payload, required, cache_key, started):
+        """POST payload with retries; returns the generated text (FAILED_RESPONSE on failure)"""
+        session = self.session()
+        call = {'retries': 0, 'timeouts': 0, 'queue_wait_s': 0.0}
         
         # Retry logic with exponential backoff
         for attempt in range(self.max_retries):
+            call['retries'] = attempt
+            usage = {'prompt_tokens': None, 'completion_tokens': None}   # None: not reported
             try:
-                timeout = 120  # 120s per attempt
-                response = requests.post(self.ollama_url, json=payload, timeout=timeout)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract the generated text
-                generated_text = result.get('response', '{}')
-                
-                # Clean up any markdown artifacts
-                generated_text = generated_text.replace('```json', '').replace('```', '').strip()
+                queued = time.perf_counter()
+                with self._backend_slot():
+                    call['queue_wait_s'] += time.perf_counter() - queued
+                    if payload['stream']:
+                        response = session.post(self.ollama_url, json=payload, timeout=self.request_timeout,
+                                                stream=True)
+                        try:
+                            response.raise_for_status()
+                            parser = JSONObjectStream()
+                            for line in response.iter_lines():
+                                if self._stream_chunk(parser, line, required, usage):
+                                    break
+                            generated_text = self._stream_text(parser)
+                        finally:
+                            response.close()  # mid-stream close stops generation server-side
+                    else:
+                        response = session.post(self.ollama_url, json=payload, timeout=self.request_timeout)
+                        response.raise_for_status()
+                        result = response.json()
+                        self._usage(result, usage)
+                        generated_text = self._extract_text(result)
                 
+                self._store(cache_key, generated_text)
+                self._record(latency_s=time.perf_counter() - started, **call, **usage)
                 return generated_text
                 
             except requests.exceptions.Timeout:
+                call['timeouts'] += 1
                 if attempt < self.max_retries - 1:
                     wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
                     print(f"   ⏳ {self.name} timeout, retrying in {wait_time}s... (attempt {attempt + 1}/{self.max_retries})")
                     time.sleep(wait_time)
                 else:
                     print(f"❌ {self.name} error: Timeout after {self.max_retries} attempts")
-                    return '{"error": "Agent failed to respond"}'
+                    self._record(latency_s=time.perf_counter() - started, error='timeout', **call)
+                    return self.FAILED_RESPONSE
+            except Exception as e:
+                print(f"❌ {self.name} error: {e}")
+                self._record(latency_s=time.perf_counter() - started, error=str(e), **call)
+                return self.FAILED_RESPONSE
+        
+        return self.FAILED_RESPONSE
+    
+    async def athink(self, context, system_prompt, required=None, num_predict=None):
+        """Async variant of think() on a pooled aiohttp session (one per event loop)"""
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("athink() requires aiohttp: pip install aiohttp")
+        
+        loop = asyncio.get_running_loop()
+        session_loop, session = self._async_sessions.get(id(loop), (None, None))
+        if session_loop is not loop or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.default_concurrency)
+            session = aiohttp.ClientSession(connector=connector)
+            self._async_sessions[id(loop)] = (loop, session)
+        
+        started = time.perf_counter()
+        required = self.required_fields if required is None else required
+        payload = self._payload(context, system_prompt, num_predict)
+        cache_key, cached = self._cached(context, system_prompt, payload['options'], required)
+        if cached is not None:
+            self._record(latency_s=time.perf_counter() - started, cached=True)
+            return cached
+        
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        call = {'retries': 0, 'timeouts': 0}    # the connector queues requests, so no queue_wait_s
+        
+        # Retry logic with exponential backoff
+        for attempt in range(self.max_retries):
+            call['retries'] = attempt
+            usage = {'prompt_tokens': None, 'completion_tokens': None}   # None: not reported
+            try:
+                async with session.post(self.ollama_url, json=payload, timeout=timeout) as response:
+                    response.raise_for_status()
+                    if payload['stream']:
+                        parser = JSONObjectStream()
+                        async for line in response.content:
+                            if self._stream_chunk(parser, line.decode(), required, usage):
+                                break
+                        generated_text = self._stream_text(parser)
+                    else:
+                        result = await response.json(content_type=None)
+                        self._usage(result, usage)
+                        generated_text = self._extract_text(result)
+                self._store(cache_key, generated_text)
+                self._record(latency_s=time.perf_counter() - started, **call, **usage)
+                return generated_text
+            
+            except asyncio.TimeoutError:
+                call['timeouts'] += 1
+                if attempt < self.max_retries - 1:
+                    wait_time = 2 ** attempt
+                    print(f"   ⏳ {self.name} timeout, retrying in {wait_time}s... (attempt {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                else:
+                    print(f"❌ {self.name} error: Timeout after {self.max_retries} attempts")
+                    self._record(latency_s=time.perf_counter() - started, error='timeout', **call)
+                    return self.FAILED_RESPONSE
             except Exception as e:
                 print(f"❌ {self.name} error: {e}")
-                return '{"error": "Agent failed to respond"}'
+                self._record(latency_s=time.perf_counter() - started, error=str(e), **call)
+                return self.FAILED_RESPONSE
+        
+        return self.FAILED_RESPONSE
+    
+    @staticmethod
+    def _describe(problems):
+        return ", ".join(f"{field} ({problem})" for field, problem in problems.items())
+    
+    def _reask_context(self, context, response, problems):
+        """Follow-up prompt asking only for the fields a reply got wrong"""
+        return f"""{context}
+Your previous reply was: {response[:400]}
+These fields were missing or invalid: {self._describe(problems)}.
+Reply with a JSON object holding only these fields, corrected."""
+    
+    def think_result(self, context, system_prompt, schema, fallback=None):
+        """
+        think() parsed into a typed result (an agents.results schema)
+        
+        Required fields the reply left out or got wrong are asked for again,
+        and only those (up to max_reasks follow-ups); whatever is still
+        missing comes from fallback and the result is marked "fallback".
+        """
+        response = self.think(context, system_prompt)
+        result, problems = schema.parse(response)
+        first_problems = sorted(problems)
+        reasks = 0
+        for _ in range(self.max_reasks):
+            if not problems or response == self.FAILED_RESPONSE:
+                break
+            reasks += 1
+            with metric_tags(reask=True):
+                response = self.think(self._reask_context(context, response, problems), system_prompt,
+                                      required=tuple(problems))
+            result, problems = schema.parse(response, base=result)
+        
+        self._record('parse', results=1, failed=int(bool(first_problems)), problems=first_problems,
+                     reasks=reasks, fallbacks=int(bool(problems)))
+        if problems:
+            print(f"   ⚠️  {self.name}: invalid reply ({self._describe(problems)}), using fallback values")
+            return schema.complete(result, fallback or {})
+        return result
+    
+    @staticmethod
+    def parse_batch(response, zone_ids, required=(), validate=None):
+        """
+        {zone_id: entry} for the zones a batch reply answered properly
+        
+        Accepts an object keyed by zone_id (optionally wrapped in "zones") or a
+        list of objects carrying a zone_id field. Entries that are not objects,
+        lack a required field or fail validate(entry) are left out.
+        """
+        try:
+            data = json.loads(response)
+        except (TypeError, ValueError):
+            return {}
+        if isinstance(data, dict) and isinstance(data.get('zones'), (dict, list)):
+            data = data['zones']
+        if isinstance(data, list):
+            data = {str(item.get('zone_id')): item for item in data if isinstance(item, dict)}
+        if not isinstance(data, dict):
+            return {}
+        
+        entries = {}
+        for zone_id in zone_ids:
+            entry = data.get(zone_id)
+            if not isinstance(entry, dict) or any(field not in entry for field in required):
+                continue
+            if validate is not None and not validate(entry):
+                continue
+            entries[zone_id] = entry
+        return entries
+    
+    def think_batch(self, shared_context, header, rows, system_prompt, required=(), validate=None,
+                    fallback=None, retry_missing=True, schema=None):
+        """
+        One model call covering many zones
+        
+        shared_context: text common to all zones (time, prices, ...)
+        header / rows: table header and {zone_id: table row}
+        schema: an agents.results type; entries are parsed into it and the
+        retry tells the model which fields it got wrong
+        Zones missing from the reply (or failing validation) are asked again
+        once in a smaller batch, then filled with fallback(zone_id).
+        Returns {zone_id: dict or schema}; fallback entries carry "fallback": True.
+        """
+        results = {}
+        partial = {}    # schema results with invalid required fields, per zone
+        problems = {}
+        pending = list(rows)
+        failed = None
+        for attempt in range(2 if retry_missing else 1):
+            if not pending:
+                break
+            table = "\n".join([header] + [rows[zone_id] for zone_id in pending])
+            context = f"{shared_context}\nZones ({len(pending)}):\n{table}\n"
+            if problems:
+                context += "Fix these fields from your previous reply:\n" + "\n".join(
+                    f"- {zone_id}: {self._describe(problems[zone_id])}" for zone_id in pending if zone_id in problems
+                ) + "\n"
+            budget = None if self.num_predict is None else self.num_predict * len(pending) + 32
+            with metric_tags(zones=len(pending), reask=attempt > 0):
+                response = self.think(context, system_prompt + self.BATCH_INSTRUCTIONS,
+                                      required=tuple(pending), num_predict=budget)
+            if schema is None:
+                results.update(self.parse_batch(response, pending, required, validate))
+            else:
+                for zone_id, entry in self.parse_batch(response, pending).items():
+                    result, issues = schema.parse(entry, base=partial.get(zone_id))
+                    if issues:
+                        partial[zone_id], problems[zone_id] = result, issues
+                    else:
+                        results[zone_id] = result
+            pending = [zone_id for zone_id in pending if zone_id not in results]
+            if failed is None:
+                failed = len(pending)
         
-        return '{"error": "Agent failed to respond"}'
\ No newline at end of file
+        self._record('parse', results=len(rows), failed=failed or 0, reasks=int(bool(failed) and retry_missing),
+                     fallbacks=len(pending))
+        for zone_id in pending:
+            defaults = fallback(zone_id) if fallback else {}
+            if schema is None:
+                results[zone_id] = {**defaults, 'fallback': True}
+            else:
+                results[zone_id] = schema.complete(partial.get(zone_id, {}), defaults)
+        return results
\ No newline at end of file
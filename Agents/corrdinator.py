@@ -1,8 +1,16 @@
 # agents/orchestrator.py
 from agents.base import OllamaBaseAgent
-import json
+from agents.results import Decision, Explanation
+from controllers import SetpointOptimizer
+from utils.llm_scheduler import PRIORITY_CRITICAL
+import numpy as np
 
 class OrchestratorAgent(OllamaBaseAgent):
+    # Response fields callers use: streaming stops once they are complete
+    required_fields = ('decision', 'hvac_setpoint', 'hvac_power', 'reasoning')
+    num_predict = 256
+    priority = PRIORITY_CRITICAL  # scheduled ahead of advisory agents
+    
     def __init__(self):
         super().__init__(
             name="Orchestrator",
@@ -29,6 +37,19 @@ Respond in JSON format:
 }
 
 IMPORTANT: You MUST include a numeric "hvac_setpoint" field (between 20-24°C). Do not default to 22.0.
+"""
+        
+        # Numeric backend for optimize(); the LLM only explains its plans
+        self.optimizer = SetpointOptimizer()
+        self.explain_prompt = """You are the Orchestrator Agent of a building energy management system.
+An optimizer has already chosen each zone's HVAC setpoint plan; do not change it.
+Explain each plan in one or two sentences for facility managers.
+
+Respond in JSON format:
+{
+    "reasoning": "why this plan balances cost, carbon and comfort",
+    "trade_offs": "what was sacrificed"
+}
 """
     
     def coordinate(self, current_time, building_state, agent_recommendations):
@@ -45,27 +66,114 @@ Agent Recommendations:
 Decide HVAC setpoint (20-24°C range). You MUST vary the setpoint based on the situation. Do NOT always choose 22.0°C.
 """
         
-        response = self.think(context, self.system_prompt)
+        # A missing or non-numeric setpoint is asked for again, then kept at the current value
+        decision = self.think_result(context, self.system_prompt, Decision, fallback={
+            "decision": "maintain current operation",
+            "hvac_setpoint": building_state.get('hvac_setpoint', 22),
+            "reasoning": "Fallback: no valid setpoint in the response"
+        })
+        decision.setdefault('hvac_power', 100)
+        return decision
+    
+    def coordinate_batch(self, current_time, zone_states, agent_recommendations, grid_outlook=None):
+        """
+        Setpoint decisions for every zone in one request
+        agent_recommendations: {zone_id: {'pv_generation': ..., 'cost_efficiency': ..., 'comfort': ...}}
+        grid_outlook: campus price/carbon outlook shared by all zones (optional)
+        Returns {zone_id: decision}
+        """
+        header = "zone_id | temp °C | setpoint °C | occupancy | solar kW | PV | cost | comfort"
+        rows = {}
+        for zone_id, state in zone_states.items():
+            recs = agent_recommendations.get(zone_id, {})
+            rows[zone_id] = (
+                f"{zone_id} | {state['indoor_temp']:.1f} | {state['hvac_setpoint']} | {state['occupancy']} | "
+                f"{state['solar_generation']:.0f} | "
+                f"{recs.get('pv_generation', {}).get('recommendation', 'N/A')} | "
+                f"{recs.get('cost_efficiency', {}).get('recommendation', 'N/A')} | "
+                f"{recs.get('comfort', {}).get('comfort_status', 'N/A')}"
+            )
+        grid_line = ""
+        if grid_outlook:
+            grid_line = (f"Grid: ${grid_outlook['price_now']:.3f}/kWh, {grid_outlook['carbon_now']:.0f} gCO2/kWh, "
+                         f"action {grid_outlook['action']}, peaks {grid_outlook['peak_periods'] or 'none'}\n")
+        shared_context = f"""
+Time: {current_time.strftime('%H:%M')}
+{grid_line}Decide an HVAC setpoint (20-24°C range) for each zone. You MUST vary the setpoint based on the situation. Do NOT always choose 22.0°C.
+"""
+        decisions = self.think_batch(
+            shared_context, header, rows, self.system_prompt,
+            schema=Decision,
+            fallback=lambda zone_id: {
+                "decision": "maintain current operation",
+                "hvac_setpoint": zone_states[zone_id].get('hvac_setpoint', 22),
+                "reasoning": "Fallback: zone missing from batch response"
+            }
+        )
+        for decision in decisions.values():
+            decision.setdefault('hvac_power', 100)
+        return decisions
+    
+    def optimize(self, current_time, zones, zone_states, forecast, explain=True):
+        """
+        Setpoint decisions from the model-predictive optimizer
+        
+        zones / zone_states: BuildingZone objects and state dicts in the same order
+        forecast: {'occupancy': (N, Z), 'outdoor_temp', 'price', 'carbon', 'solar': (N,)}
+        The setpoints are deterministic; with explain=True one batched LLM
+        call adds a plain-language reasoning per zone (the numbers are kept
+        whatever the reply). Returns {zone_id: decision}.
+        """
+        states = list(zone_states.values())
+        plan = self.optimizer.optimize(
+            zones,
+            [state['indoor_temp'] for state in states],
+            forecast['occupancy'], forecast['outdoor_temp'], forecast['price'],
+            forecast['carbon'], forecast['solar'],
+            current_setpoint=[state['hvac_setpoint'] for state in states]
+        )
         
-        # Debug output - print raw LLM response
-        print(f"         🔍 RAW LLM RESPONSE: {response[:200]}...")
+        decisions = {}
+        for i, (zone_id, state) in enumerate(zone_states.items()):
+            setpoint = float(plan['setpoint'][i])
+            trajectory = [float(level) for level in plan['trajectory'][i]]
+            change = setpoint - state['hvac_setpoint']
+            if abs(change) < 0.05:
+                action = f"hold setpoint at {setpoint:.1f}°C"
+            else:
+                action = f"{'raise' if change > 0 else 'lower'} setpoint to {setpoint:.1f}°C"
+            decisions[zone_id] = Decision(
+                decision=action,
+                hvac_setpoint=setpoint,
+                hvac_power=round(float(plan['hvac_power'][i]), 2),
+                setpoint_trajectory=trajectory,
+                expected_cost=round(float(plan['energy_cost'][i]), 3),
+                comfort_violation=round(float(plan['comfort_violation'][i]), 3),
+                reasoning=(f"4h plan {trajectory} °C: est. ${plan['energy_cost'][i]:.2f} energy+carbon, "
+                           f"comfort deviation {plan['comfort_violation'][i]:.2f} °C²·h"),
+                source="optimizer"
+            )
+        if not explain or not decisions:
+            return decisions
         
-        try:
-            decision = json.loads(response)
-            # Ensure required fields
-            if 'hvac_setpoint' not in decision:
-                print(f"         ⚠️ WARNING: No hvac_setpoint in response, using fallback")
-                decision['hvac_setpoint'] = building_state.get('hvac_setpoint', 22)
-            if 'hvac_power' not in decision:
-                decision['hvac_power'] = 100
-            return decision
-        except Exception as e:
-            print(f"         ❌ JSON PARSE ERROR: {e}")
-            print(f"         Response was: {response}")
-            # Safe fallback
-            return {
-                "decision": "maintain current operation",
-                "hvac_setpoint": building_state.get('hvac_setpoint', 22),
-                "hvac_power": 100,
-                "reasoning": f"Fallback due to parsing error: {e}"
-            }
\ No newline at end of file
+        prices = np.asarray(forecast['price'], dtype=float)
+        shared_context = f"""
+Time: {current_time.strftime('%H:%M')}
+Price now ${prices[0]:.3f}/kWh, 4h range ${prices.min():.3f}-${prices.max():.3f}
+Setpoint plans are hourly levels over the next 4 hours.
+"""
+        header = "zone_id | temp °C | occupancy | current setpoint | planned setpoints | est. cost $ | comfort dev."
+        rows = {
+            zone_id: (f"{zone_id} | {state['indoor_temp']:.1f} | {state['occupancy']} | {state['hvac_setpoint']} | "
+                      f"{decisions[zone_id]['setpoint_trajectory']} | {decisions[zone_id]['expected_cost']:.2f} | "
+                      f"{decisions[zone_id]['comfort_violation']:.2f}")
+            for zone_id, state in zone_states.items()
+        }
+        explanations = self.think_batch(shared_context, header, rows, self.explain_prompt,
+                                        schema=Explanation)
+        for zone_id, explanation in explanations.items():
+            if not explanation.get('fallback'):
+                decisions[zone_id]['reasoning'] = explanation['reasoning']
+                if 'trade_offs' in explanation:
+                    decisions[zone_id]['trade_offs'] = explanation['trade_offs']
+        return decisions
\ No newline at end of file
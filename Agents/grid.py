@@ -1,8 +1,74 @@
 # agents/grid_oracle.py
 from agents.base import OllamaBaseAgent
-import json
+from agents.results import GridPlan
+import numpy as np
+
+
+def grid_outlook(price_forecast, carbon_forecast, step_minutes=15, peak_margin=0.1):
+    """
+    Numeric price/carbon outlook for the forecast horizon (no LLM)
+    
+    Peak periods are runs of steps priced more than peak_margin above the
+    horizon mean. The shift opportunity compares now with the cheapest and
+    the cleanest step ahead.
+    """
+    prices = np.array([p['price'] for p in price_forecast], dtype=float)
+    carbon = np.array([c['carbon_intensity'] for c in carbon_forecast], dtype=float)
+    # Defaults for a missing forecast (the two feeds can fail independently)
+    if len(prices) == 0:
+        prices = np.array([0.15])
+    if len(carbon) == 0:
+        carbon = np.array([500.0])
+    
+    def label(step):
+        return f"+{step * step_minutes}min"
+    
+    threshold = prices.mean() * (1 + peak_margin)
+    peak = prices > threshold
+    edges = np.flatnonzero(np.diff(np.r_[0, peak.astype(int), 0]))
+    peak_periods = [
+        {'start': label(start), 'end': label(end), 'max_price': round(float(prices[start:end].max()), 4)}
+        for start, end in zip(edges[::2], edges[1::2])
+    ]
+    
+    cheapest = int(prices.argmin())
+    cleanest = int(carbon.argmin())
+    in_peak = bool(peak[0])
+    peak_ahead = bool(peak[1:].any())
+    if in_peak and cheapest > 0:
+        action = 'shed'        # defer flexible load to the cheaper period
+    elif not in_peak and peak_ahead:
+        action = 'precondition'    # pre-cool/heat before the peak
+    else:
+        action = 'maintain'
+    
+    # $/kWh avoided by acting: later cheap period when shedding, upcoming peak when preconditioning
+    if action == 'precondition':
+        price_saving = prices[1:][peak[1:]].max() - prices[0]
+    else:
+        price_saving = prices[0] - prices[cheapest]
+    
+    return {
+        'price_now': round(float(prices[0]), 4),
+        'price_mean': round(float(prices.mean()), 4),
+        'price_range': [round(float(prices.min()), 4), round(float(prices.max()), 4)],
+        'carbon_now': round(float(carbon[0]), 1),
+        'carbon_mean': round(float(carbon.mean()), 1),
+        'carbon_range': [round(float(carbon.min()), 1), round(float(carbon.max()), 1)],
+        'in_peak': in_peak,
+        'peak_periods': peak_periods,
+        'cheapest_at': label(cheapest),
+        'cleanest_at': label(cleanest),
+        'price_saving': round(float(price_saving), 4),
+        'carbon_saving': round(float(carbon[0] - carbon[cleanest]), 1),    # gCO2/kWh moved
+        'action': action
+    }
 
 class GridOracleAgent(OllamaBaseAgent):
+    # Response fields callers use: streaming stops once they are complete
+    required_fields = ('recommendation', 'priority')
+    num_predict = 256
+    
     def __init__(self):
         super().__init__(
             name="Grid Oracle",
@@ -41,13 +107,103 @@ Next 4h prices: {[round(p['price'], 3) for p in price_forecast[:8]]}
 Recommend cost/carbon optimization.
 """
         
-        response = self.think(context, self.system_prompt)
+        return self.think_result(context, self.system_prompt, GridPlan, fallback={
+            "recommendation": "maintain current operation",
+            "priority": "low"
+        })
+    
+    def analyze_batch(self, current_time, price_forecast, carbon_forecast, zone_states):
+        """Cost/carbon recommendations for every zone in one request; returns {zone_id: result}"""
+        header = "zone_id | grid kW | consumption kW"
+        rows = {
+            zone_id: f"{zone_id} | {state['grid_used']:.1f} | {state['total_consumption']:.1f}"
+            for zone_id, state in zone_states.items()
+        }
+        shared_context = f"""
+Time: {current_time.strftime('%H:%M')}
+Price: ${price_forecast[0]['price']:.3f}/kWh | Carbon: {carbon_forecast[0]['carbon_intensity']} gCO2/kWh
+Next 4h prices: {[round(p['price'], 3) for p in price_forecast[:8]]}
+
+Recommend cost/carbon optimization per zone.
+"""
+        return self.think_batch(
+            shared_context, header, rows, self.system_prompt,
+            schema=GridPlan,
+            fallback=lambda zone_id: {"recommendation": "maintain current operation", "priority": "low"}
+        )
+    
+    def analyze_campus(self, current_time, price_forecast, carbon_forecast, campus_state=None, use_llm=True):
+        """
+        Campus-wide grid analysis, run once per timepoint
+        
+        The price/carbon windows, peaks and shift opportunity are computed
+        numerically; the LLM (one call) only phrases the recommendation.
+        Per-zone advice comes from zone_recommendation(result, zone_state).
+        """
+        outlook = grid_outlook(price_forecast, carbon_forecast)
+        result = GridPlan(
+            analysis=f"price ${outlook['price_now']:.3f}/kWh ({outlook['action']}), "
+                     f"carbon {outlook['carbon_now']:.0f} gCO2/kWh",
+            recommendation=self._default_recommendation(outlook),
+            priority=self._priority(outlook),
+            outlook=outlook,
+            scope="campus"
+        )
+        if not use_llm:
+            return result
         
-        try:
-            return json.loads(response)
-        except:
-            return {
-                "analysis": response,
-                "recommendation": "maintain current operation",
-                "priority": "low"
-            }
\ No newline at end of file
+        load_line = ""
+        if campus_state:
+            load_line = (f"Campus grid: {campus_state.get('grid_used', 0):.0f} kW | "
+                         f"Consumption: {campus_state.get('total_consumption', 0):.0f} kW\n")
+        context = f"""
+Time: {current_time.strftime('%H:%M')} (campus-wide analysis)
+{load_line}Price now ${outlook['price_now']:.3f}/kWh, horizon mean ${outlook['price_mean']:.3f}, range {outlook['price_range']}
+Carbon now {outlook['carbon_now']:.0f} gCO2/kWh, range {outlook['carbon_range']}
+Peak periods: {outlook['peak_periods'] or 'none'}
+Cheapest at {outlook['cheapest_at']} (saves ${outlook['price_saving']:.3f}/kWh), cleanest at {outlook['cleanest_at']}
+Suggested action: {outlook['action']}
+
+Recommend cost/carbon optimization for the whole campus.
+"""
+        # The numeric outlook stays; the reply only replaces fields it got right
+        reply, problems = GridPlan.parse(self.think(context, self.system_prompt))
+        if not problems:
+            reply.pop('outlook', None)
+            reply.pop('scope', None)
+            result.update(reply)
+        return result
+    
+    @staticmethod
+    def _priority(outlook):
+        if outlook['action'] == 'maintain':
+            return "low"
+        if outlook['price_saving'] > 0.25 * max(outlook['price_now'], 1e-9) or outlook['in_peak']:
+            return "high"
+        return "medium"
+    
+    @staticmethod
+    def _default_recommendation(outlook):
+        if outlook['action'] == 'shed':
+            return f"reduce HVAC load now, shift flexible load to {outlook['cheapest_at']}"
+        if outlook['action'] == 'precondition':
+            start = outlook['peak_periods'][0]['start'] if outlook['peak_periods'] else 'the peak'
+            return f"pre-condition zones before the price peak at {start}"
+        return "maintain current operation"
+    
+    @staticmethod
+    def zone_recommendation(campus_result, zone_state, horizon_hours=1.0):
+        """Per-zone cost/carbon advice derived from a campus analysis (no LLM)"""
+        outlook = campus_result['outlook']
+        grid_kw = max(float(zone_state.get('grid_used', 0)), 0.0)
+        flexible_kw = min(grid_kw, abs(float(zone_state.get('hvac_power', grid_kw))))
+        moved_kwh = flexible_kw * horizon_hours if outlook['action'] != 'maintain' else 0.0
+        return GridPlan(
+            analysis=campus_result.get('analysis', ''),
+            recommendation=campus_result.get('recommendation', 'maintain current operation'),
+            priority=campus_result.get('priority', 'low'),
+            cost_impact=f"${moved_kwh * max(outlook['price_saving'], 0):.2f}",
+            carbon_impact=f"{moved_kwh * max(outlook['carbon_saving'], 0) / 1000:.1f} kg CO2",
+            flexible_kw=round(flexible_kw, 1),
+            scope="campus"
+        )
\ No newline at end of file
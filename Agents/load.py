@@ -1,8 +1,12 @@
 # agents/comfort_guardian.py
 from agents.base import OllamaBaseAgent
-import json
+from agents.results import ComfortAssessment
 
 class ComfortGuardianAgent(OllamaBaseAgent):
+    # Response fields callers use: streaming stops once they are complete
+    required_fields = ('comfort_status', 'constraints')
+    num_predict = 192
+    
     def __init__(self):
         super().__init__(
             name="Comfort Guardian",
@@ -45,12 +49,28 @@ Occupancy: {building_state['occupancy']} people | HVAC: {building_state['hvac_po
 Evaluate comfort status. Range: 20-24°C (occupied), 18-26°C (unoccupied).
 """
         
-        response = self.think(context, self.system_prompt)
-        
-        try:
-            return json.loads(response)
-        except:
-            return {
+        return self.think_result(context, self.system_prompt, ComfortAssessment, fallback={
+            "comfort_status": "acceptable",
+            "constraints": {"min_temp": 20, "max_temp": 24, "flexibility": "medium"}
+        })
+    
+    def analyze_batch(self, current_time, zone_states):
+        """Comfort evaluation for every zone in one request; returns {zone_id: result}"""
+        header = "zone_id | indoor °C | occupancy | HVAC kW"
+        rows = {
+            zone_id: f"{zone_id} | {state['indoor_temp']:.1f} | {state['occupancy']} | {state['hvac_power']:.1f}"
+            for zone_id, state in zone_states.items()
+        }
+        outdoor = next(iter(zone_states.values()))['outdoor_temp'] if zone_states else 0.0
+        shared_context = f"""
+Time: {current_time.strftime('%H:%M')} | Outdoor: {outdoor:.1f}°C
+Evaluate comfort status per zone. Range: 20-24°C (occupied), 18-26°C (unoccupied).
+"""
+        return self.think_batch(
+            shared_context, header, rows, self.system_prompt,
+            schema=ComfortAssessment,
+            fallback=lambda zone_id: {
                 "comfort_status": "acceptable",
                 "constraints": {"min_temp": 20, "max_temp": 24, "flexibility": "medium"}
-            }
\ No newline at end of file
+            }
+        )
\ No newline at end of file
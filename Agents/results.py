@@ -0,0 +1,364 @@
+# agents/results.py
+"""
+Typed results for agent replies
+
+Each agent reply is parsed against a schema. Values are coerced (numbers
+from "21.5°C", booleans from "yes"), clamped to physical ranges (setpoints
+to 20-24°C) and checked against the allowed labels. parse() reports which
+required fields are missing or invalid, so the agent can ask the model
+again for just those fields instead of re-running the whole prompt.
+
+Results are slotted objects that still read like the dicts they replace:
+result['field'], .get(), `in`, iteration and ** unpacking all work. Keys a
+schema doesn't know are kept in `extra`.
+"""
+import json
+import re
+from collections.abc import MutableMapping
+
+SETPOINT_LIMITS = (20.0, 24.0)
+COMFORT_TEMP_LIMITS = (10.0, 35.0)
+
+_NUMBER = re.compile(r'^\s*\$?\s*([-+]?\d+(?:\.\d*)?|[-+]?\.\d+)')
+
+
+class Invalid(ValueError):
+    """A reply value that can't be coerced to its field's type"""
+
+
+# ============ FIELD COERCERS ============
+
+def text(value):
+    if isinstance(value, (dict, list)):
+        raise Invalid("must be text")
+    return str(value).strip()
+
+
+def number(low=None, high=None):
+    """Float coercer clamping to [low, high]; accepts numeric strings with units"""
+    if low is not None and high is not None:
+        message = f"must be a number between {low:g} and {high:g}"
+    else:
+        message = "must be a number"
+    
+    def coerce(value):
+        if isinstance(value, str):
+            match = _NUMBER.match(value)
+            if match is None:
+                raise Invalid(message)
+            value = match.group(1)
+        if isinstance(value, bool):
+            raise Invalid(message)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise Invalid(message) from None
+        if value != value:
+            raise Invalid(message)
+        if low is not None and value < low:
+            value = low
+        if high is not None and value > high:
+            value = high
+        return value
+    return coerce
+
+
+def choice(*options):
+    """Lower-case label that must be one of options"""
+    message = f"must be one of {'/'.join(options)}"
+    
+    def coerce(value):
+        if not isinstance(value, str) or value.strip().lower() not in options:
+            raise Invalid(message)
+        return value.strip().lower()
+    return coerce
+
+
+def boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'yes', '1', 'false', 'no', '0'):
+        return value.strip().lower() in ('true', 'yes', '1')
+    raise Invalid("must be true or false")
+
+
+def text_list(value):
+    if isinstance(value, str):
+        return [value.strip()] if value.strip() else []
+    if not isinstance(value, (list, tuple)):
+        raise Invalid("must be a list of strings")
+    return [item if isinstance(item, dict) else str(item).strip() for item in value]
+
+
+def number_list(low=None, high=None):
+    item = number(low, high)
+    
+    def coerce(value):
+        if not isinstance(value, (list, tuple)):
+            raise Invalid("must be a list of numbers")
+        return [item(v) for v in value]
+    return coerce
+
+
+def mapping(value):
+    if not isinstance(value, dict):
+        raise Invalid("must be a JSON object")
+    return value
+
+
+# ============ RESULT BASE ============
+
+class AgentResult(MutableMapping):
+    """
+    Slotted, dict-compatible agent result
+    
+    FIELDS: (name, coerce, required) per schema field. A field set to None
+    counts as absent, as a missing dict key would.
+    """
+    FIELDS = ()
+    REQUIRED = ()
+    _coercers = {}
+    __slots__ = ('extra',)
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._coercers = {name: coerce for name, coerce, _ in cls.FIELDS}
+        cls.REQUIRED = tuple(name for name, _, required in cls.FIELDS if required)
+    
+    def __init__(self, values=None, **kwargs):
+        """Build from trusted values (no coercion); use parse() for model replies"""
+        self.extra = None
+        for name in self._coercers:
+            setattr(self, name, None)
+        for source in (values or {}, kwargs):
+            for key, value in source.items():
+                self[key] = value
+    
+    def __getitem__(self, key):
+        if key in self._coercers:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+    
+    def __setitem__(self, key, value):
+        if key in self._coercers:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+    
+    def __delitem__(self, key):
+        if key in self._coercers and getattr(self, key) is not None:
+            setattr(self, key, None)
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+    
+    def __contains__(self, key):
+        if key in self._coercers:
+            return getattr(self, key) is not None
+        return self.extra is not None and key in self.extra
+    
+    def __iter__(self):
+        for name in self._coercers:
+            if getattr(self, name) is not None:
+                yield name
+        if self.extra:
+            yield from self.extra
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def copy(self):
+        return type(self)(self)
+    
+    def to_dict(self):
+        """Plain dict (nested results converted too), e.g. for JSON export"""
+        return {key: value.to_dict() if isinstance(value, AgentResult) else value
+                for key, value in self.items()}
+    
+    @classmethod
+    def parse(cls, reply, base=None):
+        """
+        (result, problems) from a model reply (JSON text or dict)
+        
+        Values are coerced field by field. Invalid values are dropped;
+        problems maps each missing or invalid required field to what was
+        wrong. base: an earlier result for the same request, whose fields
+        are kept unless the reply supplies valid replacements.
+        """
+        if isinstance(reply, str):
+            try:
+                reply = json.loads(reply)
+            except ValueError:
+                reply = None
+        result = cls() if base is None else base.copy()
+        if not isinstance(reply, dict):
+            return result, {name: "missing (reply was not a JSON object)"
+                            for name in cls.REQUIRED if name not in result}
+        
+        problems = {}
+        for key, value in reply.items():
+            coerce = cls._coercers.get(key)
+            if coerce is None:
+                result[key] = value
+            elif value is not None:
+                try:
+                    setattr(result, key, coerce(value))
+                except Invalid as e:
+                    problems[key] = str(e)
+        
+        problems = {name: problems.get(name, "missing") for name in cls.REQUIRED if name not in result}
+        return result, problems
+    
+    @classmethod
+    def coerce(cls, value):
+        """Coercer for a field holding a nested result of this type"""
+        message = "must be a JSON object with " + ", ".join(_names(cls.FIELDS))
+        if not isinstance(value, dict):
+            raise Invalid(message)
+        result, problems = cls.parse(value)
+        if problems:
+            raise Invalid(message)
+        return result
+    
+    @classmethod
+    def complete(cls, result, defaults):
+        """result with unset fields taken from defaults, marked as a fallback"""
+        filled = cls(defaults)
+        filled.update(result)
+        filled['fallback'] = True
+        return filled
+
+
+def _names(fields):
+    return tuple(name for name, _, _ in fields)
+
+
+# ============ AGENT RESULTS ============
+
+class SolarAdvice(AgentResult):
+    """Solar Prophet recommendation"""
+    FIELDS = (
+        ('recommendation', text, True),
+        ('confidence', number(0, 100), False),
+        ('analysis', text, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class GridPlan(AgentResult):
+    """Grid Oracle cost/carbon plan, for a zone or the whole campus"""
+    FIELDS = (
+        ('recommendation', text, True),
+        ('priority', choice('high', 'medium', 'low'), False),
+        ('analysis', text, False),
+        ('cost_impact', text, False),
+        ('carbon_impact', text, False),
+        ('proposed_actions', text_list, False),
+        ('outlook', mapping, False),
+        ('flexible_kw', number(0), False),
+        ('scope', text, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class ComfortConstraints(AgentResult):
+    """Temperature band other agents must respect"""
+    FIELDS = (
+        ('min_temp', number(*COMFORT_TEMP_LIMITS), False),
+        ('max_temp', number(*COMFORT_TEMP_LIMITS), False),
+        ('flexibility', choice('low', 'medium', 'high'), False),
+    )
+    __slots__ = _names(FIELDS)
+    
+    @classmethod
+    def coerce(cls, value):
+        constraints = super().coerce(value)
+        if 'min_temp' in constraints and 'max_temp' in constraints and constraints.min_temp > constraints.max_temp:
+            constraints.min_temp, constraints.max_temp = constraints.max_temp, constraints.min_temp
+        return constraints
+
+
+class ComfortAssessment(AgentResult):
+    """Comfort Guardian status and constraints"""
+    FIELDS = (
+        ('comfort_status', choice('comfortable', 'acceptable', 'uncomfortable'), True),
+        ('constraints', ComfortConstraints.coerce, False),
+        ('analysis', text, False),
+        ('recommendation', text, False),
+        ('veto_reasons', text_list, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class AnomalyReport(AgentResult):
+    """Sherlock anomaly report, from the rules or the LLM"""
+    FIELDS = (
+        ('anomaly_detected', boolean, True),
+        ('severity', choice('critical', 'high', 'medium', 'low'), True),
+        ('anomaly_type', choice('waste', 'malfunction', 'sensor_error', 'suspicious'), False),
+        ('location', text, False),
+        ('description', text, False),
+        ('evidence', text_list, False),
+        ('recommended_action', text, False),
+        ('block_optimization', boolean, False),
+        ('alert_message', text, False),
+        ('consumption_ratio', number(0), False),
+        ('timestamp', text, False),
+        ('source', text, False),
+        ('zone_id', text, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class Decision(AgentResult):
+    """Orchestrator setpoint decision for one zone"""
+    FIELDS = (
+        ('hvac_setpoint', number(*SETPOINT_LIMITS), True),
+        ('decision', text, False),
+        ('hvac_power', number(), False),
+        ('reasoning', text, False),
+        ('trade_offs', text, False),
+        ('agent_consensus', choice('high', 'medium', 'low'), False),
+        ('alerts', text_list, False),
+        ('setpoint_trajectory', number_list(*SETPOINT_LIMITS), False),
+        ('expected_cost', number(), False),
+        ('comfort_violation', number(0), False),
+        ('source', text, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class Explanation(AgentResult):
+    """Plain-language reasoning for an optimizer plan"""
+    FIELDS = (
+        ('reasoning', text, True),
+        ('trade_offs', text, False),
+    )
+    __slots__ = _names(FIELDS)
+
+
+class ZoneRecommendation(AgentResult):
+    """One zone's row in agent_recommendations.csv"""
+    FIELDS = (
+        ('current_setpoint', number(), False),
+        ('recommended_setpoint', number(), False),
+        ('decision', text, False),
+        ('reasoning', text, False),
+        ('pv_rec', text, False),
+        ('cost_rec', text, False),
+        ('comfort_status', text, False),
+    )
+    __slots__ = _names(FIELDS)
@@ -1,8 +1,12 @@
 # agents/solar_prophet_ollama.py
 from agents.base import OllamaBaseAgent
-import json
+from agents.results import SolarAdvice
 
 class SolarProphetAgent(OllamaBaseAgent):
+    # Response fields callers use: streaming stops once they are complete
+    required_fields = ('recommendation', 'confidence')
+    num_predict = 96
+    
     def __init__(self):
         super().__init__(
             name="Solar Prophet",
@@ -34,13 +38,28 @@ Building: {building_state['indoor_temp']:.1f}°C indoor, {building_state['occupa
 What actions maximize solar utilization?
 """
         
-        response = self.think(context, self.system_prompt)
-        
-        try:
-            return json.loads(response)
-        except:
-            return {
-                "analysis": "Normal operation",
-                "recommendation": "maintain current operation",
-                "confidence": 50
-            }
\ No newline at end of file
+        return self.think_result(context, self.system_prompt, SolarAdvice, fallback={
+            "analysis": "Normal operation",
+            "recommendation": "maintain current operation",
+            "confidence": 50
+        })
+    
+    def analyze_batch(self, current_time, solar_forecast, zone_states):
+        """Solar recommendations for every zone in one request; returns {zone_id: result}"""
+        header = "zone_id | solar kW | consumption kW | indoor °C | occupancy"
+        rows = {
+            zone_id: (f"{zone_id} | {state['solar_generation']:.1f} | {state['total_consumption']:.1f} | "
+                      f"{state['indoor_temp']:.1f} | {state['occupancy']}")
+            for zone_id, state in zone_states.items()
+        }
+        shared_context = f"""
+Time: {current_time.strftime('%H:%M')}
+Next 4h campus solar forecast (kW): {solar_forecast[:16]}
+
+What actions maximize solar utilization in each zone?
+"""
+        return self.think_batch(
+            shared_context, header, rows, self.system_prompt,
+            schema=SolarAdvice,
+            fallback=lambda zone_id: {"recommendation": "maintain current operation", "confidence": 50}
+        )
\ No newline at end of file
@@ -0,0 +1,28 @@
+# benchmarks/__init__.py
+"""
+Benchmark suite for data generation, physics and analysis throughput
+    
+    python -m benchmarks                    run everything, compare with baseline.json
+    python -m benchmarks simulate_step      only workloads whose name contains the text
+    python -m benchmarks all save           run and store the results as the new baseline
+    python -m benchmarks agents 0.2         end-to-end agent runs with 0.2 s model latency
+    python -m benchmarks agents lognormal:0.2,0.5   ... or a latency distribution
+
+Results go to benchmarks/latest.json. A workload whose fastest run is more than
+its tolerance slower than the baseline is flagged and the exit status is 1.
+Baselines are per machine: regenerate them (save) before comparing on
+different hardware. A workload that can't run (e.g. a missing dependency)
+is reported as failed and also makes the exit status 1.
+"""
+import os
+import sys
+import types
+
+# The agent package directory is Agents/ but it is imported as `agents`
+# (see conftest.py); register the name where the filesystem doesn't match it
+try:
+    import agents  # noqa: F401
+except ImportError:
+    agents = types.ModuleType('agents')
+    agents.__path__ = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Agents')]
+    sys.modules['agents'] = agents
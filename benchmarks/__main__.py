@@ -0,0 +1,74 @@
+# benchmarks/__main__.py
+"""
+Run the benchmark suite (see benchmarks/__init__.py for usage)
+"""
+import os
+import sys
+
+from benchmarks import harness, workloads
+from mock_llm_server import latency_sampler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, 'baseline.json')
+RESULTS_FILE = os.path.join(HERE, 'latest.json')
+
+
+def main():
+    pattern = sys.argv[1] if len(sys.argv) > 1 else None
+    save_baseline = len(sys.argv) > 2 and sys.argv[2] == 'save'
+    if len(sys.argv) > 2 and not save_baseline:
+        try:
+            latency_sampler(sys.argv[2])
+            workloads.LLM_LATENCY = sys.argv[2]
+        except ValueError:
+            print(f"⚠️  Invalid latency parameter, using default: {workloads.LLM_LATENCY}")
+    
+    selected = harness.select(pattern)
+    if not selected:
+        print(f"❌ No workload matches '{pattern}'. Available:")
+        for name in harness.WORKLOADS:
+            print(f"   {name}")
+        return 2
+    
+    baseline = harness.load_results(BASELINE_FILE)
+    print("="*70)
+    print(f"⏱️  BENCHMARKS ({len(selected)} workloads, model latency {workloads.LLM_LATENCY}s)")
+    if baseline:
+        print(f"   Baseline: {BASELINE_FILE} ({baseline['created']}, {baseline['machine']['processor']})")
+    print("="*70)
+    
+    results = {}
+    regressions = []
+    failures = []
+    for workload in selected:
+        try:
+            result = harness.run_workload(workload)
+        except ImportError as e:
+            print(f"{workload.name:<34} ❌ failed: {e}")
+            failures.append(workload.name)
+            continue
+        results[workload.name] = result
+        comparison = None
+        if baseline:
+            comparison = harness.compare({workload.name: result}, baseline['results']).get(workload.name)
+        if comparison and comparison['regressed']:
+            regressions.append(workload.name)
+        print(harness.format_result(workload.name, result, comparison), flush=True)
+    
+    harness.save_results(results, RESULTS_FILE)
+    print(f"\n💾 Results: {RESULTS_FILE}")
+    if save_baseline:
+        # Keep baseline entries for workloads that weren't run this time
+        merged = {**(baseline['results'] if baseline else {}), **results}
+        harness.save_results(merged, BASELINE_FILE)
+        print(f"💾 Baseline updated: {BASELINE_FILE}")
+    
+    if failures:
+        print(f"\n❌ {len(failures)} workload(s) could not run: {', '.join(failures)}")
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# benchmarks/harness.py
+"""
+Workload registry, timing and baseline comparison
+
+A workload is a generator function: code before its single `yield` is
+setup (not timed), the yielded callable is one timed run, and code after
+the yield is cleanup. After one warm-up call, each of `repeat` samples times
+enough back-to-back runs to last MIN_SAMPLE_SECONDS (short workloads are
+otherwise dominated by timer and scheduler noise). The fastest sample is
+compared against the stored baseline: background load only ever adds
+time, so it is the most repeatable number on a shared machine.
+"""
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import time
+
+DEFAULT_TOLERANCE = 0.25  # flag runs more than 25% slower than the baseline
+MIN_SAMPLE_SECONDS = 0.05
+
+WORKLOADS = {}
+
+
+class Workload:
+    def __init__(self, name, setup, items, unit, repeat=5, tolerance=DEFAULT_TOLERANCE):
+        self.name = name
+        self.setup = contextlib.contextmanager(setup)
+        self.items = items
+        self.unit = unit
+        self.repeat = repeat
+        self.tolerance = tolerance
+
+
+def workload(name, items=1, unit='runs', repeat=5, tolerance=DEFAULT_TOLERANCE):
+    """Register a setup generator under name; items processed per run give the throughput"""
+    def register(setup):
+        WORKLOADS[name] = Workload(name, setup, items, unit, repeat, tolerance)
+        return setup
+    return register
+
+
+def select(pattern=None):
+    """Registered workloads whose name contains pattern (all when None or 'all')"""
+    if pattern in (None, 'all'):
+        return list(WORKLOADS.values())
+    return [w for name, w in WORKLOADS.items() if pattern in name]
+
+
+def run_workload(workload, repeat=None):
+    """Time one workload; returns its result entry"""
+    repeat = repeat or workload.repeat
+    with workload.setup() as run:
+        start = time.perf_counter()
+        run()  # warm-up: imports, caches, connection pools
+        loops = max(1, math.ceil(MIN_SAMPLE_SECONDS / max(time.perf_counter() - start, 1e-9)))
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            times.append((time.perf_counter() - start) / loops)
+    
+    median = statistics.median(times)
+    return {
+        'median_s': round(median, 6),
+        'min_s': round(min(times), 6),
+        'max_s': round(max(times), 6),
+        'repeat': repeat,
+        'loops': loops,
+        'items': workload.items,
+        'unit': workload.unit,
+        'per_second': round(workload.items / median, 2) if median > 0 else None,
+        'tolerance': workload.tolerance
+    }
+
+
+def machine():
+    """Where the numbers were taken; baselines only compare on like hardware"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count()
+    }
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'machine': machine(), 'results': results}, f, indent=2)
+    return path
+
+
+def load_results(path):
+    """{'created', 'machine', 'results'} from save_results, or None if the file is missing"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline):
+    """
+    {name: comparison} for workloads present in both result sets
+    
+    ratio is current / baseline fastest run; a workload regressed when
+    the ratio exceeds 1 + its tolerance.
+    """
+    comparisons = {}
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference.get('min_s'):
+            continue
+        ratio = result['min_s'] / reference['min_s']
+        comparisons[name] = {
+            'baseline_s': reference['min_s'],
+            'current_s': result['min_s'],
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + result.get('tolerance', DEFAULT_TOLERANCE)
+        }
+    return comparisons
+
+
+def format_result(name, result, comparison=None):
+    """One printable line per workload"""
+    line = f"{name:<34} {result['median_s'] * 1000:>10.2f} ms  {result['per_second'] or 0:>14,.0f} {result['unit']}/s"
+    if comparison:
+        flag = "  ⚠️  REGRESSION" if comparison['regressed'] else ""
+        line += f"  ({comparison['ratio']:.2f}x baseline){flag}"
+    return line
@@ -0,0 +1,256 @@
+# benchmarks/workloads.py
+"""
+Benchmark workloads
+
+Data generation, zone physics, baseline tracking, the per-timepoint data
+slicing done by analyze_timepoint, and end-to-end agent analysis against
+mock_llm_server (LLM_LATENCY seconds per reply).
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import workload
+from building_zones import BuildingZone, MultiZoneUniversity
+from mock_llm_server import MockLLMServer
+from utils.hist_tracker import HistoricalTracker
+from utils.storage import read_table
+from utils.timeseries_index import ZoneTimeIndex
+from zone_data_generator import ZoneDataGenerator
+
+START = datetime(2024, 3, 15, 8, 0)
+SEED = 42
+STEPS = 96                # timesteps per physics run (one day of 15-min steps)
+SIMULATION_DAYS = 30      # data behind the slicing and agent workloads
+LLM_LATENCY = 0.05        # mock model server delay per reply (seconds, or a distribution spec)
+
+
+def _campus(n_zones):
+    """Campus of n_zones copies of the default zones"""
+    templates = list(MultiZoneUniversity().zones.values())
+    zones = []
+    for i in range(n_zones):
+        template = templates[i % len(templates)]
+        suffix = '' if i < len(templates) else f'_{i // len(templates)}'
+        zones.append(BuildingZone(template.zone_id + suffix, template.zone_name + suffix,
+                                  template.floor_area, template.occupancy_capacity))
+    return MultiZoneUniversity(zones)
+
+
+@contextlib.contextmanager
+def _quiet_workdir():
+    """Run the pipeline scripts in a scratch directory with their output muted"""
+    cwd, argv = os.getcwd(), sys.argv
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        sys.argv = [argv[0]]  # the scripts read optional CLI arguments
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield tmpdir
+        finally:
+            os.chdir(cwd)
+            sys.argv = argv
+
+
+@lru_cache(maxsize=None)
+def _simulation_frame(days=SIMULATION_DAYS):
+    """Output of simulate_building_physics for `days` days (built once per process)"""
+    import simulate_building_data
+    with _quiet_workdir():
+        ZoneDataGenerator(START, days=days, seed=SEED).save('zone_forecast_data.parquet')
+        simulate_building_data.simulate_building_physics(days=days, output_file='simulation.parquet')
+        return read_table('simulation.parquet')
+
+
+# ============ DATA GENERATION ============
+
+def _generate_dataset(days):
+    generator = ZoneDataGenerator(START, days=days, seed=SEED)
+    yield generator.generate_dataset
+
+
+for _days in (1, 30, 365):
+    workload(f'generate_dataset[{_days}d]', items=_days * 96, unit='steps',
+             repeat=3 if _days == 365 else 5)(lambda days=_days: _generate_dataset(days))
+
+
+# ============ PHYSICS ============
+
+def _simulate_step(n_zones):
+    campus = _campus(n_zones)
+    hvac = {zone_id: 40.0 for zone_id in campus.get_zone_ids()}
+    occupancy = {zone_id: 50 for zone_id in campus.get_zone_ids()}
+    
+    def run():
+        for _ in range(STEPS):
+            campus.simulate_step(hvac, occupancy, 150.0, 12.0)
+    yield run
+
+
+def _advance(n_zones):
+    campus = _campus(n_zones)
+    rng = np.random.default_rng(SEED)
+    hvac = np.full(n_zones, 40.0)
+    occupancy = rng.integers(0, 100, size=(STEPS, n_zones)).astype(float)
+    solar = np.linspace(0, 200, STEPS)
+    outdoor = np.linspace(8, 18, STEPS)
+    
+    def run():
+        campus.advance(hvac, occupancy, solar, outdoor)
+    yield run
+
+
+for _zones in (8, 100, 1000):
+    workload(f'simulate_step[{_zones}z]', items=STEPS * _zones, unit='zone-steps',
+             repeat=3 if _zones == 1000 else 5)(lambda zones=_zones: _simulate_step(zones))
+for _zones in (8, 100, 1000):
+    workload(f'advance[{_zones}z]', items=STEPS * _zones, unit='zone-steps')(lambda zones=_zones: _advance(zones))
+
+
+@workload('simulate_building_physics[30d]', items=30 * 96 * 8, unit='zone-steps', repeat=3)
+def _simulate_building_physics():
+    import simulate_building_data
+    with _quiet_workdir():
+        ZoneDataGenerator(START, days=30, seed=SEED).save('zone_forecast_data.parquet')
+        yield lambda: simulate_building_data.simulate_building_physics(days=30, output_file='simulation.parquet')
+
+
+# ============ BASELINES ============
+
+UPDATES = 7 * 96
+
+@workload('hist_tracker.update', items=UPDATES, unit='samples')
+def _tracker_update():
+    frame = _simulation_frame()
+    rows = frame[frame['zone_id'] == 'library'].head(UPDATES)
+    samples = list(zip(rows['timestamp'], rows.to_dict('records')))
+    
+    def run():
+        tracker = HistoricalTracker({'24h': 96, '7d': 672})
+        for timestamp, state in samples:
+            tracker.add_datapoint(timestamp, state)
+    yield run
+
+
+@workload('hist_tracker.query', items=24 * 100, unit='queries')
+def _tracker_query():
+    frame = _simulation_frame()
+    tracker = HistoricalTracker.from_frame(frame[frame['zone_id'] == 'library'], {'24h': 96, '7d': 672}, by=None)
+    
+    def run():
+        for _ in range(50):
+            for hour in range(24):
+                tracker.get_hourly_average(hour)
+                tracker.get_hourly_average(hour, '7d')
+    yield run
+
+
+@workload('hist_tracker.from_frame[30d]', items=SIMULATION_DAYS * 96 * 8, unit='records')
+def _tracker_from_frame():
+    frame = _simulation_frame()
+    yield lambda: HistoricalTracker.from_frame(frame, {'24h': 96, '7d': 672})
+
+
+# ============ ANALYSIS ============
+
+def _timepoints(frame, count):
+    """count timestamps spread over the data, skipping the last 4 hours (no lookahead)"""
+    timestamps = np.sort(frame['timestamp'].unique())[:-16]
+    return list(timestamps[np.linspace(0, len(timestamps) - 1, count).astype(int)])
+
+
+@workload('zone_time_index.build[30d]', items=SIMULATION_DAYS * 96 * 8, unit='records')
+def _index_build():
+    frame = _simulation_frame()
+    yield lambda: ZoneTimeIndex(frame)
+
+
+@workload('analyze_timepoint.slicing', items=50, unit='timepoints')
+def _timepoint_slicing():
+    """The lookups analyze_timepoint makes before any agent is called"""
+    from main_multizone import forecast_arrays, future_context, zone_state_from
+    frame = _simulation_frame()
+    index = ZoneTimeIndex(frame)
+    zone_ids = index.zone_ids
+    timestamps = _timepoints(frame, 50)
+    
+    def run():
+        for timestamp in timestamps:
+            index.at(timestamp, zone_ids)
+            rows = {zone_id: index.row(zone_id, timestamp) for zone_id in zone_ids}
+            future_context(index.after(zone_ids[0], timestamp, steps=16))
+            forecast_arrays(index, timestamp, rows)
+            for zone_id, row in rows.items():
+                zone_state_from(row)
+                index.after(zone_id, timestamp, steps=16)
+    yield run
+
+
+def _agent_run(batched, timepoints=3, malformed_rate=0.0, scheduled=False):
+    """analyze_timepoint for the full campus against the mock model server"""
+    import main_multizone as mm
+    from agents.base import OllamaBaseAgent
+    
+    frame = _simulation_frame()
+    index = ZoneTimeIndex(frame)
+    campus = MultiZoneUniversity()
+    zone_ids = campus.get_zone_ids()
+    timestamps = _timepoints(frame, timepoints)
+    
+    server = MockLLMServer(latency=LLM_LATENCY, malformed_rate=malformed_rate, seed=SEED)
+    with server, ThreadPoolExecutor(max_workers=mm.AGENT_WORKERS) as pool:
+        if scheduled:
+            OllamaBaseAgent.enable_scheduler(mm.BACKEND_CONCURRENCY)
+        else:
+            OllamaBaseAgent.set_concurrency_limit(mm.BACKEND_CONCURRENCY, server.url)
+        
+        def team():
+            return {
+                'anomaly': mm.AnomalyDetector(),
+                'pv': mm.PVGenerationAgent(),
+                'cost': mm.CostEfficiencyAgent(),
+                'comfort': mm.ComfortAgent(),
+                'orchestrator': mm.OrchestratorAgent()
+            }
+        batch_agents = team() if batched else None
+        zone_agents = {} if batched else {zone_id: team() for zone_id in zone_ids}
+        grid_agent, planner = mm.CostEfficiencyAgent(), mm.OrchestratorAgent()
+        agents = [grid_agent, planner, *(batch_agents or {}).values(),
+                  *(agent for members in zone_agents.values() for agent in members.values())]
+        for agent in agents:
+            agent.ollama_url = server.url
+        
+        def run():
+            trackers = HistoricalTracker.from_frame(frame, mm.BASELINE_WINDOWS)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for timestamp in timestamps:
+                    mm.analyze_timepoint(pd.Timestamp(timestamp), index, campus, zone_agents, trackers, zone_ids,
+                                         agent_pool=pool, batch_agents=batch_agents, grid_agent=grid_agent,
+                                         planner=planner)
+        try:
+            yield run
+        finally:
+            OllamaBaseAgent.disable_scheduler()
+
+
+# Network timing is noisier than pure computation
+workload('agents.e2e[batched]', items=3 * 8, unit='zone-analyses', repeat=3, tolerance=0.5)(
+    lambda: _agent_run(batched=True))
+workload('agents.e2e[per-zone]', items=3 * 8, unit='zone-analyses', repeat=3, tolerance=0.5)(
+    lambda: _agent_run(batched=False))
+# Priority slots plus coalescing of identical in-flight prompts (LLMScheduler)
+workload('agents.e2e[batched,scheduled]', items=3 * 8, unit='zone-analyses', repeat=3, tolerance=0.5)(
+    lambda: _agent_run(batched=True, scheduled=True))
+workload('agents.e2e[per-zone,scheduled]', items=3 * 8, unit='zone-analyses', repeat=3, tolerance=0.5)(
+    lambda: _agent_run(batched=False, scheduled=True))
+# 10% broken replies: the cost of follow-up asks and fallbacks
+workload('agents.e2e[batched,malformed]', items=3 * 8, unit='zone-analyses', repeat=3, tolerance=0.5)(
+    lambda: _agent_run(batched=True, malformed_rate=0.1))
@@ -2,6 +2,7 @@
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from utils.thermal import propagate_temperature
 
 class UniversityBuilding:
     def __init__(self):
@@ -16,7 +17,7 @@ class UniversityBuilding:
         self.indoor_temp = 22  # °C
         self.hvac_setpoint = 22
         self.outdoor_temp = 20
-        
+    
     def simulate_step(self, hvac_power, solar_generation, occupancy, outdoor_temp, dt=0.25):
         """Simulate one time step (dt in hours)"""
         
@@ -62,4 +63,39 @@ class UniversityBuilding:
             'solar_excess': solar_excess,
             'occupancy': occupancy,
             'outdoor_temp': outdoor_temp
+        }
+    
+    def advance(self, hvac_power, solar_generation, occupancy, outdoor_temp, dt=0.25,
+                method='euler', tolerance=None):
+        """Simulate N time steps at constant HVAC power in one shot
+        
+        solar_generation, occupancy and outdoor_temp are length-N sequences.
+        Returns a dict of length-N arrays matching simulate_step's fields.
+        """
+        solar_generation = np.asarray(solar_generation, dtype=float)
+        occupancy = np.asarray(occupancy, dtype=float)
+        outdoor_temp = np.asarray(outdoor_temp, dtype=float)
+        
+        indoor_temp = propagate_temperature(
+            self.indoor_temp, hvac_power, occupancy[:, None] * 0.1, outdoor_temp,
+            self.thermal_mass, 0.5, dt, method, tolerance
+        )[:, 0]
+        if len(indoor_temp):
+            self.indoor_temp = float(indoor_temp[-1])
+            self.outdoor_temp = float(outdoor_temp[-1])
+        
+        base_consumption = self.base_load * (0.3 + 0.7 * occupancy / 100)
+        total_consumption = base_consumption + abs(hvac_power)
+        
+        return {
+            'indoor_temp': indoor_temp,
+            'hvac_power': np.full(len(occupancy), float(hvac_power)),
+            'base_load': base_consumption,
+            'total_consumption': total_consumption,
+            'solar_generation': solar_generation,
+            'solar_used': np.minimum(solar_generation, total_consumption),
+            'grid_used': np.maximum(0, total_consumption - solar_generation),
+            'solar_excess': np.maximum(0, solar_generation - total_consumption),
+            'occupancy': occupancy,
+            'outdoor_temp': outdoor_temp
         }
\ No newline at end of file
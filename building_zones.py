@@ -1,11 +1,46 @@
 # building_zones.py
 import numpy as np
 from datetime import datetime
+from utils.thermal import propagate_temperature
+
+
+class _EngineField:
+    """Zone attribute that lives in the campus engine arrays once the zone is bound"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, zone, owner=None):
+        if zone is None:
+            return self
+        if zone._engine is None:
+            return zone.__dict__[self.name]
+        return getattr(zone._engine, self.name)[zone._engine_index].item()
+    
+    def __set__(self, zone, value):
+        if zone._engine is None:
+            zone.__dict__[self.name] = value
+        else:
+            getattr(zone._engine, self.name)[zone._engine_index] = value
+
 
 class BuildingZone:
     """Represents a single building/floor/bloc with independent HVAC control"""
     
+    # Physical parameters and state, stored in the CampusEngine once bound
+    floor_area = _EngineField()
+    occupancy_capacity = _EngineField()
+    thermal_mass = _EngineField()
+    base_load = _EngineField()
+    hvac_capacity = _EngineField()
+    indoor_temp = _EngineField()
+    hvac_setpoint = _EngineField()
+    outdoor_temp = _EngineField()
+    
     def __init__(self, zone_id, zone_name, floor_area, occupancy_capacity):
+        self._engine = None
+        self._engine_index = None
+        
         self.zone_id = zone_id
         self.zone_name = zone_name
         self.floor_area = floor_area  # square meters
@@ -20,7 +55,7 @@ class BuildingZone:
         self.indoor_temp = 22  # °C
         self.hvac_setpoint = 22
         self.outdoor_temp = 20
-        
+    
     def simulate_step(self, hvac_power, solar_allocated, occupancy, outdoor_temp, dt=0.25):
         """Simulate one time step (dt in hours)"""
         
@@ -65,25 +100,146 @@ class BuildingZone:
         }
 
 
+class CampusEngine:
+    """Struct-of-arrays thermal model that advances every zone in one vectorized step
+    
+    Zones passed in are bound to the engine: their parameters and state become
+    views into the arrays below, so reading or writing zone.indoor_temp goes
+    straight to indoor_temp[i].
+    """
+    
+    FIELDS = ('floor_area', 'occupancy_capacity', 'thermal_mass', 'base_load',
+              'hvac_capacity', 'indoor_temp', 'hvac_setpoint', 'outdoor_temp')
+    
+    def __init__(self, zones):
+        self.zone_ids = [zone.zone_id for zone in zones]
+        self.index = {zone_id: i for i, zone_id in enumerate(self.zone_ids)}
+        
+        for field in self.FIELDS:
+            setattr(self, field, np.array([getattr(zone, field) for zone in zones], dtype=float))
+        
+        for i, zone in enumerate(zones):
+            for field in self.FIELDS:
+                zone.__dict__.pop(field, None)
+            zone._engine = self
+            zone._engine_index = i
+    
+    def __len__(self):
+        return len(self.zone_ids)
+    
+    def to_array(self, values, default=0.0):
+        """Convert a {zone_id: value} dict (or an array in zone order) to an array"""
+        if isinstance(values, dict):
+            return np.array([values.get(zone_id, default) for zone_id in self.zone_ids], dtype=float)
+        return np.broadcast_to(np.asarray(values, dtype=float), (len(self),))
+    
+    def base_consumption(self, occupancy):
+        """Base electrical load (kW) of every zone at the given occupancy"""
+        occupancy_factor = occupancy / np.maximum(self.occupancy_capacity, 1)
+        return self.base_load * (0.3 + 0.7 * occupancy_factor)
+    
+    def step(self, hvac_power, occupancy, solar_generation, outdoor_temp, dt=0.25):
+        """Advance all zones by one time step (dt in hours)
+        
+        hvac_power and occupancy are arrays in zone order. Campus solar is
+        allocated proportionally to zone consumption. Returns a dict of arrays.
+        """
+        hvac_power = np.asarray(hvac_power, dtype=float)
+        occupancy = np.asarray(occupancy, dtype=float)
+        
+        self.outdoor_temp[:] = outdoor_temp
+        
+        # Consumption and proportional solar allocation
+        base_consumption = self.base_consumption(occupancy)
+        total_consumption = base_consumption + np.abs(hvac_power)
+        campus_consumption = total_consumption.sum()
+        if campus_consumption == 0:
+            solar_allocated = np.zeros(len(self))
+        else:
+            solar_allocated = solar_generation * (total_consumption / campus_consumption)
+        
+        # Thermal update
+        occupancy_heat = occupancy * 0.1
+        heat_loss = (self.indoor_temp - self.outdoor_temp) * (self.floor_area / 10000)
+        hvac_effect = hvac_power / self.thermal_mass
+        natural_change = (heat_loss + occupancy_heat) / self.thermal_mass
+        self.indoor_temp += (hvac_effect - natural_change) * dt
+        
+        return {
+            'indoor_temp': self.indoor_temp.copy(),
+            'hvac_power': hvac_power,
+            'base_load': base_consumption,
+            'total_consumption': total_consumption,
+            'solar_used': np.minimum(solar_allocated, total_consumption),
+            'grid_used': np.maximum(0, total_consumption - solar_allocated),
+            'occupancy': occupancy
+        }
+    
+    def advance(self, hvac_power, occupancy, solar_generation, outdoor_temp, dt=0.25,
+                method='euler', tolerance=None):
+        """Advance all zones N steps at once with HVAC power held constant
+        
+        occupancy is (N, Z); solar_generation and outdoor_temp are (N,).
+        Uses the closed-form transition in utils.thermal instead of N calls to
+        step(). Returns a dict of (N, Z) arrays, one row per step.
+        """
+        hvac_power = np.asarray(hvac_power, dtype=float)
+        occupancy = np.asarray(occupancy, dtype=float)
+        solar_generation = np.asarray(solar_generation, dtype=float)
+        outdoor_temp = np.asarray(outdoor_temp, dtype=float)
+        n_steps = occupancy.shape[0]
+        
+        indoor_temp = propagate_temperature(
+            self.indoor_temp, hvac_power, occupancy * 0.1, outdoor_temp,
+            self.thermal_mass, self.floor_area / 10000, dt, method, tolerance
+        )
+        if n_steps:
+            self.indoor_temp[:] = indoor_temp[-1]
+            self.outdoor_temp[:] = outdoor_temp[-1]
+        
+        # Consumption and proportional solar allocation for every step
+        base_consumption = self.base_consumption(occupancy)
+        total_consumption = base_consumption + np.abs(hvac_power)
+        campus_consumption = total_consumption.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(campus_consumption > 0, total_consumption / campus_consumption, 0.0)
+        solar_allocated = solar_generation[:, None] * share
+        
+        return {
+            'indoor_temp': indoor_temp,
+            'hvac_power': np.broadcast_to(hvac_power, total_consumption.shape),
+            'base_load': base_consumption,
+            'total_consumption': total_consumption,
+            'solar_used': np.minimum(solar_allocated, total_consumption),
+            'grid_used': np.maximum(0, total_consumption - solar_allocated),
+            'occupancy': occupancy
+        }
+
+
 class MultiZoneUniversity:
     """University campus with multiple independently controlled zones"""
     
-    def __init__(self):
+    def __init__(self, zones=None):
         # Define realistic university zones
-        self.zones = {
-            'engineering': BuildingZone('engineering', 'Engineering Building', 3000, 150),
-            'library': BuildingZone('library', 'Main Library', 2500, 200),
-            'admin': BuildingZone('admin', 'Administration', 2000, 80),
-            'science_floor1': BuildingZone('science_floor1', 'Science Building - Floor 1', 1500, 100),
-            'science_floor2': BuildingZone('science_floor2', 'Science Building - Floor 2', 1500, 100),
-            'cafeteria': BuildingZone('cafeteria', 'Student Cafeteria', 1000, 250),
-            'dorms_east': BuildingZone('dorms_east', 'Dormitories East Wing', 2000, 120),
-            'dorms_west': BuildingZone('dorms_west', 'Dormitories West Wing', 2000, 120),
-        }
+        if zones is None:
+            zones = [
+                BuildingZone('engineering', 'Engineering Building', 3000, 150),
+                BuildingZone('library', 'Main Library', 2500, 200),
+                BuildingZone('admin', 'Administration', 2000, 80),
+                BuildingZone('science_floor1', 'Science Building - Floor 1', 1500, 100),
+                BuildingZone('science_floor2', 'Science Building - Floor 2', 1500, 100),
+                BuildingZone('cafeteria', 'Student Cafeteria', 1000, 250),
+                BuildingZone('dorms_east', 'Dormitories East Wing', 2000, 120),
+                BuildingZone('dorms_west', 'Dormitories West Wing', 2000, 120),
+            ]
+        self.zones = {zone.zone_id: zone for zone in zones}
+        
+        # All zone parameters and state live here; the zones are views into it
+        self.engine = CampusEngine(list(self.zones.values()))
         
         # Total solar capacity (shared across campus)
         self.total_solar_capacity = 300  # kW peak
-        
+    
     def get_zone_ids(self):
         return list(self.zones.keys())
     
@@ -104,46 +260,58 @@ class MultiZoneUniversity:
         
         return allocations
     
+    def simulate_step_arrays(self, hvac_powers, occupancies, solar_generation, outdoor_temp, dt=0.25):
+        """Simulate all zones for one timestep without building per-zone dicts
+        
+        hvac_powers and occupancies may be arrays in get_zone_ids() order or
+        {zone_id: value} dicts. Returns (zone arrays, campus summary).
+        """
+        engine = self.engine
+        step = engine.step(engine.to_array(hvac_powers), engine.to_array(occupancies),
+                           solar_generation, outdoor_temp, dt)
+        
+        total_consumption = float(step['total_consumption'].sum())
+        summary = {
+            'total_consumption': total_consumption,
+            'total_solar_used': float(step['solar_used'].sum()),
+            'total_grid_used': float(step['grid_used'].sum()),
+            'solar_generation': solar_generation,
+            'solar_excess': max(0, solar_generation - total_consumption)
+        }
+        return step, summary
+    
+    def advance(self, hvac_powers, occupancies, solar_generation, outdoor_temp, dt=0.25,
+                method='euler', tolerance=None):
+        """Simulate N timesteps with constant HVAC power in one shot
+        
+        hvac_powers: array in get_zone_ids() order or {zone_id: kW} dict.
+        occupancies: (N, Z) array. See CampusEngine.advance.
+        """
+        return self.engine.advance(self.engine.to_array(hvac_powers), occupancies,
+                                   solar_generation, outdoor_temp, dt, method, tolerance)
+    
     def simulate_step(self, zone_hvac_powers, zone_occupancies, solar_generation, outdoor_temp, dt=0.25):
         """Simulate all zones for one timestep"""
         
-        # First pass: calculate consumptions
-        zone_consumptions = {}
-        for zone_id, zone in self.zones.items():
-            hvac_power = zone_hvac_powers.get(zone_id, 0)
-            occupancy = zone_occupancies.get(zone_id, 0)
-            
-            # Quick consumption estimate
-            occupancy_factor = occupancy / max(zone.occupancy_capacity, 1)
-            base = zone.base_load * (0.3 + 0.7 * occupancy_factor)
-            zone_consumptions[zone_id] = base + abs(hvac_power)
-        
-        # Allocate solar
-        solar_allocations = self.allocate_solar(solar_generation, zone_consumptions)
-        
-        # Second pass: simulate with solar allocations
+        step, summary = self.simulate_step_arrays(zone_hvac_powers, zone_occupancies,
+                                                  solar_generation, outdoor_temp, dt)
+        
         results = {}
-        for zone_id, zone in self.zones.items():
-            hvac_power = zone_hvac_powers.get(zone_id, 0)
-            occupancy = zone_occupancies.get(zone_id, 0)
-            solar_allocated = solar_allocations.get(zone_id, 0)
-            
-            result = zone.simulate_step(hvac_power, solar_allocated, occupancy, outdoor_temp, dt)
-            results[zone_id] = result
-        
-        # Campus-wide summary
-        total_consumption = sum(r['total_consumption'] for r in results.values())
-        total_solar_used = sum(r['solar_used'] for r in results.values())
-        total_grid_used = sum(r['grid_used'] for r in results.values())
-        solar_excess = max(0, solar_generation - total_consumption)
+        for i, (zone_id, zone) in enumerate(self.zones.items()):
+            results[zone_id] = {
+                'zone_id': zone_id,
+                'zone_name': zone.zone_name,
+                'indoor_temp': float(step['indoor_temp'][i]),
+                'hvac_power': zone_hvac_powers.get(zone_id, 0),
+                'base_load': float(step['base_load'][i]),
+                'total_consumption': float(step['total_consumption'][i]),
+                'solar_used': float(step['solar_used'][i]),
+                'grid_used': float(step['grid_used'][i]),
+                'occupancy': zone_occupancies.get(zone_id, 0),
+                'outdoor_temp': outdoor_temp
+            }
         
         return {
             'zones': results,
-            'campus_summary': {
-                'total_consumption': total_consumption,
-                'total_solar_used': total_solar_used,
-                'total_grid_used': total_grid_used,
-                'solar_generation': solar_generation,
-                'solar_excess': solar_excess
-            }
+            'campus_summary': summary
         }
@@ -0,0 +1,369 @@
+# closed_loop.py
+"""
+Closed-Loop Multi-Zone Runner
+Applies setpoint decisions to MultiZoneUniversity and advances the physics,
+so the energy, cost and comfort effect of a decision maker is measured
+instead of only recorded
+
+Decisions are receding-horizon: every hour a decider sees the current
+state and the next 4 hours of forecast and returns setpoints for all
+zones. With pipelining, the decision for the next hour is computed in a
+background thread (from the state the model predicts for that hour) while
+the physics advances the current one.
+"""
+from building_zones import MultiZoneUniversity
+from zone_data_generator import ZoneDataGenerator
+from controllers import OccupancySetpointPolicy, ProportionalController, SetpointOptimizer, residential_mask
+from scenario_runner import COMFORT_BAND
+from utils.storage import TableWriter
+from utils.thermal import propagate_temperature
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import abc
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+DECISION_STEPS = 4    # 15-min steps per decision (hourly, as in simulate_building_data.py)
+HORIZON = 16          # 15-min steps of forecast each decision sees (4 hours)
+SETPOINT_RANGE = (20.0, 24.0)
+
+
+# ============ DECIDERS ============
+
+class Decider(abc.ABC):
+    """
+    State + forecast -> setpoints (°C) for every zone
+    
+    state: arrays in zone order (indoor_temp, hvac_setpoint, occupancy,
+    hvac_power, total_consumption, grid_used, solar_used, outdoor_temp)
+    forecast: {'occupancy': (N, Z), 'outdoor_temp', 'price', 'carbon', 'solar': (N,)}
+    """
+    name = 'decider'
+    
+    @abc.abstractmethod
+    def decide(self, timestamp, zones, state, forecast):
+        """Setpoints for the next decision period, in zone order"""
+
+
+class PolicyDecider(Decider):
+    """Rule-based setpoints (the simulate_building_data.py baseline)"""
+    name = 'policy'
+    
+    def __init__(self, policy=None):
+        self.policy = policy or OccupancySetpointPolicy()
+    
+    def decide(self, timestamp, zones, state, forecast):
+        capacity = np.array([zone.occupancy_capacity for zone in zones], dtype=float)
+        residential = residential_mask([zone.zone_id for zone in zones])
+        return self.policy(state['occupancy'], capacity, pd.Timestamp(timestamp).hour, residential)
+
+
+class OptimizerDecider(Decider):
+    """Model-predictive setpoints from controllers.SetpointOptimizer"""
+    name = 'optimizer'
+    
+    def __init__(self, optimizer=None):
+        self.optimizer = optimizer or SetpointOptimizer()
+    
+    def decide(self, timestamp, zones, state, forecast):
+        plan = self.optimizer.optimize(zones, state['indoor_temp'], forecast['occupancy'],
+                                       forecast['outdoor_temp'], forecast['price'], forecast['carbon'],
+                                       forecast['solar'], current_setpoint=state['hvac_setpoint'])
+        return plan['setpoint']
+
+
+class OrchestratorDecider(Decider):
+    """
+    Setpoints from the Orchestrator agent
+    
+    use_optimizer: OrchestratorAgent.optimize (explain adds one LLM call);
+    otherwise the LLM decides through coordinate_batch. Setpoints are
+    clamped to SETPOINT_RANGE and non-numeric answers keep the current value.
+    """
+    name = 'orchestrator'
+    
+    def __init__(self, orchestrator=None, use_optimizer=True, explain=False):
+        if orchestrator is None:
+            from agents.corrdinator import OrchestratorAgent
+            orchestrator = OrchestratorAgent()
+        self.orchestrator = orchestrator
+        self.use_optimizer = use_optimizer
+        self.explain = explain
+    
+    def decide(self, timestamp, zones, state, forecast):
+        zone_states = {
+            zone.zone_id: {
+                'indoor_temp': float(state['indoor_temp'][i]),
+                'outdoor_temp': float(state['outdoor_temp'][i]),
+                'hvac_setpoint': float(state['hvac_setpoint'][i]),
+                'occupancy': int(state['occupancy'][i]),
+                'solar_generation': float(state['solar_used'][i]),
+                'total_consumption': float(state['total_consumption'][i]),
+                'grid_used': float(state['grid_used'][i]),
+                'hvac_power': float(state['hvac_power'][i])
+            }
+            for i, zone in enumerate(zones)
+        }
+        timestamp = pd.Timestamp(timestamp)
+        if self.use_optimizer:
+            decisions = self.orchestrator.optimize(timestamp, zones, zone_states, forecast, explain=self.explain)
+        else:
+            decisions = self.orchestrator.coordinate_batch(timestamp, zone_states, {})
+        
+        setpoints = np.array(state['hvac_setpoint'], dtype=float)
+        for i, zone in enumerate(zones):
+            value = decisions.get(zone.zone_id, {}).get('hvac_setpoint')
+            if isinstance(value, (int, float)):
+                setpoints[i] = value
+        return np.clip(setpoints, *SETPOINT_RANGE)
+
+
+DECIDERS = {
+    'policy': PolicyDecider,
+    'optimizer': OptimizerDecider,
+    'orchestrator': OrchestratorDecider,
+}
+
+
+# ============ CLOSED LOOP ============
+
+def load_forecast(days):
+    """Forecast table for `days` days (generated if the saved one is too short)"""
+    forecast_data = ZoneDataGenerator.load('zone_forecast_data.parquet')
+    if forecast_data is None or len(forecast_data) < days * 24 * 4:
+        generator = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=days)
+        forecast_data = generator.save('zone_forecast_data.parquet')
+    return forecast_data.iloc[:days * 24 * 4].reset_index(drop=True)
+
+def _timed_decide(decider, timestamp, zones, state, forecast):
+    start = time.perf_counter()
+    setpoints = np.asarray(decider.decide(timestamp, zones, state, forecast), dtype=float)
+    return setpoints, time.perf_counter() - start
+
+def run_closed_loop(decider, days=7, forecast_data=None, output_file=None, pipeline=True, stale_ok=False,
+                    controller=None, integrator='euler', batch_rows=50000, verbose=True):
+    """
+    Run the campus with `decider` in the loop; returns the run metrics
+    
+    pipeline: compute the next hour's decision in the background while the
+    physics advances (from the predicted start-of-hour state, which is exact
+    for the model and forecast used here)
+    stale_ok: never wait for a slow decider; keep the current setpoints and
+    apply its answer when it arrives (for LLM deciders on long runs)
+    output_file: optional .parquet/.csv with the same columns as
+    building_simulation_data, so main_multizone can analyze the run
+    """
+    if isinstance(decider, str):
+        decider = DECIDERS[decider]()
+    forecast_data = load_forecast(days) if forecast_data is None else forecast_data
+    
+    campus = MultiZoneUniversity()
+    engine = campus.engine
+    zone_ids = campus.get_zone_ids()
+    zones = [campus.get_zone(zone_id) for zone_id in zone_ids]
+    n_zones = len(zone_ids)
+    controller = controller or ProportionalController(gain=50)
+    controller.reset()
+    
+    occupancy = forecast_data[[f'{zone_id}_occupancy' for zone_id in zone_ids]].to_numpy(dtype=float)
+    timestamps = forecast_data['timestamp'].to_numpy()
+    solar = forecast_data['solar_forecast'].to_numpy(dtype=float)
+    outdoor = forecast_data['outdoor_temp'].to_numpy(dtype=float)
+    price = forecast_data['electricity_price'].to_numpy(dtype=float)
+    carbon = forecast_data['grid_carbon_intensity'].to_numpy(dtype=float)
+    n_steps = len(forecast_data)
+    
+    def forecast_at(idx):
+        window = slice(idx, min(idx + HORIZON, n_steps))
+        return {'occupancy': occupancy[window], 'outdoor_temp': outdoor[window], 'price': price[window],
+                'carbon': carbon[window], 'solar': solar[window]}
+    
+    def decision_state(observed, idx, indoor_temp):
+        """What the decision for step idx sees: the last observations plus that step's occupancy and weather"""
+        return {**observed, 'indoor_temp': indoor_temp, 'hvac_setpoint': engine.hvac_setpoint.copy(),
+                'occupancy': occupancy[idx].copy(), 'outdoor_temp': np.full(n_zones, outdoor[idx])}
+    
+    # Last observed values, in zone order
+    state = {
+        'indoor_temp': engine.indoor_temp.copy(),
+        'hvac_setpoint': engine.hvac_setpoint.copy(),
+        'occupancy': occupancy[0].copy(),
+        'outdoor_temp': np.full(n_zones, outdoor[0]),
+        **{key: np.zeros(n_zones) for key in ('hvac_power', 'total_consumption', 'grid_used', 'solar_used')}
+    }
+    
+    writer = None
+    if output_file:
+        writer = TableWriter(output_file, batch_rows=batch_rows)
+        zone_id_array = np.array(zone_ids, dtype=object)
+        zone_name_array = np.array([zone.zone_name for zone in zones], dtype=object)
+    
+    energy = cost = carbon_kg = peak = degree_hours = occupied_degree_hours = 0.0
+    violations = 0
+    low, high = COMFORT_BAND
+    latencies = []
+    stale = 0
+    
+    if verbose:
+        print(f"🔁 Closed loop: {decider.name}, {n_steps // 96} days, "
+              f"{'pipelined' if pipeline else 'sequential'} decisions")
+    wall_start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=1) if pipeline else None
+    try:
+        setpoints, latency = _timed_decide(decider, timestamps[0], zones, state, forecast_at(0))
+        latencies.append(latency)
+        pending = None
+        
+        for idx in range(0, n_steps, DECISION_STEPS):
+            end = min(idx + DECISION_STEPS, n_steps)
+            
+            # Pick up the decision computed during the previous hour
+            if pending is not None and (pending.done() or not stale_ok):
+                setpoints, latency = pending.result()
+                latencies.append(latency)
+                pending = None
+            elif pending is not None:
+                stale += 1
+            
+            engine.hvac_setpoint[:] = setpoints
+            hvac_power = controller(engine.hvac_setpoint, engine.indoor_temp, engine.hvac_capacity, dt=1.0)
+            
+            # Start the next decision from the predicted start-of-next-hour state
+            if executor is not None and end < n_steps and pending is None:
+                predicted = propagate_temperature(
+                    engine.indoor_temp, hvac_power, occupancy[idx:end] * 0.1, outdoor[idx:end],
+                    engine.thermal_mass, engine.floor_area / 10000, method=integrator
+                )[-1]
+                pending = executor.submit(_timed_decide, decider, timestamps[end], zones,
+                                          decision_state(state, end, predicted), forecast_at(end))
+            
+            result = campus.advance(hvac_power, occupancy[idx:end], solar[idx:end], outdoor[idx:end],
+                                    method=integrator)
+            
+            grid = result['grid_used'].sum(axis=1)
+            energy += result['total_consumption'].sum() * 0.25
+            cost += (grid * price[idx:end]).sum() * 0.25
+            carbon_kg += (grid * carbon[idx:end]).sum() * 0.25 / 1000
+            peak = max(peak, grid.max())
+            
+            temps = result['indoor_temp']
+            outside = np.maximum(low - temps, 0) + np.maximum(temps - high, 0)
+            violations += int((outside > 0).sum())
+            degree_hours += outside.sum() * 0.25
+            occupied_degree_hours += (outside * (occupancy[idx:end] > 0)).sum() * 0.25
+            
+            state = {
+                'indoor_temp': engine.indoor_temp.copy(),
+                'hvac_setpoint': engine.hvac_setpoint.copy(),
+                'occupancy': occupancy[end - 1].copy(),
+                'outdoor_temp': np.full(n_zones, outdoor[end - 1]),
+                'hvac_power': np.asarray(hvac_power, dtype=float).copy(),
+                **{key: result[key][-1].copy() for key in ('total_consumption', 'grid_used', 'solar_used')}
+            }
+            
+            if writer is not None:
+                n = end - idx
+                writer.append({
+                    'timestamp': np.repeat(timestamps[idx:end], n_zones),
+                    'zone_id': np.tile(zone_id_array, n),
+                    'zone_name': np.tile(zone_name_array, n),
+                    'hvac_setpoint': np.tile(engine.hvac_setpoint.copy(), n),
+                    **{key: values.ravel() for key, values in result.items()},
+                    'occupancy': result['occupancy'].astype(int).ravel(),
+                    'outdoor_temp': np.repeat(outdoor[idx:end], n_zones),
+                    'solar_forecast': np.repeat(solar[idx:end], n_zones),
+                    'electricity_price': np.repeat(price[idx:end], n_zones),
+                    'grid_carbon_intensity': np.repeat(carbon[idx:end], n_zones)
+                })
+            
+            # Sequential mode decides only once the hour has been simulated
+            if executor is None and end < n_steps:
+                setpoints, latency = _timed_decide(decider, timestamps[end], zones,
+                                                   decision_state(state, end, state['indoor_temp']),
+                                                   forecast_at(end))
+                latencies.append(latency)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    if writer is not None:
+        output_file = writer.close()
+    elapsed = time.perf_counter() - wall_start
+    
+    metrics = {
+        'decider': decider.name,
+        'energy_kwh': float(energy),
+        'cost': float(cost),
+        'carbon_kg': float(carbon_kg),
+        'peak_grid_kw': float(peak),
+        'comfort_violations': violations,
+        'comfort_degree_hours': float(degree_hours),
+        'occupied_degree_hours': float(occupied_degree_hours),
+        'decisions': len(latencies),
+        'stale_hours': stale,
+        'decision_ms_mean': float(np.mean(latencies) * 1000),
+        'decision_ms_max': float(np.max(latencies) * 1000),
+        'wall_seconds': elapsed,
+        'simulated_hours_per_second': (n_steps / 4) / elapsed if elapsed > 0 else float('inf'),
+        'output_file': output_file
+    }
+    if verbose:
+        print(f"   ✅ {metrics['energy_kwh']:,.0f} kWh | ${metrics['cost']:,.2f} | "
+              f"{metrics['carbon_kg']:,.0f} kg CO2 | {metrics['occupied_degree_hours']:.1f} occupied °C·h "
+              f"| {elapsed:.1f}s")
+    return metrics
+
+def compare(deciders=('policy', 'optimizer'), days=7, forecast_data=None, **kwargs):
+    """Run each decider on the same forecast; returns a table with deltas against the first"""
+    forecast_data = load_forecast(days) if forecast_data is None else forecast_data
+    rows = [run_closed_loop(decider, days=days, forecast_data=forecast_data, **kwargs) for decider in deciders]
+    table = pd.DataFrame(rows).drop(columns=['output_file'])
+    for metric in ('energy_kwh', 'cost', 'carbon_kg'):
+        baseline = table[metric].iloc[0]
+        table[f'{metric}_change_%'] = (table[metric] / baseline - 1) * 100 if baseline else 0.0
+    return table
+
+def run_comparison(days=7, deciders=('policy', 'optimizer')):
+    """Command-line entry point: python closed_loop.py [days] [decider ...]"""
+    
+    print("="*70)
+    print("🔁 CLOSED-LOOP MULTI-ZONE EVALUATION")
+    print("="*70)
+    
+    if len(sys.argv) > 1:
+        try:
+            days = int(sys.argv[1])
+        except:
+            print(f"⚠️  Invalid days parameter, using default: {days}")
+    
+    if len(sys.argv) > 2:
+        deciders = ('policy',) + tuple(name for name in sys.argv[2:] if name != 'policy')
+    
+    unknown = [name for name in deciders if name not in DECIDERS]
+    if unknown:
+        print(f"❌ Unknown decider(s) {unknown}, expected {list(DECIDERS)}")
+        return None
+    
+    print(f"\n⚙️  Configuration:")
+    print(f"   Duration: {days} days")
+    print(f"   Deciders: {', '.join(deciders)} (hourly, {HORIZON // 4}h horizon)")
+    
+    print(f"\n📊 Loading forecast data...")
+    forecast_data = load_forecast(days)
+    print(f"   ✅ Using {len(forecast_data)} timesteps\n")
+    
+    table = compare(deciders, days=days, forecast_data=forecast_data)
+    columns = ['decider', 'energy_kwh', 'cost', 'carbon_kg', 'peak_grid_kw', 'occupied_degree_hours',
+               'energy_kwh_change_%', 'cost_change_%', 'decision_ms_mean', 'simulated_hours_per_second']
+    
+    print(f"\n📊 CLOSED-LOOP RESULTS (vs {deciders[0]})")
+    print(f"="*70)
+    print(table[columns].round(2).to_string(index=False))
+    table.to_csv('closed_loop_results.csv', index=False)
+    print(f"\n📁 Results saved to: closed_loop_results.csv")
+    return table
+
+if __name__ == "__main__":
+    run_comparison()
@@ -0,0 +1,19 @@
+# conftest.py
+"""
+Test setup shared by the root-level test modules
+
+The agent package directory is Agents/ but the code imports it as
+`agents`, which only resolves on case-insensitive filesystems. Register
+an `agents` package over that directory so the agent tests run
+everywhere instead of failing to import.
+"""
+import os
+import sys
+import types
+
+try:
+    import agents  # noqa: F401
+except ImportError:
+    agents = types.ModuleType('agents')
+    agents.__path__ = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Agents')]
+    sys.modules['agents'] = agents
@@ -0,0 +1,261 @@
+# controllers.py
+"""
+HVAC control policies that act on every zone at once
+
+A control step has two parts. A setpoint policy maps occupancy and time of
+day to setpoints, and an HVAC controller turns setpoint error into power.
+Both take and return arrays in zone order, so the simulation loop makes
+one call per control step whatever the number of zones. Pair any policy
+with any controller to compare them on the same engine.
+
+SetpointOptimizer plans setpoints over a forecast horizon instead of
+reacting to the current hour.
+"""
+import abc
+import itertools
+import numpy as np
+from utils.thermal import transition
+
+
+def residential_mask(zone_ids):
+    """Zones exempt from the night setback (dorms are occupied overnight)"""
+    return np.array(['dorm' in zone_id for zone_id in zone_ids])
+
+
+# ============ SETPOINT POLICIES ============
+
+class SetpointPolicy(abc.ABC):
+    """Occupancy and hour of day -> setpoint (°C) per zone"""
+    
+    @abc.abstractmethod
+    def __call__(self, occupancy, capacity, hour, residential):
+        """Setpoints for zones with this occupancy, in zone order"""
+
+
+class OccupancySetpointPolicy(SetpointPolicy):
+    """
+    Tighter comfort when a zone is busy, relaxed when it is empty,
+    and a night setback outside the residential zones
+    
+    levels: setpoints for >high, >low and the rest of the occupancy range
+    night_setpoint: setback value (None disables the setback)
+    """
+    def __init__(self, levels=(22.0, 22.5, 23.0), thresholds=(0.5, 0.2),
+                 night_setpoint=24.0, night_hours=(6, 22)):
+        self.levels = levels
+        self.thresholds = thresholds
+        self.night_setpoint = night_setpoint
+        self.night_hours = night_hours
+    
+    def __call__(self, occupancy, capacity, hour, residential):
+        fraction = np.asarray(occupancy, dtype=float) / np.asarray(capacity, dtype=float)
+        high, low = self.thresholds
+        setpoints = np.where(fraction > high, self.levels[0],
+                             np.where(fraction > low, self.levels[1], self.levels[2]))
+        
+        start, end = self.night_hours
+        if self.night_setpoint is not None and (hour < start or hour > end):
+            setpoints = np.where(residential, setpoints, self.night_setpoint)
+        return setpoints
+
+
+class FixedSetpointPolicy(SetpointPolicy):
+    """The same setpoint everywhere, all the time"""
+    
+    def __init__(self, setpoint=22.0):
+        self.setpoint = setpoint
+    
+    def __call__(self, occupancy, capacity, hour, residential):
+        return np.full(np.shape(occupancy), self.setpoint, dtype=float)
+
+
+# ============ HVAC CONTROLLERS ============
+
+class HVACController(abc.ABC):
+    """Setpoint error -> HVAC power (kW, + cooling / - heating) per zone"""
+    
+    def reset(self):
+        """Forget any internal state (integrators etc.)"""
+    
+    def state(self):
+        """Internal state as plain lists, for checkpoints"""
+        return {}
+    
+    def load_state(self, state):
+        pass
+    
+    @abc.abstractmethod
+    def __call__(self, setpoint, indoor_temp, capacity, dt=0.25):
+        """Power per zone for one control step of dt hours"""
+
+
+class ProportionalController(HVACController):
+    """power = gain * (setpoint - indoor_temp), clamped to ±capacity"""
+    
+    def __init__(self, gain=50.0):
+        self.gain = gain
+    
+    def __call__(self, setpoint, indoor_temp, capacity, dt=0.25):
+        error = np.asarray(setpoint, dtype=float) - np.asarray(indoor_temp, dtype=float)
+        return np.clip(error * self.gain, -np.asarray(capacity), np.asarray(capacity))
+
+
+class PIController(HVACController):
+    """
+    Proportional-integral control with conditional integration
+    
+    The integral (°C·h) only accumulates while the output is not saturated
+    in the direction of the error, so it does not wind up when a zone is at
+    full HVAC capacity.
+    """
+    def __init__(self, kp=50.0, ki=10.0):
+        self.kp = kp
+        self.ki = ki
+        self.integral = None
+    
+    def reset(self):
+        self.integral = None
+    
+    def state(self):
+        return {'integral': None if self.integral is None else self.integral.tolist()}
+    
+    def load_state(self, state):
+        integral = state.get('integral')
+        self.integral = None if integral is None else np.asarray(integral, dtype=float)
+    
+    def __call__(self, setpoint, indoor_temp, capacity, dt=0.25):
+        error = np.asarray(setpoint, dtype=float) - np.asarray(indoor_temp, dtype=float)
+        capacity = np.asarray(capacity, dtype=float)
+        if self.integral is None or self.integral.shape != error.shape:
+            self.integral = np.zeros_like(error)
+        
+        candidate = self.integral + error * dt
+        raw = self.kp * error + self.ki * candidate
+        winding_up = ((raw > capacity) & (error > 0)) | ((raw < -capacity) & (error < 0))
+        self.integral = np.where(winding_up, self.integral, candidate)
+        
+        return np.clip(self.kp * error + self.ki * self.integral, -capacity, capacity)
+
+
+# ============ MODEL-PREDICTIVE SETPOINTS ============
+
+class SetpointOptimizer:
+    """
+    Model-predictive setpoint planning over a short horizon, all zones at once
+    
+    Every setpoint trajectory (one level per block of move_steps steps) is
+    simulated through the zone thermal model under `controller`, which sets
+    power at the start of each block and holds it, as the hourly control
+    loops do. Each zone keeps the cheapest trajectory:
+        cost = grid energy * (price + carbon_price * carbon intensity)
+             + comfort_weight * (°C outside the comfort band)² per hour
+             + move_weight * |setpoint change|
+    The comfort band is used when a zone is occupied, unoccupied_band when
+    it is empty. Zones are coupled only through the solar split, which is
+    fixed up front, so they are optimized independently and in one pass.
+    """
+    def __init__(self, levels=(20.0, 21.0, 22.0, 23.0, 24.0), horizon=16, move_steps=4,
+                 controller=None, comfort_band=(20.0, 24.0), unoccupied_band=(18.0, 26.0),
+                 comfort_weight=2.0, carbon_price=0.00005, move_weight=0.01, dt=0.25):
+        self.levels = np.asarray(levels, dtype=float)
+        self.horizon = horizon
+        self.move_steps = move_steps
+        self.controller = controller or ProportionalController(gain=50.0)
+        self.comfort_band = comfort_band
+        self.unoccupied_band = unoccupied_band
+        self.comfort_weight = comfort_weight
+        self.carbon_price = carbon_price      # $ per gCO2
+        self.move_weight = move_weight
+        self.dt = dt
+        
+        blocks = -(-horizon // move_steps)
+        # (K, blocks) candidate trajectories, expanded to (K, horizon) steps
+        self.candidates = np.array(list(itertools.product(self.levels, repeat=blocks)))
+        self.trajectories = np.repeat(self.candidates, move_steps, axis=1)[:, :horizon]
+    
+    def optimize(self, zones, indoor_temp, occupancy, outdoor_temp, price, carbon, solar,
+                 current_setpoint=None):
+        """
+        Plan setpoints for the given zones
+        
+        zones: BuildingZone objects (for the thermal and load parameters)
+        indoor_temp: (Z,) current temperatures
+        occupancy: (N, Z); outdoor_temp, price, carbon: (N,)
+        solar: (N,) campus generation, split by base load, or (N, Z) per zone
+        Forecasts shorter than the horizon are extended with their last value.
+        Returns a dict of arrays in zone order: setpoint (first move),
+        trajectory (K blocks), hvac_power (first step), predicted_temp (N, Z),
+        cost, energy_cost and comfort_violation (°C·h).
+        """
+        params = {field: np.array([getattr(zone, field) for zone in zones], dtype=float)
+                  for field in ('thermal_mass', 'floor_area', 'base_load', 'occupancy_capacity', 'hvac_capacity')}
+        n_steps = self.horizon
+        occupancy = self._extend(np.asarray(occupancy, dtype=float).reshape(-1, len(zones)), n_steps)
+        outdoor_temp = self._extend(outdoor_temp, n_steps)
+        price = self._extend(price, n_steps)
+        carbon = self._extend(carbon, n_steps)
+        
+        base = params['base_load'] * (0.3 + 0.7 * occupancy / np.maximum(params['occupancy_capacity'], 1))
+        solar = np.asarray(solar, dtype=float)
+        if solar.ndim == 1:
+            solar = self._extend(solar, n_steps)[:, None] * base / np.maximum(base.sum(axis=1, keepdims=True), 1e-9)
+        else:
+            solar = self._extend(solar, n_steps)
+        
+        loss_coeff = params['floor_area'] / 10000
+        phi, gain = transition(params['thermal_mass'], loss_coeff, self.dt, 'euler')
+        
+        # Closed-loop rollout of every candidate: arrays are (K, Z)
+        n_candidates = len(self.trajectories)
+        temp = np.broadcast_to(np.asarray(indoor_temp, dtype=float), (n_candidates, len(zones))).copy()
+        self.controller.reset()
+        unit_price = price + self.carbon_price * carbon
+        occupied = occupancy > 0
+        low = np.where(occupied, self.comfort_band[0], self.unoccupied_band[0])
+        high = np.where(occupied, self.comfort_band[1], self.unoccupied_band[1])
+        
+        energy_cost = np.zeros_like(temp)
+        violation = np.zeros_like(temp)
+        temps = np.empty((n_steps, n_candidates, len(zones)))
+        powers = np.empty((n_steps, n_candidates, len(zones)))
+        for n in range(n_steps):
+            # Like the plant, power is set at the start of each block and held through it
+            if n % self.move_steps == 0:
+                setpoint = self.trajectories[:, n][:, None]
+                power = self.controller(setpoint, temp, params['hvac_capacity'], dt=self.dt * self.move_steps)
+            grid = np.maximum(0, base[n] + np.abs(power) - solar[n])
+            energy_cost += grid * unit_price[n] * self.dt
+            temp = phi * temp + gain * (power + loss_coeff * outdoor_temp[n] - occupancy[n] * 0.1)
+            violation += (np.maximum(low[n] - temp, 0) + np.maximum(temp - high[n], 0)) ** 2 * self.dt
+            temps[n] = temp
+            powers[n] = power
+        
+        if current_setpoint is None:
+            current_setpoint = np.full(len(zones), np.nan)
+        current_setpoint = np.asarray(current_setpoint, dtype=float)
+        start = np.where(np.isnan(current_setpoint), self.candidates[:, :1], current_setpoint)
+        moves = np.abs(np.diff(self.candidates, axis=1)).sum(axis=1)[:, None] + np.abs(self.candidates[:, :1] - start)
+        cost = energy_cost + self.comfort_weight * violation + self.move_weight * moves
+        
+        best = cost.argmin(axis=0)
+        zone_index = np.arange(len(zones))
+        return {
+            'setpoint': self.candidates[best, 0],
+            'trajectory': self.candidates[best],
+            'hvac_power': powers[0, best, zone_index],
+            'predicted_temp': temps[:, best, zone_index],
+            'cost': cost[best, zone_index],
+            'energy_cost': energy_cost[best, zone_index],
+            'comfort_violation': violation[best, zone_index]
+        }
+    
+    @staticmethod
+    def _extend(values, n_steps):
+        """First n_steps rows, repeating the last one if the forecast is short"""
+        values = np.asarray(values, dtype=float)
+        if len(values) >= n_steps:
+            return values[:n_steps]
+        if len(values) == 0:
+            raise ValueError("Empty forecast")
+        pad = [(0, n_steps - len(values))] + [(0, 0)] * (values.ndim - 1)
+        return np.pad(values, pad, mode='edge')
@@ -7,8 +7,8 @@ from zone_data_generator import ZoneDataGenerator
 from datetime import datetime
 import sys
 
-def generate_data(days=1, filename='zone_forecast_data.csv'):
-    """Generate zone forecast data and save to CSV"""
+def generate_data(days=1, filename='zone_forecast_data.parquet', seed=None):
+    """Generate zone forecast data and save it (Parquet, or CSV for a .csv filename)"""
     
     print("="*70)
     print("📊 ZONE FORECAST DATA GENERATOR")
@@ -24,17 +24,24 @@ def generate_data(days=1, filename='zone_forecast_data.csv'):
     if len(sys.argv) > 2:
         filename = sys.argv[2]
     
+    if len(sys.argv) > 3:
+        try:
+            seed = int(sys.argv[3])
+        except:
+            print(f"⚠️  Invalid seed parameter, using random seed")
+    
     print(f"\n⚙️  Configuration:")
     print(f"   Duration: {days} day(s)")
     print(f"   Output file: {filename}")
     print(f"   Timesteps: {days * 24 * 4} (15-min intervals)")
+    print(f"   Seed: {seed if seed is not None else 'random'}")
     
     # Generate data
     start_date = datetime(2024, 3, 15, 8, 0)  # Friday 8 AM
-    generator = ZoneDataGenerator(start_date, days=days)
+    generator = ZoneDataGenerator(start_date, days=days, seed=seed)
     
     print(f"\n🔧 Generating data starting from {start_date.strftime('%Y-%m-%d %H:%M')}...")
-    data = generator.save_to_csv(filename)
+    data = generator.save(filename)
     
     # Show summary
     print(f"\n📈 Data Summary:")
@@ -70,6 +77,7 @@ def generate_data(days=1, filename='zone_forecast_data.csv'):
     print(f"\n💡 Tips:")
     print(f"   - Generate 7 days: python generate_zone_data.py 7")
     print(f"   - Custom filename: python generate_zone_data.py 1 my_data.csv")
+    print(f"   - Reproducible data: python generate_zone_data.py 30 zone_forecast_data.csv 42")
     print(f"   - Larger datasets take longer but provide more patterns")
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ from agents.corrdinator import OrchestratorAgent
 from building_model import UniversityBuilding
 from data_generator import CampusDataGenerator
 from utils.hist_tracker import HistoricalTracker
+from controllers import ProportionalController
 from datetime import datetime
 import pandas as pd
 import time
@@ -32,6 +33,7 @@ def run_multi_agent_simulation():
     
     # Initialize building
     building = UniversityBuilding()
+    hvac_controller = ProportionalController(gain=50)
     
     results = []
     
@@ -172,8 +174,8 @@ def run_multi_agent_simulation():
             sub_row = forecast_data.iloc[sub_idx]
             
             # Simple HVAC controller
-            temp_error = building.hvac_setpoint - building.indoor_temp
-            hvac_power = max(-building.hvac_capacity, min(building.hvac_capacity, temp_error * 50))
+            hvac_power = float(hvac_controller(building.hvac_setpoint, building.indoor_temp,
+                                               building.hvac_capacity, dt=0.25))
             
             result = building.simulate_step(
                 hvac_power=hvac_power,
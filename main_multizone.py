@@ -3,15 +3,59 @@
 AI Agent Analysis on Pre-Simulated Building Data
 Runs agents on selected time points to analyze and optimize
 """
-import time
+import os
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from agents.base import OllamaBaseAgent
 from agents.anomaly import SherlockAgent as AnomalyDetector
 from agents.solar import SolarProphetAgent as PVGenerationAgent
 from agents.grid import GridOracleAgent as CostEfficiencyAgent
 from agents.load import ComfortGuardianAgent as ComfortAgent
 from agents.corrdinator import OrchestratorAgent
+from agents.results import ZoneRecommendation
 from building_zones import MultiZoneUniversity
-from utils.hist_tracker import HistoricalTracker
+from utils.hist_tracker import HistoricalTracker, save_trackers, load_trackers
+from utils.timeseries_index import ZoneTimeIndex
+from utils.storage import read_table
+from utils.agent_metrics import metric_tags, tagged
+from utils.profiling import Profiler, profile_path
+
+# Zones to analyze (None = full campus, e.g. ['engineering', 'library'] for a quick test)
+ACTIVE_ZONES = None
+
+# Parallel execution settings
+ZONE_WORKERS = 8          # zones analyzed at the same time
+AGENT_WORKERS = 16        # agent calls in flight across all zones
+BACKEND_CONCURRENCY = 2   # simultaneous requests per model server
+SCHEDULER = True          # serve anomaly/orchestrator calls first and send duplicate prompts once
+
+# LLM response cache (None disables); reruns on the same data reuse answers
+AGENT_CACHE = 'agent_cache.sqlite'
+CACHE_QUANTIZE = None     # round context numbers to N decimals so near-identical states share entries
+
+# Per-call agent metrics (latency, queue wait, tokens, retries, parse failures) as JSON lines (None disables)
+AGENT_METRICS = 'agent_metrics.jsonl'
+
+# Phase timers and counters, written to agent_recommendations.profile.json (see utils/profiling.py)
+PROFILE = False
+
+# Rule-based screening of every 15-min record before the timepoint analysis
+SCREEN_ALL_RECORDS = True
+SCREEN_LLM_BUDGET = 20    # max ambiguous records escalated to the LLM per run
+
+# Historical baselines (24h and 7-day same-hour windows); set a .npz path to reuse them between runs
+BASELINE_WINDOWS = {'24h': 96, '7d': 672}
+BASELINE_FILE = None
+
+# One model call per agent per timepoint covering all zones (False = one call per agent per zone)
+BATCH_AGENTS = True
+
+# Grid Oracle analyzes price/carbon once per timepoint for the whole campus; zones reuse the result
+CAMPUS_GRID = True
+
+# Setpoint decisions: 'optimizer' (model-predictive plan, the LLM only explains it) or 'llm'
+SETPOINT_BACKEND = 'optimizer'
 
 def select_analysis_timepoints(data, num_points=5):
     """
@@ -40,12 +84,241 @@ def select_analysis_timepoints(data, num_points=5):
     
     return timepoints
 
-def analyze_timepoint(timestamp, simulation_data, campus, zone_agents, zone_trackers, active_zone_ids):
+def zone_state_from(zone_data):
+    """Agent-facing state dict from one simulation record"""
+    return {
+        'indoor_temp': float(zone_data['indoor_temp']),
+        'outdoor_temp': float(zone_data['outdoor_temp']),
+        'hvac_setpoint': float(zone_data['hvac_setpoint']),
+        'occupancy': int(zone_data['occupancy']),
+        'solar_generation': float(zone_data['solar_used']),
+        'total_consumption': float(zone_data['total_consumption']),
+        'grid_used': float(zone_data['grid_used']),
+        'hvac_power': float(zone_data['hvac_power'])
+    }
+
+def future_context(future_data):
+    """(solar, price, carbon) forecasts for the next 4 hours"""
+    if len(future_data) > 0:
+        future_solar = future_data['solar_forecast'].tolist()
+        future_prices = [{'time': f"+{i*15}min", 'price': float(p)}
+                        for i, p in enumerate(future_data['electricity_price'].tolist())]
+        future_carbon = [{'time': f"+{i*15}min", 'carbon_intensity': float(c)}
+                        for i, c in enumerate(future_data['grid_carbon_intensity'].tolist())]
+    else:
+        future_solar = [0] * 16
+        future_prices = [{'time': f"+{i*15}min", 'price': 0.15} for i in range(16)]
+        future_carbon = [{'time': f"+{i*15}min", 'carbon_intensity': 500} for i in range(16)]
+    return future_solar, future_prices, future_carbon
+
+def forecast_arrays(simulation_data, timestamp, zone_rows, steps=16):
+    """
+    Optimizer forecast for `steps` records starting with the current one (as
+    closed_loop plans): per-zone occupancy (N, Z) and campus outdoor
+    temperature, price, carbon and solar (N,)
+    Short lookaheads (end of the data) are padded by the optimizer.
+    """
+    def horizon(zone_id, row, column):
+        future = simulation_data.after(zone_id, timestamp, steps=steps - 1)
+        return np.r_[float(row[column]), future[column].to_numpy(dtype=float)]
+    
+    occupancy = [horizon(zone_id, row, 'occupancy') for zone_id, row in zone_rows.items()]
+    length = min(len(column) for column in occupancy)
+    
+    zone_id, row = next(iter(zone_rows.items()))
+    return {
+        'occupancy': np.column_stack([column[:length] for column in occupancy]),
+        'outdoor_temp': horizon(zone_id, row, 'outdoor_temp'),
+        'price': horizon(zone_id, row, 'electricity_price'),
+        'carbon': horizon(zone_id, row, 'grid_carbon_intensity'),
+        'solar': horizon(zone_id, row, 'solar_forecast')
+    }
+
+def zone_report(timestamp, zone, zone_data, anomaly_report, solar_rec, cost_rec, comfort_rec, decision):
+    """
+    Turn one zone's agent outputs into (recommendation, alert or None, log lines)
+    """
+    log = []
+    
+    log.append(f"\n📍 {zone.zone_name}")
+    log.append(f"   Indoor: {zone_data['indoor_temp']:.1f}°C | "
+               f"Setpoint: {zone_data['hvac_setpoint']:.1f}°C | "
+               f"Occupancy: {int(zone_data['occupancy'])}")
+    log.append(f"   Consumption: {zone_data['total_consumption']:.1f} kW | "
+               f"Grid: {zone_data['grid_used']:.1f} kW")
+    
+    alert = None
+    if anomaly_report.get('anomaly_detected', False):
+        severity = anomaly_report.get('severity', 'unknown')
+        log.append(f"   ⚠️  ANOMALY: {severity.upper()}")
+        log.append(f"      {anomaly_report.get('description', '')[:70]}")
+        
+        alert = {
+            'timestamp': timestamp,
+            'zone_id': zone.zone_id,
+            'zone_name': zone.zone_name,
+            'severity': severity,
+            'description': anomaly_report.get('description', ''),
+            'recommended_action': anomaly_report.get('recommended_action', '')
+        }
+    else:
+        log.append(f"   ✅ No anomalies")
+    
+    log.append(f"   🤖 Agent recommendations:")
+    log.append(f"         ✅ PV Generation: {solar_rec.get('recommendation', 'N/A')}")
+    log.append(f"         ✅ Cost Efficiency: {cost_rec.get('recommendation', 'N/A')}")
+    log.append(f"         ✅ Comfort Agent: {comfort_rec.get('comfort_status', 'N/A')}")
+    log.append(f"         ✅ Orchestrator decision: Setpoint {decision.get('hvac_setpoint', 22):.1f}°C")
+    log.append(f"         🔍 DEBUG - Full decision: {decision}")
+    
+    log.append(f"\n   📝 FINAL RECOMMENDATION: Setpoint {decision.get('hvac_setpoint', 22):.1f}°C")
+    log.append(f"      Reasoning: {decision.get('reasoning', 'N/A')}")
+    
+    recommendation = ZoneRecommendation(
+        current_setpoint=float(zone_data['hvac_setpoint']),
+        recommended_setpoint=decision.get('hvac_setpoint', 22),
+        decision=decision.get('decision', 'N/A'),
+        reasoning=decision.get('reasoning', 'N/A'),
+        pv_rec=solar_rec.get('recommendation', 'N/A'),
+        cost_rec=cost_rec.get('recommendation', 'N/A'),
+        comfort_status=comfort_rec.get('comfort_status', 'N/A')
+    )
+    
+    return recommendation, alert, log
+
+def analyze_zone(timestamp, zone, zone_data, future_data, agents, tracker, agent_pool, campus_grid=None,
+                 setpoint_plan=None):
+    """
+    Run the agent team for one zone at one timepoint
+    Anomaly, PV, cost and comfort agents run concurrently on agent_pool;
+    only the orchestrator waits for its inputs.
+    campus_grid: future of a campus grid analysis; replaces the zone's cost agent call
+    setpoint_plan: future of the optimizer's {zone_id: decision}; replaces the orchestrator call
+    Returns (recommendation, alert or None, log lines)
+    """
+    zone_state = zone_state_from(zone_data)
+    
+    # Get historical baseline
+    hour = pd.to_datetime(timestamp).hour
+    historical_avg = tracker.get_hourly_average(hour)
+    
+    # Future data (next 4 hours from simulation)
+    future_solar, future_prices, future_carbon = future_context(future_data)
+    
+    # === ANOMALY DETECTION + OPTIMIZATION RECOMMENDATIONS (independent, in parallel) ===
+    anomaly_future = agent_pool.submit(tagged(agents['anomaly'].analyze), timestamp, zone_state, historical_avg)
+    solar_future = agent_pool.submit(tagged(agents['pv'].analyze), timestamp, future_solar, zone_state)
+    if campus_grid is None:
+        cost_future = agent_pool.submit(tagged(agents['cost'].analyze), timestamp, future_prices, future_carbon,
+                                        zone_state)
+    comfort_future = agent_pool.submit(tagged(agents['comfort'].analyze), timestamp, zone_state, {})
+    
+    solar_rec = solar_future.result()
+    if campus_grid is None:
+        cost_rec = cost_future.result()
+    else:
+        cost_rec = CostEfficiencyAgent.zone_recommendation(campus_grid.result(), zone_state)
+    if 'error' in cost_rec:
+        cost_rec = {'recommendation': 'Maintain operation', 'priority': 'low'}
+    comfort_rec = comfort_future.result()
+    if 'error' in comfort_rec:
+        comfort_rec = {'comfort_status': 'acceptable', 'constraints': {'min_temp': 20, 'max_temp': 24}}
+    
+    # Orchestrator decision
+    if setpoint_plan is not None:
+        decision = setpoint_plan.result()[zone.zone_id]
+    else:
+        decision = agents['orchestrator'].coordinate(
+            timestamp,
+            zone_state,
+            {
+                'pv_generation': solar_rec,
+                'cost_efficiency': cost_rec,
+                'comfort': comfort_rec
+            }
+        )
+    
+    return zone_report(timestamp, zone, zone_data, anomaly_future.result(),
+                       solar_rec, cost_rec, comfort_rec, decision)
+
+def analyze_zones_batched(timestamp, zones, zone_rows, future_data, agents, zone_trackers, agent_pool,
+                          campus_grid=None, setpoint_plan=None):
+    """
+    Run the agent team for all zones at one timepoint, one model call per agent
+    zones / zone_rows: {zone_id: zone} and {zone_id: simulation record}
+    future_data: campus-wide lookahead (solar, price and carbon are shared)
+    campus_grid: future of a campus grid analysis; replaces the cost agent call
+    setpoint_plan: future of the optimizer's {zone_id: decision}; replaces the orchestrator call
+    Returns {zone_id: (recommendation, alert or None, log lines)}
+    """
+    zone_states = {zone_id: zone_state_from(row) for zone_id, row in zone_rows.items()}
+    hour = pd.to_datetime(timestamp).hour
+    historical_avgs = {zone_id: zone_trackers[zone_id].get_hourly_average(hour) for zone_id in zone_rows}
+    future_solar, future_prices, future_carbon = future_context(future_data)
+    
+    anomaly_future = agent_pool.submit(tagged(agents['anomaly'].analyze_batch), timestamp, zone_states,
+                                       historical_avgs)
+    solar_future = agent_pool.submit(tagged(agents['pv'].analyze_batch), timestamp, future_solar, zone_states)
+    if campus_grid is None:
+        cost_future = agent_pool.submit(tagged(agents['cost'].analyze_batch), timestamp, future_prices, future_carbon,
+                                        zone_states)
+    comfort_future = agent_pool.submit(tagged(agents['comfort'].analyze_batch), timestamp, zone_states)
+    
+    solar_recs = solar_future.result()
+    grid_outlook = None
+    if campus_grid is None:
+        cost_recs = cost_future.result()
+    else:
+        grid_analysis = campus_grid.result()
+        grid_outlook = grid_analysis['outlook']
+        cost_recs = {zone_id: CostEfficiencyAgent.zone_recommendation(grid_analysis, state)
+                     for zone_id, state in zone_states.items()}
+    comfort_recs = comfort_future.result()
+    recommendations = {
+        zone_id: {
+            'pv_generation': solar_recs[zone_id],
+            'cost_efficiency': cost_recs[zone_id],
+            'comfort': comfort_recs[zone_id]
+        }
+        for zone_id in zone_states
+    }
+    if setpoint_plan is not None:
+        decisions = setpoint_plan.result()
+    else:
+        decisions = agents['orchestrator'].coordinate_batch(timestamp, zone_states, recommendations,
+                                                            grid_outlook=grid_outlook)
+    anomaly_reports = anomaly_future.result()
+    
+    return {
+        zone_id: zone_report(timestamp, zones[zone_id], zone_rows[zone_id], anomaly_reports[zone_id],
+                             solar_recs[zone_id], cost_recs[zone_id], comfort_recs[zone_id],
+                             decisions[zone_id])
+        for zone_id in zone_states
+    }
+
+def analyze_timepoint(timestamp, simulation_data, campus, zone_agents, zone_trackers, active_zone_ids,
+                      agent_pool=None, zone_workers=ZONE_WORKERS, batch_agents=None, grid_agent=None,
+                      planner=None, profiler=None):
     """
     Run AI agent analysis for a specific timepoint
+    Zones are analyzed in parallel (zone_workers at a time); agent calls go
+    through agent_pool, a shared ThreadPoolExecutor (one is created if None)
+    simulation_data may be a DataFrame or a prebuilt ZoneTimeIndex
+    With batch_agents (one shared agent team) every agent sees all zones in
+    a single call instead and zone_agents is not used.
+    With grid_agent the price/carbon analysis runs once for the campus and
+    every zone's cost recommendation is derived from it.
+    With planner (an OrchestratorAgent) setpoints come from its optimizer,
+    planned for all zones at once, instead of the LLM orchestrator.
+    profiler: utils.profiling.Profiler timing the data slicing and agent phases
     """
-    # Get data for this timestamp (all zones)
-    timepoint_data = simulation_data[simulation_data['timestamp'] == timestamp]
+    profiler = Profiler.create(profiler)
+    if not isinstance(simulation_data, ZoneTimeIndex):
+        simulation_data = ZoneTimeIndex(simulation_data)
+    
+    # Get data for this timestamp (active zones)
+    with profiler.phase('slice'):
+        timepoint_data = simulation_data.at(timestamp, active_zone_ids)
     
     if len(timepoint_data) == 0:
         print(f"   ⚠️  No data found for {timestamp}")
@@ -65,123 +338,93 @@ def analyze_timepoint(timestamp, simulation_data, campus, zone_agents, zone_trac
     print(f"☀️  Solar: {sample_row['solar_forecast']:.0f} kW | "
           f"💰 Price: ${sample_row['electricity_price']:.3f}/kWh | "
           f"🌡️  Outdoor: {sample_row['outdoor_temp']:.1f}°C")
+    print(f"🤖 Running agents for {len(zone_ids)} zones...")
     
-    # Analyze each zone
-    for zone_id in zone_ids:
-        zone = campus.get_zone(zone_id)
-        zone_data = timepoint_data[timepoint_data['zone_id'] == zone_id].iloc[0]
-        
-        print(f"\n📍 {zone.zone_name}")
-        print(f"   Indoor: {zone_data['indoor_temp']:.1f}°C | "
-              f"Setpoint: {zone_data['hvac_setpoint']:.1f}°C | "
-              f"Occupancy: {int(zone_data['occupancy'])}")
-        print(f"   Consumption: {zone_data['total_consumption']:.1f} kW | "
-              f"Grid: {zone_data['grid_used']:.1f} kW")
-        
-        # Build zone state
-        zone_state = {
-            'indoor_temp': float(zone_data['indoor_temp']),
-            'outdoor_temp': float(zone_data['outdoor_temp']),
-            'hvac_setpoint': float(zone_data['hvac_setpoint']),
-            'occupancy': int(zone_data['occupancy']),
-            'solar_generation': float(zone_data['solar_used']),
-            'total_consumption': float(zone_data['total_consumption']),
-            'grid_used': float(zone_data['grid_used']),
-            'hvac_power': float(zone_data['hvac_power'])
-        }
-        
-        # Get historical baseline
-        hour = pd.to_datetime(timestamp).hour
-        historical_avg = zone_trackers[zone_id].get_hourly_average(hour)
-        
-        # === ANOMALY DETECTION ===
-        print(f"   🔍 Anomaly Detector analyzing...")
-        anomaly_report = zone_agents[zone_id]['anomaly'].analyze(
-            timestamp, zone_state, historical_avg
+    zone_rows = {}
+    with profiler.phase('slice'):
+        for zone_id in zone_ids:
+            zone_data = simulation_data.row(zone_id, timestamp)
+            if zone_data is None:
+                print(f"   ⚠️  No data for {zone_id} at {timestamp}")
+                continue
+            zone_rows[zone_id] = zone_data
+    profiler.count('zones', len(zone_rows))
+    
+    owns_pool = agent_pool is None
+    if owns_pool:
+        agent_pool = ThreadPoolExecutor(max_workers=AGENT_WORKERS)
+    
+    # Campus-wide grid analysis (prices and carbon are the same for every zone)
+    campus_grid = None
+    if grid_agent is not None:
+        with profiler.phase('slice'):
+            _, future_prices, future_carbon = future_context(
+                simulation_data.after(next(iter(zone_rows)), timestamp, steps=16)
+            )
+        campus_state = {'grid_used': float(timepoint_data['grid_used'].sum()),
+                        'total_consumption': float(timepoint_data['total_consumption'].sum())}
+        campus_grid = agent_pool.submit(tagged(grid_agent.analyze_campus), timestamp, future_prices, future_carbon,
+                                        campus_state)
+    
+    # Setpoint plan for every zone at once (the optimizer itself takes milliseconds)
+    setpoint_plan = None
+    if planner is not None:
+        zone_states = {zone_id: zone_state_from(row) for zone_id, row in zone_rows.items()}
+        with profiler.phase('slice'):
+            forecast = forecast_arrays(simulation_data, timestamp, zone_rows)
+        setpoint_plan = agent_pool.submit(
+            tagged(planner.optimize), timestamp, [campus.get_zone(zone_id) for zone_id in zone_rows], zone_states,
+            forecast
         )
+    
+    if batch_agents is not None:
+        # Solar, price and carbon forecasts are campus-wide
+        with profiler.phase('slice'):
+            future_data = simulation_data.after(next(iter(zone_rows)), timestamp, steps=16)
+        zones = {zone_id: campus.get_zone(zone_id) for zone_id in zone_rows}
+        with profiler.phase('agents'):
+            results = analyze_zones_batched(timestamp, zones, zone_rows, future_data, batch_agents,
+                                            zone_trackers, agent_pool, campus_grid=campus_grid,
+                                            setpoint_plan=setpoint_plan)
+        for zone_id, (recommendation, alert, log) in results.items():
+            print("\n".join(log))
+            recommendations[zone_id] = recommendation
+            if alert:
+                alerts.append(alert)
         
-        if anomaly_report.get('anomaly_detected', False):
-            severity = anomaly_report.get('severity', 'unknown')
-            print(f"   ⚠️  ANOMALY: {severity.upper()}")
-            print(f"      {anomaly_report.get('description', '')[:70]}")
-            
-            alerts.append({
-                'timestamp': timestamp,
-                'zone_id': zone_id,
-                'zone_name': zone.zone_name,
-                'severity': severity,
-                'description': anomaly_report.get('description', ''),
-                'recommended_action': anomaly_report.get('recommended_action', '')
-            })
-        else:
-            print(f"   ✅ No anomalies")
-        
-        # === OPTIMIZATION RECOMMENDATIONS ===
-        print(f"   🤖 Getting agent recommendations...")
-        
-        # Get future data (next 4 hours from simulation)
-        future_data = simulation_data[
-            (simulation_data['timestamp'] > timestamp) & 
-            (simulation_data['zone_id'] == zone_id)
-        ].head(16)  # Next 4 hours
-        
-        if len(future_data) > 0:
-            future_solar = future_data['solar_forecast'].tolist()
-            future_prices = [{'time': f"+{i*15}min", 'price': float(p)} 
-                            for i, p in enumerate(future_data['electricity_price'].tolist())]
-            future_carbon = [{'time': f"+{i*15}min", 'carbon_intensity': float(c)}
-                            for i, c in enumerate(future_data['grid_carbon_intensity'].tolist())]
-        else:
-            future_solar = [0] * 16
-            future_prices = [{'time': f"+{i*15}min", 'price': 0.15} for i in range(16)]
-            future_carbon = [{'time': f"+{i*15}min", 'carbon_intensity': 500} for i in range(16)]
-        
-        # Run agents
-        print(f"      🤖 Calling PV Generation Agent LLM...")
-        solar_rec = zone_agents[zone_id]['pv'].analyze(timestamp, future_solar, zone_state)
-        print(f"         ✅ PV Generation: {solar_rec.get('recommendation', 'N/A')}")
-        time.sleep(0.3)
-        
-        print(f"      🤖 Calling Cost Efficiency Agent LLM...")
-        cost_rec = zone_agents[zone_id]['cost'].analyze(timestamp, future_prices, future_carbon, zone_state)
-        if 'error' in cost_rec:
-            cost_rec = {'recommendation': 'Maintain operation', 'priority': 'low'}
-        print(f"         ✅ Cost Efficiency: {cost_rec.get('recommendation', 'N/A')}")
-        time.sleep(0.3)
+        if owns_pool:
+            agent_pool.shutdown()
+        return {
+            'timestamp': timestamp,
+            'recommendations': recommendations,
+            'alerts': alerts
+        }
         
-        print(f"      🤖 Calling Comfort Agent LLM...")
-        comfort_rec = zone_agents[zone_id]['comfort'].analyze(timestamp, zone_state, {})
-        if 'error' in comfort_rec:
-            comfort_rec = {'comfort_status': 'acceptable', 'constraints': {'min_temp': 20, 'max_temp': 24}}
-        print(f"         ✅ Comfort Agent: {comfort_rec.get('comfort_status', 'N/A')}")
-        time.sleep(0.3)
+    # Analyze zones in parallel
+    with ThreadPoolExecutor(max_workers=max(1, min(zone_workers, len(zone_ids)))) as zone_pool:
+        zone_futures = {}
+        for zone_id, zone_data in zone_rows.items():
+            # Get future data (next 4 hours from simulation)
+            with profiler.phase('slice'):
+                future_data = simulation_data.after(zone_id, timestamp, steps=16)
         
-        # Orchestrator decision
-        print(f"      🤖 Calling Orchestrator LLM...")
-        decision = zone_agents[zone_id]['orchestrator'].coordinate(
-            timestamp,
-            zone_state,
-            {
-                'pv_generation': solar_rec,
-                'cost_efficiency': cost_rec,
-                'comfort': comfort_rec
-            }
-        )
-        print(f"         ✅ Orchestrator decision: Setpoint {decision.get('hvac_setpoint', 22):.1f}°C")
-        print(f"         🔍 DEBUG - Full decision: {decision}")
+            zone_futures[zone_id] = zone_pool.submit(
+                tagged(analyze_zone, zone=zone_id), timestamp, campus.get_zone(zone_id), zone_data, future_data,
+                zone_agents[zone_id], zone_trackers[zone_id], agent_pool, campus_grid=campus_grid,
+                setpoint_plan=setpoint_plan
+            )
         
-        print(f"\n   📝 FINAL RECOMMENDATION: Setpoint {decision.get('hvac_setpoint', 22):.1f}°C")
-        print(f"      Reasoning: {decision.get('reasoning', 'N/A')}")
+        # Collect in zone order so the printed report stays readable
+        with profiler.phase('agents'):
+            for zone_id in zone_futures:
+                recommendation, alert, log = zone_futures[zone_id].result()
+                print("\n".join(log))
+                recommendations[zone_id] = recommendation
+                if alert:
+                    alerts.append(alert)
         
-        recommendations[zone_id] = {
-            'current_setpoint': float(zone_data['hvac_setpoint']),
-            'recommended_setpoint': decision.get('hvac_setpoint', 22),
-            'decision': decision.get('decision', 'N/A'),
-            'reasoning': decision.get('reasoning', 'N/A'),
-            'pv_rec': solar_rec.get('recommendation', 'N/A'),
-            'cost_rec': cost_rec.get('recommendation', 'N/A'),
-            'comfort_status': comfort_rec.get('comfort_status', 'N/A')
-        }
+    if owns_pool:
+        agent_pool.shutdown()
     
     return {
         'timestamp': timestamp,
@@ -189,112 +432,184 @@ def analyze_timepoint(timestamp, simulation_data, campus, zone_agents, zone_trac
         'alerts': alerts
     }
 
-def run_multizone_analysis():
+def run_multizone_analysis(profile=None):
     """
     Analyze pre-simulated building data with AI agents
+    profile: True or a utils.profiling.Profiler to time each phase (default: PROFILE)
     """
+    profiler = Profiler.create(PROFILE if profile is None else profile, 'run_multizone_analysis')
     print("="*70)
     print("🤖 MULTI-ZONE AI AGENT ANALYSIS")
     print("="*70)
     
     # Load pre-simulated building data
     print("\n📂 Loading pre-simulated building data...")
-    try:
-        simulation_data = pd.read_csv('building_simulation_data.csv')
-        simulation_data['timestamp'] = pd.to_datetime(simulation_data['timestamp'])
-        print(f"   ✅ Loaded {len(simulation_data)} records")
-        print(f"   Date range: {simulation_data['timestamp'].min()} to {simulation_data['timestamp'].max()}")
-    except FileNotFoundError:
-        print("   ❌ Error: building_simulation_data.csv not found!")
-        print("   Run: python simulate_building_data.py")
-        return
+    with profiler.phase('load_data'):
+        try:
+            simulation_data = read_table('building_simulation_data.parquet', zones=ACTIVE_ZONES)
+            print(f"   ✅ Loaded {len(simulation_data)} records")
+            print(f"   Date range: {simulation_data['timestamp'].min()} to {simulation_data['timestamp'].max()}")
+            profiler.count('records_loaded', len(simulation_data))
+        except FileNotFoundError:
+            print("   ❌ Error: building_simulation_data.parquet (or .csv) not found!")
+            print("   Run: python simulate_building_data.py")
+            return
     
     # Initialize campus and agents
     campus = MultiZoneUniversity()
     all_zone_ids = campus.get_zone_ids()
     
-    # FOR TESTING: Use only 2 zones
-    zone_ids = ['engineering', 'library']  # Test with just 2 zones
-    print(f"\n🧪 TEST MODE: Running on {len(zone_ids)} zones only: {zone_ids}")
-    print(f"   (Full campus has {len(all_zone_ids)} zones)")
-    
-    print(f"\n🚀 Initializing AI agents for {len(zone_ids)} zones...")
-    zone_agents = {}
-    for zone_id in zone_ids:
-        zone_agents[zone_id] = {
-            'anomaly': AnomalyDetector(),
-            'pv': PVGenerationAgent(),
-            'cost': CostEfficiencyAgent(),
-            'comfort': ComfortAgent(),
-            'orchestrator': OrchestratorAgent()
-        }
+    if ACTIVE_ZONES:
+        zone_ids = ACTIVE_ZONES
+        print(f"\n🧪 TEST MODE: Running on {len(zone_ids)} zones only: {zone_ids}")
+        print(f"   (Full campus has {len(all_zone_ids)} zones)")
+    else:
+        zone_ids = all_zone_ids
+        print(f"\n🏫 Running on all {len(zone_ids)} zones")
+    
+    with profiler.phase('agent_init'):
+        zone_agents = {}
+        batch_agents = None
+        if BATCH_AGENTS:
+            print(f"\n🚀 Initializing AI agents (one team, batched over {len(zone_ids)} zones)...")
+            batch_agents = {
+                'anomaly': AnomalyDetector(),
+                'pv': PVGenerationAgent(),
+                'cost': CostEfficiencyAgent(),
+                'comfort': ComfortAgent(),
+                'orchestrator': OrchestratorAgent()
+            }
+        else:
+            print(f"\n🚀 Initializing AI agents for {len(zone_ids)} zones...")
+            for zone_id in zone_ids:
+                zone_agents[zone_id] = {
+                    'anomaly': AnomalyDetector(),
+                    'pv': PVGenerationAgent(),
+                    'cost': CostEfficiencyAgent(),
+                    'comfort': ComfortAgent(),
+                    'orchestrator': OrchestratorAgent()
+                }
+        grid_agent = CostEfficiencyAgent() if CAMPUS_GRID else None
+        planner = OrchestratorAgent() if SETPOINT_BACKEND == 'optimizer' else None
     print("   ✅ Agents initialized")
     
+    if AGENT_CACHE:
+        cache = OllamaBaseAgent.enable_cache(AGENT_CACHE, quantize=CACHE_QUANTIZE)
+        print(f"   💾 Response cache: {AGENT_CACHE} ({cache.stats()['entries']} entries)")
+    if AGENT_METRICS:
+        OllamaBaseAgent.enable_metrics(AGENT_METRICS)
+        print(f"   📈 Agent metrics: {AGENT_METRICS}")
+    
     # Build historical context from simulation data
     print(f"\n📚 Building historical context...")
-    zone_trackers = {zone_id: HistoricalTracker() for zone_id in zone_ids}
-    
-    for zone_id in zone_ids:
-        zone_data = simulation_data[simulation_data['zone_id'] == zone_id]
-        for _, row in zone_data.iterrows():
-            state = {
-                'total_consumption': row['total_consumption'],
-                'occupancy': row['occupancy'],
-                'indoor_temp': row['indoor_temp'],
-                'hvac_power': row['hvac_power'],
-                'solar_used': row['solar_used']
-            }
-            zone_trackers[zone_id].add_datapoint(row['timestamp'], state)
+    with profiler.phase('tracker_warmup'):
+        if BASELINE_FILE and os.path.exists(BASELINE_FILE):
+            zone_trackers = load_trackers(BASELINE_FILE)
+            print(f"   📂 Loaded baselines from {BASELINE_FILE}")
+        else:
+            zone_trackers = HistoricalTracker.from_frame(
+                simulation_data[simulation_data['zone_id'].isin(zone_ids)], BASELINE_WINDOWS
+            )
+            if BASELINE_FILE:
+                save_trackers(zone_trackers, BASELINE_FILE)
+        for zone_id in zone_ids:
+            zone_trackers.setdefault(zone_id, HistoricalTracker(BASELINE_WINDOWS))
     print("   ✅ Historical baselines ready")
     
+    # Screen every record with Sherlock's rules; only ambiguous rows reach the LLM
+    screening_alerts = []
+    with profiler.phase('screening'):
+        if SCREEN_ALL_RECORDS:
+            print(f"\n🔎 Screening all records with detection rules...")
+            screener = AnomalyDetector()
+            screened = simulation_data[simulation_data['zone_id'].isin(zone_ids)]
+            capacities = {zone_id: campus.get_zone(zone_id).hvac_capacity for zone_id in zone_ids}
+            reports = screener.analyze_frame(screened, capacities, max_llm_calls=SCREEN_LLM_BUDGET)
+            profiler.count('records_screened', len(screened))
+            
+            for report in reports:
+                if report.get('anomaly_detected', False):
+                    screening_alerts.append({
+                        'timestamp': report.get('timestamp'),
+                        'zone_id': report['zone_id'],
+                        'zone_name': campus.get_zone(report['zone_id']).zone_name,
+                        'severity': report.get('severity', 'unknown'),
+                        'description': report.get('description', ''),
+                        'recommended_action': report.get('recommended_action', ''),
+                        'source': report.get('source', 'llm')
+                    })
+            llm_count = sum(1 for report in reports if report.get('source') == 'llm')
+            print(f"   ✅ {len(screened)} records screened, {llm_count} escalated to LLM, "
+                  f"{len(screening_alerts)} anomalies")
+    
     # Select analysis timepoints
     print(f"\n⏰ Selecting analysis timepoints...")
-    timepoints = select_analysis_timepoints(simulation_data, num_points=5)
+    with profiler.phase('timepoint_select'):
+        timepoints = select_analysis_timepoints(simulation_data, num_points=5)
     print(f"   Selected {len(timepoints)} timepoints:")
     for tp in timepoints:
         print(f"      • {tp['label']} - {tp['timestamp']}")
     
     # Run analysis on selected timepoints
     all_recommendations = []
-    all_alerts = []
+    all_alerts = list(screening_alerts)
     
-    for tp in timepoints:
-        result = analyze_timepoint(
-            tp['timestamp'],
-            simulation_data,
-            campus,
-            zone_agents,
-            zone_trackers,
-            zone_ids  # Pass the active zone_ids
-        )
-        
-        if result:
-            all_recommendations.append(result)
-            all_alerts.extend(result['alerts'])
+    if SCHEDULER:
+        OllamaBaseAgent.enable_scheduler(BACKEND_CONCURRENCY)
+    else:
+        OllamaBaseAgent.set_concurrency_limit(BACKEND_CONCURRENCY)
+    print(f"\n⚡ Parallel mode: {ZONE_WORKERS} zone workers, {AGENT_WORKERS} agent workers, "
+          f"{BACKEND_CONCURRENCY} concurrent requests per model server"
+          f"{' (priority scheduled)' if SCHEDULER else ''}")
+    
+    with profiler.phase('index_build'):
+        data_index = ZoneTimeIndex(simulation_data[simulation_data['zone_id'].isin(zone_ids)])
+    with ThreadPoolExecutor(max_workers=AGENT_WORKERS) as agent_pool:
+        for tp in timepoints:
+            with metric_tags(timepoint=str(tp['timestamp'])), profiler.phase('timepoints'):
+                profiler.count('timepoints')
+                result = analyze_timepoint(
+                    tp['timestamp'],
+                    data_index,
+                    campus,
+                    zone_agents,
+                    zone_trackers,
+                    zone_ids,  # Pass the active zone_ids
+                    agent_pool=agent_pool,
+                    batch_agents=batch_agents,
+                    grid_agent=grid_agent,
+                    planner=planner,
+                    profiler=profiler
+                )
+            
+            if result:
+                all_recommendations.append(result)
+                all_alerts.extend(result['alerts'])
     
     # Save analysis results
     print(f"\n{'='*70}")
     print("💾 Saving analysis results...")
     
     # Save recommendations
-    rec_records = []
-    for result in all_recommendations:
-        for zone_id, rec in result['recommendations'].items():
-            rec_records.append({
-                'timestamp': result['timestamp'],
-                'zone_id': zone_id,
-                **rec
-            })
-    
-    rec_df = pd.DataFrame(rec_records)
-    rec_df.to_csv('agent_recommendations.csv', index=False)
-    print(f"   ✅ Recommendations: agent_recommendations.csv")
-    
-    # Save alerts
-    if all_alerts:
-        alerts_df = pd.DataFrame(all_alerts)
-        alerts_df.to_csv('zone_alerts.csv', index=False)
-        print(f"   ✅ Alerts: zone_alerts.csv ({len(all_alerts)} alerts)")
+    with profiler.phase('save'):
+        rec_records = []
+        for result in all_recommendations:
+            for zone_id, rec in result['recommendations'].items():
+                rec_records.append({
+                    'timestamp': result['timestamp'],
+                    'zone_id': zone_id,
+                    **rec
+                })
+        
+        rec_df = pd.DataFrame(rec_records)
+        rec_df.to_csv('agent_recommendations.csv', index=False)
+        print(f"   ✅ Recommendations: agent_recommendations.csv")
+        
+        # Save alerts
+        if all_alerts:
+            alerts_df = pd.DataFrame(all_alerts)
+            alerts_df.to_csv('zone_alerts.csv', index=False)
+            print(f"   ✅ Alerts: zone_alerts.csv ({len(all_alerts)} alerts)")
     
     # Summary
     print(f"\n{'='*70}")
@@ -305,12 +620,35 @@ def run_multizone_analysis():
     print(f"Total recommendations: {len(rec_records)}")
     print(f"Anomalies detected: {len(all_alerts)}")
     
+    if OllamaBaseAgent.cache is not None:
+        stats = OllamaBaseAgent.cache.stats()
+        print(f"Cache: {stats['hits']} hits / {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)")
+    
+    if OllamaBaseAgent.metrics is not None:
+        print(f"\n⏱️  AGENT METRICS:")
+        for line in OllamaBaseAgent.metrics.format_summary():
+            print(f"   {line}")
+        OllamaBaseAgent.disable_metrics()
+    
+    if OllamaBaseAgent.scheduler is not None:
+        print(f"\n🚦 SCHEDULER:")
+        for line in OllamaBaseAgent.scheduler.format_summary():
+            print(f"   {line}")
+        OllamaBaseAgent.disable_scheduler()
+    
     if all_alerts:
         print(f"\n🚨 ALERTS BY ZONE:")
         alerts_by_zone = pd.DataFrame(all_alerts).groupby('zone_name').size()
         for zone_name, count in alerts_by_zone.sort_values(ascending=False).items():
             print(f"   {zone_name}: {count}")
     
+    profile_file = profiler.write(profile_path('agent_recommendations.csv'))
+    if profile_file:
+        print(f"\n⏱️  PROFILE ({profile_file}):")
+        for line in profiler.format_report(limit=10):
+            print(f"   {line}")
+    
     print(f"\n✅ Analysis complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,411 @@
+# mock_llm_server.py
+"""
+Stand-in for the Ollama generate API, for running the agents without a model
+
+Answers POST /api/generate with a JSON reply that passes the schema of the
+agent that sent it (recognised from its system prompt), one entry per zone
+for batched prompts. Streamed requests get NDJSON chunks like Ollama's, and
+generation stops when the client closes the connection early.
+
+Load-testing knobs:
+    latency: seconds before the first token, a number or a distribution
+        ("uniform:0.1,0.5", "normal:0.3,0.1", "lognormal:0.3,0.6" (median,
+        sigma), "exponential:0.3" (mean))
+    token_seconds: extra delay per generated token (~4 characters)
+    parallel / max_queue: requests generated at once; waiting requests past
+        max_queue are rejected with 503, as Ollama does
+    malformed_rate: share of replies that are truncated, prose, missing a
+        required field or carry a wrongly typed value
+    timeout_rate: share of requests that hang without a reply until the
+        client disconnects (or hang_seconds pass)
+    anomaly_rate: share of Sherlock replies that report an anomaly
+
+GET /api/stats returns request counters; GET /api/tags lists the model.
+
+Usage: python mock_llm_server.py [port] [latency] [parallel] [malformed_rate] [timeout_rate]
+Point the agents at it with OLLAMA_HOST=127.0.0.1:<port>.
+"""
+import json
+import random
+import re
+import select
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_PORT = 11434
+
+_ZONES = re.compile(r'\nZones \(\d+\):\n[^\n]*\n((?:[^\n]+\n?)+)')
+
+# System prompt marker -> role, most specific first
+ROLE_MARKERS = (
+    ('You are Sherlock', 'anomaly'),
+    ('An optimizer has already chosen', 'explanation'),
+    ('Orchestrator', 'orchestrator'),
+    ('Comfort Guardian', 'comfort'),
+    ('Grid Oracle', 'grid'),
+    ('Solar Prophet', 'solar'),
+)
+
+# Fields each role's result type requires (see agents/results.py)
+REQUIRED_FIELDS = {
+    'anomaly': ('anomaly_detected', 'severity'),
+    'explanation': ('reasoning',),
+    'orchestrator': ('hvac_setpoint',),
+    'comfort': ('comfort_status',),
+    'grid': ('recommendation',),
+    'solar': ('recommendation',),
+    'unknown': (),
+}
+
+MALFORMED_KINDS = ('truncated', 'prose', 'missing_field', 'wrong_type')
+
+
+def latency_sampler(spec):
+    """Function of a random.Random returning a delay in seconds, from a number, spec string or callable"""
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    name, _, args = str(spec).partition(':')
+    if not args:
+        value = float(name)
+        return lambda rng: value
+    params = [float(value) for value in args.split(',')]
+    if name == 'uniform':
+        low, high = params
+        return lambda rng: rng.uniform(low, high)
+    if name == 'normal':
+        mean, sd = params
+        return lambda rng: max(0.0, rng.gauss(mean, sd))
+    if name == 'lognormal':
+        median, sigma = params
+        return lambda rng: median * rng.lognormvariate(0.0, sigma)
+    if name == 'exponential':
+        mean, = params
+        return lambda rng: rng.expovariate(1.0 / mean)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def detect_role(prompt):
+    return next((role for marker, role in ROLE_MARKERS if marker in prompt), 'unknown')
+
+
+def role_reply(role, rng, anomaly_rate=0.05):
+    """A schema-valid reply for one zone"""
+    if role == 'anomaly':
+        if rng.random() < anomaly_rate:
+            return {'anomaly_detected': True, 'severity': rng.choice(('medium', 'high')),
+                    'anomaly_type': 'waste', 'description': 'HVAC running in an empty zone',
+                    'evidence': ['occupancy 0', 'hvac_power above baseline'],
+                    'recommended_action': 'Set back the zone setpoint', 'block_optimization': False}
+        return {'anomaly_detected': False, 'severity': 'low', 'description': 'Within normal range',
+                'block_optimization': False}
+    if role == 'explanation':
+        return {'reasoning': 'The plan pre-cools before the price peak and relaxes when the zone empties',
+                'trade_offs': 'Slightly warmer late afternoon'}
+    if role == 'orchestrator':
+        setpoint = rng.choice((20.5, 21.0, 21.5, 22.0, 22.5, 23.0))
+        return {'decision': f'Set {setpoint}°C', 'hvac_setpoint': setpoint,
+                'hvac_power': round(rng.uniform(20, 120), 1), 'reasoning': 'Balances cost, carbon and comfort',
+                'trade_offs': 'Minor comfort margin', 'agent_consensus': rng.choice(('high', 'medium'))}
+    if role == 'comfort':
+        return {'comfort_status': rng.choice(('comfortable', 'acceptable')),
+                'constraints': {'min_temp': 20, 'max_temp': 24, 'flexibility': rng.choice(('low', 'medium', 'high'))},
+                'analysis': 'Temperature inside the comfort band'}
+    if role == 'grid':
+        return {'recommendation': 'Shift flexible load out of the evening peak',
+                'priority': rng.choice(('low', 'medium', 'high')), 'analysis': 'Prices peak at 18:00',
+                'cost_impact': 'about 8% lower', 'carbon_impact': 'about 5% lower'}
+    if role == 'solar':
+        return {'recommendation': 'Use solar directly for HVAC at midday',
+                'confidence': rng.randint(60, 95), 'analysis': 'Clear-sky forecast'}
+    return {'response': 'ok'}
+
+
+def zone_ids_in(prompt):
+    """zone_ids of a batched prompt's zone table (empty for single-zone prompts)"""
+    match = _ZONES.search(prompt)
+    if 'BATCH MODE' not in prompt or not match:
+        return []
+    return [line.split('|')[0].strip() for line in match.group(1).splitlines() if '|' in line]
+
+
+def malform(answer, role, kind, zone_ids=()):
+    """Reply text broken in one of MALFORMED_KINDS"""
+    if kind == 'truncated':
+        text = json.dumps(answer)
+        return text[:max(1, len(text) // 2)]
+    if kind == 'prose':
+        return "Sure! Based on the data, the building looks fine and no changes are needed."
+    
+    required = REQUIRED_FIELDS[role]
+    entries = [answer[zone_id] for zone_id in zone_ids] if zone_ids else [answer]
+    if kind == 'missing_field':
+        if zone_ids:
+            answer = {zone_id: entry for zone_id, entry in answer.items() if zone_id != zone_ids[-1]}
+        elif required:
+            answer = {key: value for key, value in answer.items() if key != required[0]}
+    elif kind == 'wrong_type' and required:
+        entries[0][required[0]] = ['unknown']    # no field type accepts a list
+    return json.dumps(answer)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like Ollama
+    
+    def log_message(self, *args):
+        pass
+    
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == '/api/stats':
+            self._send_json(200, mock.stats())
+        elif self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': mock.model, 'model': mock.model}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+    
+    def do_POST(self):
+        mock = self.server.mock
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != '/api/generate':
+            self._send_json(404, {'error': 'not found'})
+            return
+        
+        if not mock._enter_queue():
+            self._send_json(503, {'error': 'server busy, please try again.  maximum pending requests exceeded'})
+            return
+        try:
+            with mock._slots:
+                mock._start_generating()
+                try:
+                    self._generate(mock, body)
+                finally:
+                    mock._stop_generating()
+        except (BrokenPipeError, ConnectionResetError):
+            mock._count('cancelled')
+    
+    def _generate(self, mock, body):
+        prompt = body.get('prompt', '')
+        role = detect_role(prompt)
+        plan = mock._plan(role)
+        time.sleep(plan['latency'])
+        
+        if plan['timeout']:
+            # Hang, holding the slot, until the client gives up
+            self._wait_for_disconnect(mock.hang_seconds)
+            self.close_connection = True
+            return
+        
+        text = mock.reply_text(prompt, role, plan['malformed'])
+        num_predict = (body.get('options') or {}).get('num_predict')
+        if num_predict:
+            text = text[:num_predict * 4]    # the model runs out of tokens mid-reply
+        final = {'model': body.get('model', mock.model), 'done': True, 'done_reason': 'stop',
+                 'prompt_eval_count': len(prompt) // 4, 'eval_count': max(1, len(text) // 4)}
+        
+        if not body.get('stream', True):
+            time.sleep(mock.token_seconds * final['eval_count'])
+            self._send_json(200, {**final, 'response': text})
+            mock._count('served')
+            return
+        
+        # NDJSON stream, one chunk per ~token, with chunked transfer encoding
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(text), 4):
+            time.sleep(mock.token_seconds)
+            self._write_chunk({'model': final['model'], 'response': text[start:start + 4], 'done': False})
+        self._write_chunk({**final, 'response': ''})
+        self.wfile.write(b'0\r\n\r\n')
+        mock._count('served')
+    
+    def _wait_for_disconnect(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                return
+    
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode() + b'\n'
+        self.wfile.write(f'{len(data):X}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled or cancelled connections is normal here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    def __init__(self, port=0, host='127.0.0.1', latency=0.05, token_seconds=0.0, parallel=4, max_queue=512,
+                 malformed_rate=0.0, timeout_rate=0.0, hang_seconds=300.0, anomaly_rate=0.05,
+                 model='mistral:latest', seed=None):
+        """port 0 picks a free port; see the module docstring for the other settings"""
+        self.latency = latency_sampler(latency)
+        self.token_seconds = token_seconds
+        self.parallel = parallel
+        self.max_queue = max_queue
+        self.malformed_rate = malformed_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.anomaly_rate = anomaly_rate
+        self.model = model
+        
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._counters = {'requests': 0, 'served': 0, 'rejected': 0, 'timeouts': 0, 'malformed': 0,
+                          'cancelled': 0, 'peak_active': 0, 'peak_waiting': 0}
+        self._by_role = {}
+        self._waiting = 0
+        self._active = 0
+        
+        self.server = _Server((host, port), _Handler)
+        self.server.mock = self
+        self._thread = None
+    
+    @property
+    def host(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+    
+    @property
+    def url(self):
+        """Generate endpoint, as used by OllamaBaseAgent.ollama_url"""
+        return f"http://{self.host}/api/generate"
+    
+    def reply_text(self, prompt, role=None, malformed=None):
+        """Generated text for a prompt (optionally broken in one of MALFORMED_KINDS)"""
+        role = role or detect_role(prompt)
+        zone_ids = zone_ids_in(prompt)
+        with self._lock:
+            if zone_ids:
+                answer = {zone_id: role_reply(role, self._rng, self.anomaly_rate) for zone_id in zone_ids}
+            else:
+                answer = role_reply(role, self._rng, self.anomaly_rate)
+        if malformed:
+            return malform(answer, role, malformed, zone_ids)
+        return json.dumps(answer)
+    
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'active': self._active, 'waiting': self._waiting,
+                    'by_role': dict(self._by_role)}
+    
+    def _plan(self, role):
+        """Draw this request's latency and injected failure"""
+        with self._lock:
+            self._counters['requests'] += 1
+            self._by_role[role] = self._by_role.get(role, 0) + 1
+            latency = self.latency(self._rng)
+            timeout = self._rng.random() < self.timeout_rate
+            malformed = None
+            if not timeout and self._rng.random() < self.malformed_rate:
+                malformed = self._rng.choice(MALFORMED_KINDS)
+            self._counters['timeouts'] += timeout
+            self._counters['malformed'] += malformed is not None
+        return {'latency': latency, 'timeout': timeout, 'malformed': malformed}
+    
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+    
+    def _enter_queue(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._counters['rejected'] += 1
+                return False
+            self._waiting += 1
+            self._counters['peak_waiting'] = max(self._counters['peak_waiting'], self._waiting)
+            return True
+    
+    def _start_generating(self):
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+            self._counters['peak_active'] = max(self._counters['peak_active'], self._active)
+    
+    def _stop_generating(self):
+        with self._lock:
+            self._active -= 1
+    
+    def start(self):
+        """Serve from a background thread; returns self"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    port, latency, parallel, malformed_rate, timeout_rate = DEFAULT_PORT, '0.2', 4, 0.0, 0.0
+    
+    if len(sys.argv) > 1:
+        try:
+            port = int(sys.argv[1])
+        except ValueError:
+            print(f"⚠️  Invalid port, using default: {port}")
+    if len(sys.argv) > 2:
+        latency = sys.argv[2]
+    if len(sys.argv) > 3:
+        try:
+            parallel = int(sys.argv[3])
+        except ValueError:
+            print(f"⚠️  Invalid parallel parameter, using default: {parallel}")
+    if len(sys.argv) > 4:
+        try:
+            malformed_rate = float(sys.argv[4])
+        except ValueError:
+            print(f"⚠️  Invalid malformed rate, using default: {malformed_rate}")
+    if len(sys.argv) > 5:
+        try:
+            timeout_rate = float(sys.argv[5])
+        except ValueError:
+            print(f"⚠️  Invalid timeout rate, using default: {timeout_rate}")
+    
+    mock = MockLLMServer(port=port, latency=latency, parallel=parallel, malformed_rate=malformed_rate,
+                         timeout_rate=timeout_rate)
+    print("="*70)
+    print("🧪 MOCK LLM SERVER (Ollama generate API)")
+    print("="*70)
+    print(f"   Listening on http://{mock.host}  (latency {latency}s, {parallel} parallel)")
+    print(f"   Malformed replies: {malformed_rate:.0%} | Timeouts: {timeout_rate:.0%}")
+    print(f"   Agents: OLLAMA_HOST={mock.host} python main_multizone.py")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {json.dumps(mock.stats())}")
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
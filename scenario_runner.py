@@ -0,0 +1,287 @@
+# scenario_runner.py
+"""
+Monte Carlo Scenario Runner
+Runs many independent building physics simulations (weather, occupancy and
+setpoint-policy variations) across a process pool for planning studies
+
+The base forecast is placed once in shared memory; workers map it without
+copying and derive their scenario from it with their own seed. Results are
+streamed back and aggregated into distributions of energy, cost and
+comfort violations.
+"""
+from building_zones import MultiZoneUniversity
+from zone_data_generator import ZoneDataGenerator
+from controllers import (OccupancySetpointPolicy, FixedSetpointPolicy, ProportionalController,
+                         PIController, residential_mask)
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import os
+import sys
+import time
+
+FORECAST_COLUMNS = ('hour', 'outdoor_temp', 'solar_forecast', 'electricity_price', 'grid_carbon_intensity')
+COMFORT_BAND = (20.0, 24.0)   # °C, same defaults as the comfort agent constraints
+METRICS = ('energy_kwh', 'cost', 'carbon_kg', 'peak_grid_kw', 'comfort_violations', 'comfort_degree_hours')
+
+
+# Setpoint policies and HVAC controllers (see controllers.py)
+POLICIES = {
+    'occupancy': OccupancySetpointPolicy(),
+    'fixed': FixedSetpointPolicy(22.0),
+    'setback': OccupancySetpointPolicy(levels=(22.0, 22.0, 22.0), night_setpoint=26.0),
+}
+CONTROLLERS = {
+    'p': lambda: ProportionalController(gain=50),
+    'pi': lambda: PIController(kp=50, ki=10),
+}
+
+
+# ============ SHARED FORECAST ============
+
+def forecast_matrix(forecast_data, zone_ids):
+    """Forecast DataFrame -> float64 (T, 5 + zones) matrix in FORECAST_COLUMNS + occupancy order"""
+    timestamps = pd.to_datetime(forecast_data['timestamp'])
+    columns = [timestamps.dt.hour.to_numpy(dtype=float)]
+    columns += [forecast_data[column].to_numpy(dtype=float) for column in FORECAST_COLUMNS[1:]]
+    columns += [forecast_data[f'{zone_id}_occupancy'].to_numpy(dtype=float) for zone_id in zone_ids]
+    return np.ascontiguousarray(np.column_stack(columns))
+
+_shared = {}
+
+def _attach(name, shape):
+    """Pool initializer: map the shared forecast into this worker"""
+    shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm  # keep the mapping alive
+    _shared['forecast'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+# ============ ONE SCENARIO ============
+
+def make_scenarios(n, seed=0, policies=tuple(POLICIES), weather_offsets=(-2.0, 0.0, 2.0),
+                   controller='p', occupancy_noise=0.2, solar_noise=0.25, weather_noise=1.0):
+    """
+    n scenario specs cycling through policies and weather offsets
+    
+    Each gets an independent child seed (SeedSequence.spawn), so results do
+    not depend on which worker runs which scenario.
+    """
+    children = np.random.SeedSequence(seed).spawn(n)
+    return [{
+        'scenario': i,
+        'seed': int(child.generate_state(1)[0]),
+        'policy': policies[i % len(policies)],
+        'weather_offset': weather_offsets[(i // len(policies)) % len(weather_offsets)],
+        'controller': controller,
+        'weather_noise': weather_noise,
+        'occupancy_noise': occupancy_noise,
+        'solar_noise': solar_noise,
+    } for i, child in enumerate(children)]
+
+def perturb_forecast(forecast, scenario, capacity):
+    """Scenario-specific weather, solar and occupancy drawn from the base forecast"""
+    rng = np.random.default_rng(scenario['seed'])
+    n_steps, n_zones = forecast.shape[0], len(capacity)
+    n_base = len(FORECAST_COLUMNS)
+    
+    outdoor = (forecast[:, 1] + scenario['weather_offset']
+               + rng.normal(0, scenario['weather_noise'], n_steps))
+    
+    # Daily cloudiness factor on solar
+    days = -(-n_steps // 96)
+    cloud = np.clip(rng.normal(1.0, scenario['solar_noise'], days), 0.0, 1.2)
+    solar = forecast[:, 2] * np.repeat(cloud, 96)[:n_steps]
+    
+    occupancy = forecast[:, n_base:n_base + n_zones] * rng.lognormal(0, scenario['occupancy_noise'], (n_steps, n_zones))
+    occupancy = np.clip(np.round(occupancy), 0, capacity)
+    
+    return outdoor, solar, occupancy
+
+def simulate_scenario(forecast, scenario, integrator='euler', campus=None):
+    """Rule-based simulation of one scenario; returns its metrics"""
+    campus = campus or MultiZoneUniversity()
+    engine = campus.engine
+    zone_ids = campus.get_zone_ids()
+    capacity = engine.occupancy_capacity
+    residential = residential_mask(zone_ids)
+    policy = POLICIES[scenario['policy']]
+    controller = CONTROLLERS[scenario.get('controller', 'p')]()
+    
+    if scenario.get('baseline'):
+        n_base = len(FORECAST_COLUMNS)
+        outdoor, solar = forecast[:, 1], forecast[:, 2]
+        occupancy = forecast[:, n_base:n_base + len(zone_ids)]
+    else:
+        outdoor, solar, occupancy = perturb_forecast(forecast, scenario, capacity)
+    price, carbon, hours = forecast[:, 3], forecast[:, 4], forecast[:, 0]
+    
+    energy = cost = carbon_kg = peak = degree_hours = 0.0
+    violations = 0
+    low, high = COMFORT_BAND
+    
+    for idx in range(0, len(forecast), 4):
+        end = min(idx + 4, len(forecast))
+        
+        # Setpoints and HVAC power for every zone at once
+        engine.hvac_setpoint[:] = policy(occupancy[idx], capacity, hours[idx], residential)
+        hvac_power = controller(engine.hvac_setpoint, engine.indoor_temp, engine.hvac_capacity, dt=1.0)
+        
+        result = engine.advance(hvac_power, occupancy[idx:end], solar[idx:end], outdoor[idx:end],
+                                method=integrator)
+        
+        grid = result['grid_used'].sum(axis=1)
+        energy += result['total_consumption'].sum() * 0.25
+        cost += (grid * price[idx:end]).sum() * 0.25
+        carbon_kg += (grid * carbon[idx:end]).sum() * 0.25 / 1000
+        peak = max(peak, grid.max())
+        
+        temps = result['indoor_temp']
+        outside = np.maximum(low - temps, 0) + np.maximum(temps - high, 0)
+        violations += int((outside > 0).sum())
+        degree_hours += outside.sum() * 0.25
+    
+    return {
+        **{key: scenario.get(key) for key in ('scenario', 'seed', 'policy', 'controller', 'weather_offset')},
+        'energy_kwh': float(energy),
+        'cost': float(cost),
+        'carbon_kg': float(carbon_kg),
+        'peak_grid_kw': float(peak),
+        'comfort_violations': violations,
+        'comfort_degree_hours': float(degree_hours)
+    }
+
+def _run_batch(scenarios, integrator):
+    """Worker entry point: a batch of scenarios against the shared forecast"""
+    forecast = _shared['forecast']
+    return [simulate_scenario(forecast, scenario, integrator) for scenario in scenarios]
+
+
+# ============ POOL + STREAMING AGGREGATION ============
+
+def run_scenarios(forecast, scenarios, workers=None, integrator='euler', batch_size=None):
+    """
+    Yield scenario results as workers finish them
+    
+    forecast: matrix from forecast_matrix(); copied once into shared memory.
+    workers: process count (default: all cores); 0 runs in this process.
+    """
+    if workers == 0:
+        forecast = np.asarray(forecast, dtype=np.float64)
+        for scenario in scenarios:
+            yield simulate_scenario(forecast, scenario, integrator)
+        return
+    
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or max(1, len(scenarios) // (workers * 4))
+    batches = [scenarios[i:i + batch_size] for i in range(0, len(scenarios), batch_size)]
+    
+    shm = shared_memory.SharedMemory(create=True, size=max(forecast.nbytes, 1))
+    try:
+        shared = np.ndarray(forecast.shape, dtype=np.float64, buffer=shm.buf)
+        shared[:] = forecast
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, forecast.shape)) as pool:
+            futures = [pool.submit(_run_batch, batch, integrator) for batch in batches]
+            for future in as_completed(futures):
+                yield from future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+class ScenarioStats:
+    """Running distribution of scenario metrics, overall and per policy"""
+    
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self.results = []
+        self.count = 0
+        self._mean = np.zeros(len(metrics))
+        self._m2 = np.zeros(len(metrics))
+    
+    def add(self, result):
+        # Welford update so mean/std are always current while streaming
+        values = np.array([result[metric] for metric in self.metrics], dtype=float)
+        self.count += 1
+        delta = values - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (values - self._mean)
+        self.results.append(result)
+    
+    def running(self):
+        """Current mean and std for every metric"""
+        std = np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.zeros(len(self.metrics))
+        return {metric: (self._mean[i], std[i]) for i, metric in enumerate(self.metrics)}
+    
+    def summary(self, by='policy', percentiles=(5, 50, 95)):
+        """Distribution table: mean, std and percentiles per group and metric"""
+        frame = pd.DataFrame(self.results)
+        rows = []
+        groups = frame.groupby(by) if by else [('all', frame)]
+        for key, group in groups:
+            for metric in self.metrics:
+                values = group[metric].to_numpy(dtype=float)
+                row = {by or 'group': key, 'metric': metric, 'scenarios': len(values),
+                       'mean': values.mean(), 'std': values.std(ddof=1) if len(values) > 1 else 0.0}
+                row.update({f'p{p}': np.percentile(values, p) for p in percentiles})
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def run_monte_carlo(n_scenarios=200, workers=None, days=7, seed=0, integrator='euler',
+                    output_file='scenario_results.csv'):
+    """Generate a base forecast, run the scenarios in parallel and report distributions"""
+    
+    print("="*70)
+    print("🎲 MONTE CARLO SCENARIO RUNNER")
+    print("="*70)
+    
+    if len(sys.argv) > 1:
+        try:
+            n_scenarios = int(sys.argv[1])
+        except:
+            print(f"⚠️  Invalid scenario count, using default: {n_scenarios}")
+    
+    if len(sys.argv) > 2:
+        try:
+            workers = int(sys.argv[2])
+        except:
+            print(f"⚠️  Invalid worker count, using all cores")
+    
+    workers = os.cpu_count() if workers is None else workers
+    zone_ids = MultiZoneUniversity().get_zone_ids()
+    
+    print(f"\n⚙️  Configuration:")
+    print(f"   Scenarios: {n_scenarios}")
+    print(f"   Workers: {workers}")
+    print(f"   Horizon: {days} days")
+    print(f"   Policies: {', '.join(POLICIES)}")
+    
+    generator = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=days, seed=seed)
+    forecast = forecast_matrix(generator.generate_dataset(), zone_ids)
+    scenarios = make_scenarios(n_scenarios, seed=seed)
+    
+    print(f"\n🔄 Running scenarios...")
+    stats = ScenarioStats()
+    start = time.perf_counter()
+    report_every = max(n_scenarios // 10, 1)
+    for result in run_scenarios(forecast, scenarios, workers=workers, integrator=integrator):
+        stats.add(result)
+        if stats.count % report_every == 0 or stats.count == n_scenarios:
+            energy_mean, energy_std = stats.running()['energy_kwh']
+            print(f"   {stats.count:>5}/{n_scenarios} | energy {energy_mean:,.0f} ± {energy_std:,.0f} kWh")
+    elapsed = time.perf_counter() - start
+    
+    summary = stats.summary()
+    pd.DataFrame(stats.results).sort_values('scenario').to_csv(output_file, index=False)
+    
+    print(f"\n📊 DISTRIBUTIONS BY POLICY")
+    print(f"="*70)
+    print(summary.round(2).to_string(index=False))
+    print(f"\n✅ {n_scenarios} scenarios in {elapsed:.1f}s ({n_scenarios / elapsed:.1f}/s)")
+    print(f"📁 Per-scenario results saved to: {output_file}")
+    return stats
+
+if __name__ == "__main__":
+    run_monte_carlo()
@@ -7,14 +7,53 @@ Saves raw data for later agent analysis
 from building_zones import MultiZoneUniversity
 from zone_data_generator import ZoneDataGenerator
 from datetime import datetime
+from controllers import OccupancySetpointPolicy, ProportionalController, residential_mask
+from utils.storage import TableWriter
+from utils.profiling import Profiler, profile_path
+import numpy as np
 import pandas as pd
+import json
+import os
 import sys
 
-def simulate_building_physics(days=30, output_file='building_simulation_data.csv'):
+def _save_checkpoint(path, state):
+    """Write the checkpoint atomically so a crash never leaves half a file"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def _load_checkpoint(path, config):
+    """Checkpoint state if one exists for this exact run configuration"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('config') != config:
+        print(f"   ⚠️  Checkpoint {path} is for a different run, starting over")
+        return None
+    return state
+
+def simulate_building_physics(days=30, output_file='building_simulation_data.parquet', integrator='euler',
+                              batch_rows=50000, checkpoint=None, policy=None, controller=None, profile=False):
     """
     Simulate building physics without AI agents
     Runs simple rule-based HVAC control
+    
+    integrator: 'euler' (matches the step-by-step model) or 'exponential'
+    (exact solution between control decisions)
+    output_file: .parquet (default) or .csv for a plain-text export
+    batch_rows: rows buffered before a batch is flushed to disk (bounds memory)
+    checkpoint: JSON file (True = <output_file>.checkpoint.json) updated after
+    every flush; an interrupted run resumes from it
+    policy / controller: controllers.SetpointPolicy and HVACController
+    (default: occupancy-based setpoints with the 50 kW/°C P controller)
+    profile: True (or a utils.profiling.Profiler) times each phase and
+    writes <output>.profile.json next to the data
+    
+    Returns the summary statistics, accumulated while streaming
     """
+    profiler = Profiler.create(profile, 'simulate_building_physics')
     
     print("="*70)
     print("🏗️  BUILDING PHYSICS SIMULATION (No AI Agents)")
@@ -33,12 +72,14 @@ def simulate_building_physics(days=30, output_file='building_simulation_data.csv
     print(f"\n⚙️  Configuration:")
     print(f"   Duration: {days} days")
     print(f"   Simulation interval: Every hour")
+    print(f"   Integrator: {integrator}")
     print(f"   Output: {output_file}")
     print(f"   Total hours: {days * 24}")
     
     # Initialize campus
-    campus = MultiZoneUniversity()
-    zone_ids = campus.get_zone_ids()
+    with profiler.phase('setup'):
+        campus = MultiZoneUniversity()
+        zone_ids = campus.get_zone_ids()
     
     print(f"\n🏫 Simulating {len(zone_ids)} zones:")
     for zone_id in zone_ids:
@@ -47,22 +88,62 @@ def simulate_building_physics(days=30, output_file='building_simulation_data.csv
     
     # Load or generate forecast data
     print(f"\n📊 Loading forecast data...")
-    forecast_data = ZoneDataGenerator.load_from_csv('zone_forecast_data.csv')
-    
-    if forecast_data is None or len(forecast_data) < days * 24 * 4:
-        print(f"   Generating new {days}-day forecast...")
-        generator = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=days)
-        forecast_data = generator.save_to_csv('zone_forecast_data.csv')
-    else:
-        # Trim to requested days
-        forecast_data = forecast_data.iloc[:days * 24 * 4]
+    with profiler.phase('forecast_load'):
+        forecast_data = ZoneDataGenerator.load('zone_forecast_data.parquet')
+        
+        if forecast_data is None or len(forecast_data) < days * 24 * 4:
+            print(f"   Generating new {days}-day forecast...")
+            generator = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=days)
+            forecast_data = generator.save('zone_forecast_data.parquet')
+        else:
+            # Trim to requested days
+            forecast_data = forecast_data.iloc[:days * 24 * 4]
+        profiler.count('forecast_rows', len(forecast_data))
     
     print(f"   ✅ Using {len(forecast_data)} timesteps")
     
-    # Initialize zone setpoints (rule-based, no AI)
-    zone_setpoints = {zone_id: 22.0 for zone_id in zone_ids}  # Default 22°C
+    # Rule-based control (no AI), evaluated for all zones at once
+    policy = policy or OccupancySetpointPolicy()
+    controller = controller or ProportionalController(gain=50)
+    controller.reset()
+    residential = residential_mask(zone_ids)
+    engine = campus.engine
     
-    results = []
+    # Forecast columns as arrays (zone order matches campus.get_zone_ids())
+    with profiler.phase('forecast_slice'):
+        occupancy_matrix = forecast_data[[f'{zone_id}_occupancy' for zone_id in zone_ids]].to_numpy(dtype=float)
+        timestamps = forecast_data['timestamp'].to_numpy()
+        solar = forecast_data['solar_forecast'].to_numpy(dtype=float)
+        outdoor = forecast_data['outdoor_temp'].to_numpy(dtype=float)
+        price = forecast_data['electricity_price'].to_numpy(dtype=float)
+        carbon = forecast_data['grid_carbon_intensity'].to_numpy(dtype=float)
+    
+    n_zones = len(zone_ids)
+    zone_id_array = np.array(zone_ids, dtype=object)
+    zone_name_array = np.array([campus.get_zone(zone_id).zone_name for zone_id in zone_ids], dtype=object)
+    
+    # Summary statistics accumulated from the stream
+    energy_by_zone = np.zeros(n_zones)  # kWh
+    total_cost = 0.0
+    
+    # Resume from a checkpoint of the same run if there is one
+    if checkpoint is True:
+        checkpoint = f"{output_file}.checkpoint.json"
+    config = {'days': days, 'output_file': output_file, 'integrator': integrator,
+              'timesteps': len(forecast_data), 'zones': zone_ids,
+              'policy': type(policy).__name__, 'controller': type(controller).__name__}
+    resume = _load_checkpoint(checkpoint, config)
+    start_idx = 0
+    if resume:
+        for field, values in resume['engine'].items():
+            getattr(campus.engine, field)[:] = values
+        controller.load_state(resume['controller'])
+        energy_by_zone = np.array(resume['energy_by_zone'])
+        total_cost = resume['total_cost']
+        start_idx = resume['next_idx']
+        print(f"\n♻️  Resuming from {checkpoint} ({resume['writer']['rows']} records already written)")
+    
+    writer = TableWriter(output_file, batch_rows=batch_rows, resume=resume['writer'] if resume else None)
     
     print(f"\n🔄 Running simulation...")
     print(f"   Progress: ", end='', flush=True)
@@ -72,97 +153,79 @@ def simulate_building_physics(days=30, output_file='building_simulation_data.csv
     progress_interval = max(total_hours // 20, 1)
     
     for hour_idx, idx in enumerate(range(0, len(forecast_data), 4)):
-        row = forecast_data.iloc[idx]
-        current_time = row['timestamp']
+        if idx < start_idx:
+            continue
+        hour = pd.Timestamp(timestamps[idx]).hour
         
         # Progress indicator
         if hour_idx % progress_interval == 0:
             print("█", end='', flush=True)
         
-        # Rule-based HVAC control (no AI agents)
-        # Adjust setpoint based on occupancy and time of day
-        hour = current_time.hour
-        
-        for zone_id in zone_ids:
-            zone = campus.get_zone(zone_id)
-            occupancy = int(row[f'{zone_id}_occupancy'])
+        with profiler.phase('physics'):
+            # Setpoints from occupancy and time of day, then HVAC power, for every zone
+            engine.hvac_setpoint[:] = policy(occupancy_matrix[idx], engine.occupancy_capacity, hour, residential)
+            hvac_powers = controller(engine.hvac_setpoint, engine.indoor_temp, engine.hvac_capacity, dt=1.0)
             
-            # Simple occupancy-based setpoint
-            if occupancy > zone.occupancy_capacity * 0.5:
-                # High occupancy - strict comfort
-                zone_setpoints[zone_id] = 22.0
-            elif occupancy > zone.occupancy_capacity * 0.2:
-                # Medium occupancy - moderate comfort
-                zone_setpoints[zone_id] = 22.5
-            else:
-                # Low occupancy - relaxed comfort (save energy)
-                zone_setpoints[zone_id] = 23.0
-            
-            # Night setback for non-residential zones
-            if hour < 6 or hour > 22:
-                if 'dorm' not in zone_id:
-                    zone_setpoints[zone_id] = 24.0  # Less cooling at night
-            
-            zone.hvac_setpoint = zone_setpoints[zone_id]
-        
-        # Calculate HVAC power for each zone
-        zone_hvac_powers = {}
-        zone_occupancies = {}
-        
-        for zone_id in zone_ids:
-            zone = campus.get_zone(zone_id)
-            occupancy = int(row[f'{zone_id}_occupancy'])
-            zone_occupancies[zone_id] = occupancy
-            
-            # Simple proportional controller
-            temp_error = zone.hvac_setpoint - zone.indoor_temp
-            hvac_power = max(-zone.hvac_capacity, min(zone.hvac_capacity, temp_error * 50))
-            zone_hvac_powers[zone_id] = hvac_power
-        
-        # Simulate all 15-min timesteps in this hour
-        for sub_idx in range(idx, min(idx + 4, len(forecast_data))):
-            sub_row = forecast_data.iloc[sub_idx]
-            
-            sub_occupancies = {zone_id: int(sub_row[f'{zone_id}_occupancy']) 
-                              for zone_id in zone_ids}
-            
-            # Run simulation
-            sim_result = campus.simulate_step(
-                zone_hvac_powers,
-                sub_occupancies,
-                float(sub_row['solar_forecast']),
-                float(sub_row['outdoor_temp'])
+            # Simulate all 15-min timesteps in this hour in one shot
+            end = min(idx + 4, len(forecast_data))
+            sim_result = campus.advance(
+                hvac_powers,
+                occupancy_matrix[idx:end],
+                solar[idx:end],
+                outdoor[idx:end],
+                method=integrator
             )
             
-            # Store results for each zone
-            for zone_id, zone_result in sim_result['zones'].items():
-                result_row = {
-                    'timestamp': sub_row['timestamp'],
-                    'zone_id': zone_id,
-                    'zone_name': campus.get_zone(zone_id).zone_name,
-                    'hvac_setpoint': zone_setpoints[zone_id],
-                    **zone_result,
-                    'solar_forecast': float(sub_row['solar_forecast']),
-                    'outdoor_temp': float(sub_row['outdoor_temp']),
-                    'electricity_price': float(sub_row['electricity_price']),
-                    'grid_carbon_intensity': float(sub_row['grid_carbon_intensity'])
-                }
-                results.append(result_row)
+            # Update summary statistics
+            energy_by_zone += sim_result['total_consumption'].sum(axis=0) * 0.25
+            total_cost += float((sim_result['grid_used'] * price[idx:end, None]).sum() * 0.25)
+            n_steps = end - idx
+            profiler.count('steps', n_steps)
+            profiler.count('zone_steps', n_steps * n_zones)
+        
+        # Stream results as column blocks (step-major, zone-minor)
+        with profiler.phase('write'):
+            setpoints = engine.hvac_setpoint.copy()
+            sim_result['occupancy'] = sim_result['occupancy'].astype(int)
+            flushed = writer.append({
+                'timestamp': np.repeat(timestamps[idx:end], n_zones),
+                'zone_id': np.tile(zone_id_array, n_steps),
+                'zone_name': np.tile(zone_name_array, n_steps),
+                'hvac_setpoint': np.tile(setpoints, n_steps),
+                **{key: values.ravel() for key, values in sim_result.items()},
+                'outdoor_temp': np.repeat(outdoor[idx:end], n_zones),
+                'solar_forecast': np.repeat(solar[idx:end], n_zones),
+                'electricity_price': np.repeat(price[idx:end], n_zones),
+                'grid_carbon_intensity': np.repeat(carbon[idx:end], n_zones)
+            })
+            profiler.count('rows', n_steps * n_zones)
+    
+        if flushed and checkpoint:
+            with profiler.phase('checkpoint'):
+                _save_checkpoint(checkpoint, {
+                    'config': config,
+                    'next_idx': end,
+                    'writer': writer.state(),
+                    'engine': {field: getattr(campus.engine, field).tolist() for field in campus.engine.FIELDS},
+                    'controller': controller.state(),
+                    'energy_by_zone': energy_by_zone.tolist(),
+                    'total_cost': total_cost
+                })
     
     print(" ✅")
     
-    # Save results
+    # Merge the streamed batches into the output file
     print(f"\n💾 Saving simulation data...")
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(output_file, index=False)
+    with profiler.phase('finalize'):
+        output_file = writer.close()
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
     
-    # Calculate statistics
-    total_energy = results_df.groupby('zone_id')['total_consumption'].sum() * 0.25  # kWh
-    total_cost = (results_df['grid_used'] * results_df['electricity_price']).sum() * 0.25
+    total_energy = pd.Series(energy_by_zone, index=zone_ids)
     
     print(f"\n📊 SIMULATION SUMMARY")
     print(f"="*70)
-    print(f"Duration: {days} days ({len(results_df)} records)")
+    print(f"Duration: {days} days ({writer.rows_written} records)")
     print(f"Total Energy: {total_energy.sum():.2f} kWh")
     print(f"Total Cost: ${total_cost:.2f}")
     print(f"\nEnergy by Zone:")
@@ -172,8 +235,22 @@ def simulate_building_physics(days=30, output_file='building_simulation_data.csv
     
     print(f"\n✅ Simulation complete!")
     print(f"📁 Data saved to: {output_file}")
+    profile_file = profiler.write(profile_path(output_file))
+    if profile_file:
+        print(f"⏱️  Profile saved to: {profile_file}")
+        for line in profiler.format_report(limit=5):
+            print(f"   {line}")
     print(f"\n🚀 Next step: Run agent analysis")
     print(f"   python main_multizone.py")
 
+    return {
+        'records': writer.rows_written,
+        'energy_by_zone': total_energy.to_dict(),
+        'total_energy': float(total_energy.sum()),
+        'total_cost': total_cost,
+        'output_file': output_file,
+        'profile_file': profile_file
+    }
+
 if __name__ == "__main__":
     simulate_building_physics()
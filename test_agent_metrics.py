@@ -0,0 +1,61 @@
+# test_agent_metrics.py
+"""
+Checks for the agent call instrumentation
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.agent_metrics import AgentMetrics, metric_tags, tagged
+
+
+def test_summary_percentiles_and_parse_counts():
+    metrics = AgentMetrics()
+    for i in range(100):
+        metrics.record('Sherlock', latency_s=(i + 1) / 100, queue_wait_s=0.01, prompt_tokens=10, completion_tokens=5,
+                       retries=int(i == 0), timeouts=int(i == 0))
+    metrics.record('Sherlock', latency_s=0.0, cached=True)
+    metrics.record('Sherlock', latency_s=0.1, prompt_tokens=None, completion_tokens=3)   # stopped early
+    metrics.record('Orchestrator', latency_s=2.0, error='timeout', retries=3, timeouts=4)
+    metrics.record('Sherlock', 'parse', results=8, failed=2, reasks=1, fallbacks=1)
+    
+    summary = metrics.summary()
+    sherlock = summary['Sherlock']
+    assert sherlock['calls'] == 102 and sherlock['cache_hits'] == 1 and sherlock['served'] == 101
+    assert sherlock['latency_p50'] == 0.5 and sherlock['latency_p99'] == 0.99
+    assert sherlock['prompt_tokens'] == 1000 and sherlock['completion_tokens'] == 503
+    assert sherlock['prompt_counted'] == 100 and sherlock['prompt_tokens_mean'] == 10.0
+    assert (sherlock['results'], sherlock['parse_failures'], sherlock['fallbacks']) == (8, 2, 1)
+    assert summary['Orchestrator']['errors'] == 1 and summary['all']['timeouts'] == 5
+    assert len(metrics.format_summary()) == 3
+
+
+def test_tags_follow_tagged_work_into_threads(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = AgentMetrics(str(path))
+    
+    def call(agent):
+        metrics.record(agent, latency_s=0.1)
+        return threading.current_thread().name
+    
+    with ThreadPoolExecutor(max_workers=2) as pool, metric_tags(timepoint='2024-07-01 12:00'):
+        with metric_tags(zone='library'):
+            pool.submit(tagged(call), 'Solar Prophet').result()
+        pool.submit(tagged(call, zone='gym'), 'Grid Oracle').result()
+        pool.submit(call, 'Comfort Guardian').result()    # untagged: thread pools drop the context
+    metrics.close()
+    
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e['agent'], e.get('zone'), e.get('timepoint')) for e in events] == [
+        ('Solar Prophet', 'library', '2024-07-01 12:00'),
+        ('Grid Oracle', 'gym', '2024-07-01 12:00'),
+        ('Comfort Guardian', None, None),
+    ]
+    assert metrics.export(str(tmp_path / 'copy.jsonl')) and len(metrics.events) == 3
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_summary_percentiles_and_parse_counts()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_tags_follow_tagged_work_into_threads(pathlib.Path(tmp))
+    print("Agent metrics checks passed")
@@ -0,0 +1,61 @@
+# test_agent_results.py
+"""
+Checks for the typed agent result schemas
+"""
+import json
+import sys
+
+import pytest
+
+from agents import results
+
+
+def test_parse_coerces_clamps_and_reports_problems():
+    decision, problems = results.Decision.parse(
+        '{"hvac_setpoint": "26.5°C", "hvac_power": "80 kW", "alerts": "filter due", "note": "kept"}'
+    )
+    assert problems == {}
+    assert decision['hvac_setpoint'] == 24.0 and decision['hvac_power'] == 80.0
+    assert decision['alerts'] == ['filter due'] and decision.extra == {'note': 'kept'}
+    
+    _, problems = results.Decision.parse({'hvac_setpoint': 'cooler', 'decision': 'pre-cool'})
+    assert problems == {'hvac_setpoint': 'must be a number between 20 and 24'}
+    _, problems = results.AnomalyReport.parse("not json")
+    assert set(problems) == {'anomaly_detected', 'severity'}
+    
+    report, problems = results.AnomalyReport.parse(
+        {'anomaly_detected': 'yes', 'severity': 'HIGH', 'anomaly_type': 'gremlins'}
+    )
+    assert problems == {} and report['anomaly_detected'] is True and report['severity'] == 'high'
+    assert 'anomaly_type' not in report    # optional and invalid: dropped
+    
+    comfort, problems = results.ComfortAssessment.parse(
+        {'comfort_status': 'Comfortable', 'constraints': {'min_temp': '25', 'max_temp': 19, 'flexibility': 'Low'}}
+    )
+    assert problems == {}
+    assert comfort['constraints'] == {'min_temp': 19.0, 'max_temp': 25.0, 'flexibility': 'low'}
+
+
+def test_results_read_like_dicts():
+    decision, _ = results.Decision.parse({'hvac_setpoint': 21.5})
+    assert decision.get('reasoning', 'N/A') == 'N/A' and 'reasoning' not in decision
+    decision.setdefault('hvac_power', 100)
+    decision['source'] = 'llm'
+    assert {**decision} == {'hvac_setpoint': 21.5, 'hvac_power': 100, 'source': 'llm'}
+    assert decision == {'hvac_setpoint': 21.5, 'hvac_power': 100, 'source': 'llm'}
+    assert json.loads(json.dumps(decision.to_dict())) == decision
+    
+    # Earlier valid fields survive a follow-up reply; fallbacks only fill the gaps
+    fixed, problems = results.Decision.parse({'hvac_setpoint': 22}, base=results.Decision(reasoning='solar'))
+    assert problems == {} and fixed == {'hvac_setpoint': 22.0, 'reasoning': 'solar'}
+    filled = results.Decision.complete(results.Decision(reasoning='solar'), {'hvac_setpoint': 23, 'reasoning': '-'})
+    assert filled == {'hvac_setpoint': 23, 'reasoning': 'solar', 'fallback': True}
+    
+    assert not hasattr(decision, '__dict__')
+    assert sys.getsizeof(decision) < sys.getsizeof(dict(decision))
+
+
+if __name__ == "__main__":
+    test_parse_coerces_clamps_and_reports_problems()
+    test_results_read_like_dicts()
+    print("Agent result checks passed")
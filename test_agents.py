@@ -0,0 +1,457 @@
+# test_agents.py
+"""
+Agent transport checks against a local stand-in for the Ollama generate API
+"""
+import asyncio
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pandas as pd
+import pytest
+
+from agents import base
+OllamaBaseAgent = base.OllamaBaseAgent
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        self.server.connections.add(self.client_address)
+        answer = self.server.reply(body) if self.server.reply else {'echo': body['model']}
+        reply = json.dumps({'response': json.dumps(answer), 'done': True,
+                            'prompt_eval_count': 40, 'eval_count': 12}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+@pytest.fixture
+def stand_in_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.requests, server.connections, server.reply = [], set(), None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _agent(server):
+    agent = OllamaBaseAgent("Test", "test role")
+    agent.ollama_url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    return agent
+
+
+def test_generate_url_follows_ollama_host(monkeypatch):
+    monkeypatch.delenv('OLLAMA_HOST', raising=False)
+    assert base.generate_url() == "http://localhost:11434/api/generate"
+    monkeypatch.setenv('OLLAMA_HOST', '127.0.0.1:11500')
+    assert base.generate_url() == "http://127.0.0.1:11500/api/generate"
+    assert base.generate_url('https://gpu-box/') == "https://gpu-box:11434/api/generate"
+
+
+def test_think_reuses_pooled_connection(stand_in_server):
+    OllamaBaseAgent.configure_transport(pool_size=4)
+    agents = [_agent(stand_in_server) for _ in range(3)]
+    
+    for _ in range(3):
+        for agent in agents:
+            assert json.loads(agent.think("context", "system")) == {'echo': 'mistral:latest'}
+    
+    assert len(stand_in_server.requests) == 9
+    assert len(stand_in_server.connections) == 1
+    assert stand_in_server.requests[0]['options'] == agents[0].options
+
+
+def test_async_think(stand_in_server):
+    pytest.importorskip("aiohttp")
+    agent = _agent(stand_in_server)
+    
+    async def run():
+        try:
+            return await asyncio.gather(*(agent.athink(f"context {i}", "system") for i in range(6)))
+        finally:
+            await OllamaBaseAgent.close_async_sessions()
+    
+    responses = asyncio.run(run())
+    assert [json.loads(r) for r in responses] == [{'echo': 'mistral:latest'}] * 6
+    assert len(stand_in_server.connections) <= OllamaBaseAgent.default_concurrency
+
+
+def test_unreachable_server_falls_back():
+    agent = OllamaBaseAgent("Test", "test role")
+    agent.ollama_url = "http://127.0.0.1:9/api/generate"
+    assert json.loads(agent.think("context", "system")) == {"error": "Agent failed to respond"}
+
+
+def test_think_uses_response_cache(stand_in_server):
+    OllamaBaseAgent.enable_cache(':memory:')
+    try:
+        agent = _agent(stand_in_server)
+        first = agent.think("same context", "system")
+        second = agent.think("same context", "system")
+        agent.think("other context", "system")
+        
+        assert first == second
+        assert len(stand_in_server.requests) == 2
+        assert OllamaBaseAgent.cache.stats()['hits'] == 1
+    finally:
+        OllamaBaseAgent.disable_cache()
+
+
+def _records(n=16, **overrides):
+    frame = pd.DataFrame({
+        'timestamp': pd.date_range('2024-03-15 08:00', periods=n, freq='15min'),
+        'zone_id': 'engineering',
+        'total_consumption': 50.0,
+        'avg_consumption': 50.0,
+        'occupancy': 80,
+        'indoor_temp': 22.0,
+        'outdoor_temp': 18.0,
+        'hvac_power': 20.0,
+        'solar_generation': 10.0,
+    })
+    for column, values in overrides.items():
+        frame[column] = values
+    return frame
+
+
+def test_rules_flag_each_condition():
+    from agents.anomaly import evaluate_rules
+    
+    frame = _records()
+    frame.loc[1, ['occupancy', 'total_consumption']] = [0, 90.0]
+    frame.loc[2, 'total_consumption'] = 200.0
+    frame.loc[3, 'indoor_temp'] = 75.0
+    frame.loc[4, 'total_consumption'] = 120.0
+    frame.loc[5:15, 'hvac_power'] = 120.0
+    
+    flags = evaluate_rules(frame, hvac_capacity={'engineering': 120.0})
+    
+    assert flags.loc[1, 'zero_occupancy_waste'] and flags.loc[1, 'severity'] == 'high'
+    assert flags.loc[2, 'consumption_spike']
+    assert flags.loc[3, 'sensor_out_of_range'] and flags.loc[3, 'severity'] == 'critical'
+    assert flags.loc[4, 'ambiguous'] and not flags.loc[4, 'anomaly_detected']
+    assert not flags.loc[12, 'hvac_saturated'] and flags.loc[14, 'hvac_saturated']
+    assert not flags.loc[0, 'anomaly_detected'] and not flags.loc[0, 'ambiguous']
+
+
+def test_sherlock_fast_path_skips_llm(stand_in_server):
+    from agents.anomaly import SherlockAgent
+    
+    sherlock = SherlockAgent()
+    sherlock.ollama_url = _agent(stand_in_server).ollama_url
+    state = _records(1).iloc[0].to_dict()
+    
+    normal = sherlock.analyze(state['timestamp'], state, {'avg_consumption': 50.0, 'avg_occupancy': 80})
+    waste = sherlock.analyze(state['timestamp'], {**state, 'occupancy': 0, 'total_consumption': 90.0},
+                             {'avg_consumption': 50.0, 'avg_occupancy': 80})
+    assert not normal['anomaly_detected'] and waste['anomaly_type'] == 'waste'
+    assert len(stand_in_server.requests) == 0
+    
+    frame = _records()
+    frame.loc[3, 'indoor_temp'] = 75.0    # critical: still goes to the model
+    frame.loc[4, 'total_consumption'] = 120.0    # ambiguous
+    stand_in_server.reply = lambda body: {'anomaly_detected': True, 'severity': 'high'}
+    reports = sherlock.analyze_frame(frame)
+    assert [r['source'] for r in reports] == ['llm', 'llm']
+    assert len(stand_in_server.requests) == 2
+    
+    sherlock.llm_severities = ()
+    reports = sherlock.analyze_frame(frame, max_llm_calls=0)
+    assert [r['source'] for r in reports] == ['rules', 'rules']
+
+
+def test_parse_batch_accepts_keyed_and_listed_replies():
+    keyed = json.dumps({'a': {'x': 1}, 'b': {'y': 2}, 'c': 'bad'})
+    assert OllamaBaseAgent.parse_batch(keyed, ['a', 'b', 'c'], required=('x',)) == {'a': {'x': 1}}
+    
+    listed = json.dumps({'zones': [{'zone_id': 'a', 'x': 1}, {'zone_id': 'b', 'x': 'warm'}]})
+    parsed = OllamaBaseAgent.parse_batch(listed, ['a', 'b'], validate=lambda e: isinstance(e['x'], int))
+    assert list(parsed) == ['a']
+    assert OllamaBaseAgent.parse_batch("not json", ['a']) == {}
+
+
+def test_think_batch_retries_missing_zones_then_falls_back(stand_in_server):
+    def reply(body):
+        # First call answers zone a only; the retry answers b; c is never answered
+        if len(stand_in_server.requests) == 1:
+            return {'a': {'value': 1}}
+        return {'b': {'value': 2}}
+    stand_in_server.reply = reply
+    agent = _agent(stand_in_server)
+    
+    rows = {zone_id: f"{zone_id} | 1.0" for zone_id in ('a', 'b', 'c')}
+    results = agent.think_batch("shared", "zone_id | value", rows, "system",
+                                required=('value',), fallback=lambda zone_id: {'value': 0})
+    
+    assert results == {'a': {'value': 1}, 'b': {'value': 2}, 'c': {'value': 0, 'fallback': True}}
+    assert len(stand_in_server.requests) == 2
+    assert "a | 1.0" not in stand_in_server.requests[1]['prompt']
+
+
+def test_orchestrator_batch_keeps_setpoint_on_invalid_reply(stand_in_server):
+    from agents.corrdinator import OrchestratorAgent
+    
+    stand_in_server.reply = lambda body: {'lab': {'hvac_setpoint': 21.0, 'reasoning': 'solar'},
+                                          'office': {'hvac_setpoint': 'cooler'}}
+    orchestrator = OrchestratorAgent()
+    orchestrator.ollama_url = _agent(stand_in_server).ollama_url
+    state = {'indoor_temp': 23.0, 'hvac_setpoint': 22.5, 'occupancy': 10, 'solar_generation': 5.0}
+    
+    decisions = orchestrator.coordinate_batch(pd.Timestamp('2024-07-01 12:00'),
+                                              {'lab': state, 'office': state}, {})
+    assert decisions['lab']['hvac_setpoint'] == 21.0
+    assert decisions['office']['hvac_setpoint'] == 22.5 and decisions['office']['fallback']
+    assert len(stand_in_server.requests) == 2
+
+
+def test_invalid_fields_are_asked_again_alone(stand_in_server):
+    from agents.corrdinator import OrchestratorAgent
+    
+    replies = iter([{'decision': 'pre-cool', 'reasoning': 'solar peak', 'hvac_setpoint': 'cooler'},
+                    {'hvac_setpoint': '19.0'}])
+    stand_in_server.reply = lambda body: next(replies)
+    orchestrator = OrchestratorAgent()
+    orchestrator.ollama_url = _agent(stand_in_server).ollama_url
+    state = {'indoor_temp': 23.0, 'hvac_setpoint': 22.5, 'occupancy': 10, 'solar_generation': 5.0}
+    
+    decision = orchestrator.coordinate(pd.Timestamp('2024-07-01 12:00'), state, {})
+    # The follow-up names only the bad field; its answer is clamped and merged
+    assert decision == {'hvac_setpoint': 20.0, 'decision': 'pre-cool', 'reasoning': 'solar peak', 'hvac_power': 100}
+    follow_up = stand_in_server.requests[1]['prompt']
+    assert 'hvac_setpoint (must be a number between 20 and 24)' in follow_up and 'reasoning (' not in follow_up
+    
+    # Still invalid after the follow-up: current setpoint, marked as a fallback
+    stand_in_server.reply = lambda body: {'hvac_setpoint': None}
+    decision = orchestrator.coordinate(pd.Timestamp('2024-07-01 12:00'), state, {})
+    assert decision['hvac_setpoint'] == 22.5 and decision['fallback']
+    assert len(stand_in_server.requests) == 4
+
+
+def test_metrics_record_calls_tokens_and_reasks(stand_in_server):
+    from agents.corrdinator import OrchestratorAgent
+    from utils.agent_metrics import metric_tags
+    
+    replies = iter([{'hvac_setpoint': 'warmer'}, {'hvac_setpoint': 23}])
+    stand_in_server.reply = lambda body: next(replies)
+    orchestrator = OrchestratorAgent()
+    orchestrator.ollama_url = _agent(stand_in_server).ollama_url
+    state = {'indoor_temp': 23.0, 'hvac_setpoint': 22.5, 'occupancy': 10, 'solar_generation': 5.0}
+    
+    metrics = OllamaBaseAgent.enable_metrics()
+    try:
+        with metric_tags(zone='library'):
+            orchestrator.coordinate(pd.Timestamp('2024-07-01 12:00'), state, {})
+    finally:
+        OllamaBaseAgent.disable_metrics()
+    
+    first, follow_up, parse = metrics.events
+    assert first['event'] == 'call' and first['zone'] == 'library' and 'reask' not in first
+    assert (first['prompt_tokens'], first['completion_tokens'], first['retries']) == (40, 12, 0)
+    assert follow_up['reask'] is True and first['latency_s'] > 0
+    assert parse == {**parse, 'event': 'parse', 'failed': 1, 'problems': ['hvac_setpoint'], 'fallbacks': 0}
+    assert metrics.summary()['Orchestrator']['completion_tokens'] == 24
+
+
+def test_scheduler_sends_duplicate_prompts_once(stand_in_server):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def slow(body):
+        time.sleep(0.2)
+        return {'echo': body['model']}
+    stand_in_server.reply = slow
+    agent = _agent(stand_in_server)
+    
+    scheduler = OllamaBaseAgent.enable_scheduler(concurrency=1)
+    metrics = OllamaBaseAgent.enable_metrics()
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            replies = list(pool.map(lambda _: agent.think("campus solar", "system"), range(4)))
+    finally:
+        OllamaBaseAgent.disable_metrics()
+        OllamaBaseAgent.disable_scheduler()
+    
+    assert [json.loads(r) for r in replies] == [{'echo': 'mistral:latest'}] * 4
+    assert len(stand_in_server.requests) == 1
+    assert scheduler.summary()['coalesced'] == 3
+    assert metrics.summary()['Test']['coalesced'] == 3
+    assert metrics.summary()['Test']['prompt_tokens'] == 40
+
+
+def test_campus_grid_outlook_and_zone_advice(stand_in_server):
+    from agents.grid import GridOracleAgent, grid_outlook
+    
+    prices = [{'price': p} for p in (0.12, 0.12, 0.20, 0.30, 0.30, 0.15)]
+    carbon = [{'carbon_intensity': c} for c in (500, 480, 600, 650, 400, 420)]
+    outlook = grid_outlook(prices, carbon)
+    assert outlook['peak_periods'] == [{'start': '+45min', 'end': '+75min', 'max_price': 0.3}]
+    assert outlook['action'] == 'precondition' and outlook['price_saving'] == 0.18
+    assert outlook['cleanest_at'] == '+60min'
+    assert grid_outlook(prices[3:], carbon[3:])['action'] == 'shed'
+    
+    stand_in_server.reply = lambda body: {'recommendation': 'pre-cool now', 'priority': 'medium'}
+    oracle = GridOracleAgent()
+    oracle.ollama_url = _agent(stand_in_server).ollama_url
+    campus = oracle.analyze_campus(pd.Timestamp('2024-07-01 10:00'), prices, carbon)
+    assert campus['recommendation'] == 'pre-cool now' and campus['outlook'] == outlook
+    assert len(stand_in_server.requests) == 1
+    
+    advice = GridOracleAgent.zone_recommendation(campus, {'grid_used': 40.0, 'hvac_power': 25.0})
+    assert advice['flexible_kw'] == 25.0 and advice['cost_impact'] == '$4.50'
+
+
+def test_grid_outlook_defaults_missing_forecasts():
+    from agents.grid import grid_outlook
+    
+    outlook = grid_outlook([{'price': 0.2}, {'price': 0.1}], [])
+    assert outlook['price_range'] == [0.1, 0.2] and outlook['action'] == 'shed'
+    assert outlook['carbon_now'] == 500.0 and outlook['cleanest_at'] == '+0min'
+    
+    outlook = grid_outlook([], [{'carbon_intensity': 450}, {'carbon_intensity': 300}])
+    assert outlook['price_now'] == 0.15 and outlook['carbon_saving'] == 150.0
+    assert grid_outlook([], [])['action'] == 'maintain'
+
+
+def test_orchestrator_optimizer_keeps_numbers_and_takes_explanation(stand_in_server):
+    import numpy as np
+    from agents.corrdinator import OrchestratorAgent
+    from building_zones import MultiZoneUniversity
+    
+    zones = list(MultiZoneUniversity().zones.values())[:2]
+    stand_in_server.reply = lambda body: {zones[0].zone_id: {'reasoning': 'cheap hours first', 'hvac_setpoint': 30}}
+    orchestrator = OrchestratorAgent()
+    orchestrator.ollama_url = _agent(stand_in_server).ollama_url
+    
+    states = {zone.zone_id: {'indoor_temp': 24.0, 'hvac_setpoint': 22.0, 'occupancy': 50} for zone in zones}
+    forecast = {'occupancy': np.full((16, 2), 50.0), 'outdoor_temp': np.full(16, 30.0),
+                'price': np.full(16, 0.2), 'carbon': np.full(16, 500.0), 'solar': np.zeros(16)}
+    decisions = orchestrator.optimize(pd.Timestamp('2024-07-01 12:00'), zones, states, forecast)
+    plan = orchestrator.optimizer.optimize(zones, [24.0, 24.0], forecast['occupancy'], forecast['outdoor_temp'],
+                                           forecast['price'], forecast['carbon'], forecast['solar'],
+                                           current_setpoint=[22.0, 22.0])
+    
+    first, second = (decisions[zone.zone_id] for zone in zones)
+    assert [first['hvac_setpoint'], second['hvac_setpoint']] == plan['setpoint'].tolist()
+    assert first['reasoning'] == 'cheap hours first' and second['reasoning'].startswith('4h plan')
+    assert first['source'] == 'optimizer'
+
+
+class _StreamingHandler(BaseHTTPRequestHandler):
+    """Streams the reply a few characters per line, slowly, like a generating model"""
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_POST(self):
+        import time
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        text = json.dumps(self.server.answer)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        try:
+            for i in range(0, len(text), 4):
+                self.wfile.write((json.dumps({'response': text[i:i + 4], 'done': False}) + '\n').encode())
+                self.wfile.flush()
+                self.server.sent += 1
+                time.sleep(0.01)
+            self.wfile.write((json.dumps({'response': '', 'done': True}) + '\n').encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+@pytest.fixture
+def streaming_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StreamingHandler)
+    server.requests, server.sent = [], 0
+    server.answer = {'recommendation': 'pre-cool', 'confidence': 80, 'analysis': 'x' * 400}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_streaming_stops_once_required_fields_are_complete(streaming_server):
+    import time
+    from agents.solar import SolarProphetAgent
+    
+    agent = SolarProphetAgent()
+    agent.ollama_url = f"http://127.0.0.1:{streaming_server.server_address[1]}/api/generate"
+    metrics = OllamaBaseAgent.enable_metrics()
+    start = time.perf_counter()
+    try:
+        reply = json.loads(agent.think("context", "system"))
+    finally:
+        OllamaBaseAgent.disable_metrics()
+    
+    assert reply == {'recommendation': 'pre-cool', 'confidence': 80}
+    call, = metrics.events    # stopped before the final chunk, which carries the prompt count
+    assert call['prompt_tokens'] is None and call['completion_tokens'] > 0
+    assert time.perf_counter() - start < 0.5 and streaming_server.sent < 30
+    request = streaming_server.requests[0]
+    assert request['stream'] is True and request['options']['num_predict'] == SolarProphetAgent.num_predict
+    
+    # Without required fields the whole object is read
+    full = json.loads(agent.think("context", "system", required=()))
+    assert full == streaming_server.answer
+
+
+def test_sherlock_stream_keeps_blocking_fields(streaming_server):
+    from agents.anomaly import SherlockAgent
+    
+    report = {'anomaly_detected': True, 'severity': 'critical', 'description': 'chiller fault',
+              'recommended_action': 'inspect chiller', 'block_optimization': True,
+              'alert_message': 'Chiller fault in library', 'notes': 'x' * 400}
+    streaming_server.answer = report
+    agent = SherlockAgent()
+    agent.ollama_url = f"http://127.0.0.1:{streaming_server.server_address[1]}/api/generate"
+    reply = json.loads(agent.think("context", agent.system_prompt))
+    
+    assert reply == {key: value for key, value in report.items() if key != 'notes'}
+
+
+def test_cache_keeps_early_exit_replies_apart(streaming_server):
+    from agents.solar import SolarProphetAgent
+    
+    OllamaBaseAgent.enable_cache(':memory:')
+    try:
+        agent = SolarProphetAgent()
+        agent.ollama_url = f"http://127.0.0.1:{streaming_server.server_address[1]}/api/generate"
+        short = json.loads(agent.think("context", "system"))
+        full = json.loads(agent.think("context", "system", required=()))
+        assert agent.think("context", "system", required=(), num_predict=50) is not None
+        
+        assert short == {'recommendation': 'pre-cool', 'confidence': 80}
+        assert full == streaming_server.answer
+        assert len(streaming_server.requests) == 3
+        assert json.loads(agent.think("context", "system")) == short
+        assert OllamaBaseAgent.cache.stats()['hits'] == 1
+    finally:
+        OllamaBaseAgent.disable_cache()
+
+
+def test_json_stream_closes_partial_objects():
+    from utils.json_stream import JSONObjectStream
+    
+    parser = JSONObjectStream()
+    for piece in ('{"a": "x, {y}\\"", "b": [1, {"c"', ': 2}], "n": 21'):
+        parser.feed(piece)
+    assert parser.fields == {'a': 'x, {y}"', 'b': [1, {'c': 2}]} and not parser.has(('n',))
+    parser.feed('.5, "d": {"e"')
+    assert parser.has(('a', 'n')) and json.loads(parser.result())['n'] == 21.5
+    parser.feed(': 1}}')
+    assert parser.closed and json.loads(parser.result())['d'] == {'e': 1}
@@ -0,0 +1,35 @@
+# test_benchmarks.py
+"""
+Checks for the benchmark harness
+"""
+import sys
+import time
+import pytest
+from benchmarks import harness
+
+
+def test_run_and_compare_against_baseline(tmp_path):
+    calls = []
+    
+    def setup():
+        calls.append('setup')
+        yield lambda: (calls.append('run'), time.sleep(0.03))
+        calls.append('cleanup')
+    
+    result = harness.run_workload(harness.Workload('demo', setup, items=10, unit='rows', repeat=3))
+    assert result['loops'] >= 2  # runs per sample to fill MIN_SAMPLE_SECONDS
+    assert calls == ['setup'] + ['run'] * (1 + 3 * result['loops']) + ['cleanup']  # one warm-up run
+    assert result['repeat'] == 3 and result['items'] == 10 and result['min_s'] <= result['median_s']
+    
+    path = harness.save_results({'fast': {'min_s': 1.0}, 'slow': {'min_s': 1.0}}, tmp_path / 'baseline.json')
+    baseline = harness.load_results(path)['results']
+    current = {'fast': {'min_s': 1.2, 'tolerance': 0.25}, 'slow': {'min_s': 1.3, 'tolerance': 0.25},
+               'new': {'min_s': 5.0}}
+    comparisons = harness.compare(current, baseline)
+    assert set(comparisons) == {'fast', 'slow'}
+    assert not comparisons['fast']['regressed'] and comparisons['slow']['regressed']
+    assert harness.load_results(tmp_path / 'missing.json') is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,117 @@
+# test_campus_engine.py
+"""
+Checks that the vectorized campus engine matches the per-zone BuildingZone model
+"""
+import numpy as np
+from building_zones import BuildingZone, MultiZoneUniversity
+from building_model import UniversityBuilding
+
+
+def _reference_zones():
+    """Unbound copies of the default campus zones"""
+    campus = MultiZoneUniversity()
+    return {zone_id: BuildingZone(zone_id, zone.zone_name, zone.floor_area, zone.occupancy_capacity)
+            for zone_id, zone in campus.zones.items()}
+
+
+def test_vectorized_step_matches_zone_loop():
+    campus = MultiZoneUniversity()
+    reference = _reference_zones()
+    rng = np.random.default_rng(0)
+    
+    for _ in range(20):
+        hvac = {zone_id: float(rng.uniform(-50, 50)) for zone_id in reference}
+        occupancy = {zone_id: int(rng.integers(0, 200)) for zone_id in reference}
+        solar, outdoor = float(rng.uniform(0, 300)), float(rng.uniform(10, 30))
+        
+        result = campus.simulate_step(hvac, occupancy, solar, outdoor)
+        
+        # Reference: original two-pass dict loop
+        consumptions = {}
+        for zone_id, zone in reference.items():
+            factor = occupancy[zone_id] / max(zone.occupancy_capacity, 1)
+            consumptions[zone_id] = zone.base_load * (0.3 + 0.7 * factor) + abs(hvac[zone_id])
+        allocations = campus.allocate_solar(solar, consumptions)
+        for zone_id, zone in reference.items():
+            expected = zone.simulate_step(hvac[zone_id], allocations[zone_id], occupancy[zone_id], outdoor)
+            actual = result['zones'][zone_id]
+            for key in ('indoor_temp', 'total_consumption', 'solar_used', 'grid_used', 'base_load'):
+                assert np.isclose(actual[key], expected[key]), (zone_id, key)
+
+
+def test_zones_are_views_into_engine():
+    campus = MultiZoneUniversity()
+    zone = campus.get_zone('library')
+    i = campus.engine.index['library']
+    
+    zone.hvac_setpoint = 23.5
+    assert campus.engine.hvac_setpoint[i] == 23.5
+    
+    campus.engine.indoor_temp[i] = 19.0
+    assert zone.indoor_temp == 19.0
+
+
+def test_large_campus():
+    zones = [BuildingZone(f'zone_{i}', f'Zone {i}', 1000 + i, 100) for i in range(500)]
+    campus = MultiZoneUniversity(zones)
+    step, summary = campus.simulate_step_arrays(np.full(500, 10.0), np.full(500, 50.0), 300.0, 25.0)
+    
+    assert step['indoor_temp'].shape == (500,)
+    assert np.isclose(summary['total_solar_used'], 300.0)
+
+
+def test_advance_matches_stepwise_euler():
+    stepped, jumped = MultiZoneUniversity(), MultiZoneUniversity()
+    rng = np.random.default_rng(1)
+    n_zones = len(stepped.get_zone_ids())
+    
+    for _ in range(24):
+        hvac = rng.uniform(-80, 80, n_zones)
+        occupancy = rng.integers(0, 200, (4, n_zones)).astype(float)
+        solar, outdoor = rng.uniform(0, 300, 4), rng.uniform(10, 30, 4)
+        
+        expected = [stepped.simulate_step_arrays(hvac, occupancy[k], solar[k], outdoor[k])[0] for k in range(4)]
+        actual = jumped.advance(hvac, occupancy, solar, outdoor)
+        for key in ('indoor_temp', 'total_consumption', 'solar_used', 'grid_used'):
+            assert np.allclose(actual[key], [step[key] for step in expected]), key
+    
+    assert np.allclose(stepped.engine.indoor_temp, jumped.engine.indoor_temp)
+
+
+def test_exponential_integrator_within_tolerance():
+    campus = MultiZoneUniversity()
+    n_zones = len(campus.get_zone_ids())
+    occupancy = np.full((2880, n_zones), 50.0)
+    outdoor = 18 + 8 * np.sin(np.arange(2880) / 96 * 2 * np.pi)
+    
+    result = campus.advance(np.zeros(n_zones), occupancy, np.zeros(2880), outdoor,
+                            method='exponential', tolerance=0.05)
+    assert result['indoor_temp'].shape == (2880, n_zones)
+    
+    try:
+        campus.advance(np.zeros(n_zones), occupancy, np.zeros(2880), outdoor,
+                       dt=24, method='exponential', tolerance=1e-6)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected tolerance check to fail at a coarse step")
+
+
+def test_single_building_advance():
+    stepped, jumped = UniversityBuilding(), UniversityBuilding()
+    occupancy, solar, outdoor = [10, 40, 80, 120], [0, 50, 100, 150], [15, 18, 21, 24]
+    
+    expected = [stepped.simulate_step(120, solar[k], occupancy[k], outdoor[k])['indoor_temp'] for k in range(4)]
+    actual = jumped.advance(120, solar, occupancy, outdoor)
+    assert np.allclose(actual['indoor_temp'], expected)
+    assert np.isclose(jumped.indoor_temp, stepped.indoor_temp)
+
+
+if __name__ == "__main__":
+    test_vectorized_step_matches_zone_loop()
+    test_zones_are_views_into_engine()
+    test_large_campus()
+    test_advance_matches_stepwise_euler()
+    test_exponential_integrator_within_tolerance()
+    test_single_building_advance()
+    print("✅ Campus engine tests passed")
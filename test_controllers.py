@@ -0,0 +1,120 @@
+# test_controllers.py
+"""
+Checks for the vectorized setpoint policies and HVAC controllers
+"""
+import numpy as np
+from building_zones import BuildingZone, MultiZoneUniversity
+from controllers import (OccupancySetpointPolicy, FixedSetpointPolicy, ProportionalController,
+                         PIController, SetpointOptimizer, residential_mask)
+
+
+def _legacy_setpoint(zone_id, occupancy, capacity, hour):
+    """Per-zone rule previously inlined in simulate_building_data.py"""
+    if occupancy > capacity * 0.5:
+        setpoint = 22.0
+    elif occupancy > capacity * 0.2:
+        setpoint = 22.5
+    else:
+        setpoint = 23.0
+    if hour < 6 or hour > 22:
+        if 'dorm' not in zone_id:
+            setpoint = 24.0
+    return setpoint
+
+
+def test_policy_and_p_controller_match_legacy_rules():
+    rng = np.random.default_rng(0)
+    zone_ids = ['engineering', 'library', 'dorms_east', 'cafeteria'] * 50
+    capacity = rng.integers(50, 250, len(zone_ids)).astype(float)
+    policy, controller = OccupancySetpointPolicy(), ProportionalController(gain=50)
+    
+    for hour in (2, 9, 14, 23):
+        occupancy = rng.integers(0, 250, len(zone_ids))
+        indoor = rng.uniform(18, 28, len(zone_ids))
+        hvac_capacity = rng.uniform(40, 120, len(zone_ids))
+        
+        setpoints = policy(occupancy, capacity, hour, residential_mask(zone_ids))
+        power = controller(setpoints, indoor, hvac_capacity)
+        
+        for i, zone_id in enumerate(zone_ids):
+            expected = _legacy_setpoint(zone_id, occupancy[i], capacity[i], hour)
+            assert setpoints[i] == expected
+            assert power[i] == max(-hvac_capacity[i], min(hvac_capacity[i], (expected - indoor[i]) * 50))
+
+
+def _closed_loop(controller, hours=72):
+    campus = MultiZoneUniversity()
+    engine = campus.engine
+    occupancy = np.tile(engine.occupancy_capacity * 0.5, (4, 1))
+    engine.hvac_setpoint[:] = FixedSetpointPolicy(22.0)(engine.occupancy_capacity, engine.occupancy_capacity, 12, None)
+    for _ in range(hours):
+        power = controller(engine.hvac_setpoint, engine.indoor_temp, engine.hvac_capacity, dt=1.0)
+        engine.advance(power, occupancy, np.zeros(4), np.full(4, 15.0))
+    return np.abs(engine.indoor_temp - 22.0).max()
+
+
+def test_pi_removes_steady_state_offset():
+    assert _closed_loop(PIController(kp=50, ki=10)) < 0.25 * _closed_loop(ProportionalController(gain=50))
+
+
+def test_pi_does_not_wind_up_when_saturated():
+    controller = PIController(kp=50, ki=10)
+    for _ in range(20):
+        power = controller(np.array([22.0]), np.array([30.0]), np.array([50.0]), dt=1.0)
+    assert power[0] == -50.0 and controller.integral[0] == 0.0
+    
+    restored = PIController()
+    restored.load_state(controller.state())
+    assert np.array_equal(restored.integral, controller.integral)
+
+
+def _optimizer_inputs(steps=16):
+    zones = list(MultiZoneUniversity().zones.values())
+    occupancy = np.tile([z.occupancy_capacity * 0.5 for z in zones], (steps, 1))
+    occupancy[:, -2:] = 0    # dorms empty
+    price = np.r_[np.full(steps // 2, 0.10), np.full(steps - steps // 2, 0.35)]
+    return zones, occupancy, np.full(steps, 32.0), price, np.full(steps, 500.0), np.full(steps, 50.0)
+
+
+def test_optimizer_plan_matches_zone_model():
+    zones, occupancy, outdoor, price, carbon, solar = _optimizer_inputs()
+    indoor = np.full(len(zones), 25.5)
+    plan = SetpointOptimizer().optimize(zones, indoor, occupancy, outdoor, price, carbon, solar,
+                                        current_setpoint=np.full(len(zones), 22.0))
+    
+    # Replaying the chosen trajectory through BuildingZone.simulate_step, with power set
+    # hourly as in the simulation loop, gives the same temperatures
+    controller = ProportionalController(gain=50)
+    for i, source in enumerate(zones):
+        zone = BuildingZone('replay', 'Replay', source.floor_area, source.occupancy_capacity)
+        zone.indoor_temp = indoor[i]
+        for n in range(16):
+            if n % 4 == 0:
+                power = controller(plan['trajectory'][i][n // 4], zone.indoor_temp, zone.hvac_capacity, dt=1.0)
+            zone.simulate_step(float(power), 0.0, occupancy[n, i], outdoor[n])
+            assert abs(zone.indoor_temp - plan['predicted_temp'][n, i]) < 1e-9
+    
+    # No constant setpoint does better than the plan
+    for level in (20.0, 22.0, 24.0):
+        fixed = SetpointOptimizer(levels=(level,)).optimize(zones, indoor, occupancy, outdoor, price, carbon, solar,
+                                                            current_setpoint=np.full(len(zones), 22.0))
+        assert (plan['cost'] <= fixed['cost'] + 1e-9).all()
+    assert set(plan['setpoint']) <= {20.0, 21.0, 22.0, 23.0, 24.0}
+
+
+def test_optimizer_is_deterministic_and_pads_short_forecasts():
+    zones, occupancy, outdoor, price, carbon, solar = _optimizer_inputs(steps=6)
+    optimizer = SetpointOptimizer()
+    first = optimizer.optimize(zones, np.full(len(zones), 23.0), occupancy, outdoor, price, carbon, solar)
+    second = optimizer.optimize(zones, np.full(len(zones), 23.0), occupancy, outdoor, price, carbon, solar)
+    assert first['predicted_temp'].shape == (16, len(zones))
+    assert all(np.array_equal(first[key], second[key]) for key in first)
+
+
+if __name__ == "__main__":
+    test_policy_and_p_controller_match_legacy_rules()
+    test_pi_removes_steady_state_offset()
+    test_pi_does_not_wind_up_when_saturated()
+    test_optimizer_plan_matches_zone_model()
+    test_optimizer_is_deterministic_and_pads_short_forecasts()
+    print("Controller checks passed")
@@ -0,0 +1,109 @@
+# test_hist_tracker.py
+"""
+Checks for the ring-buffer hour-of-day baselines
+"""
+import numpy as np
+import pandas as pd
+from utils.hist_tracker import HistoricalTracker
+
+
+def _reference_average(history, current_hour):
+    """Original list/DataFrame implementation"""
+    if len(history) < 4:
+        return {'avg_consumption': 50, 'avg_occupancy': 50, 'avg_hvac_power': 50}
+    df = pd.DataFrame(history)
+    df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
+    same_hour = df[df['hour'] == current_hour]
+    if same_hour.empty:
+        same_hour = df
+    return {
+        'avg_consumption': same_hour['consumption'].mean(),
+        'avg_occupancy': same_hour['occupancy'].mean(),
+        'avg_hvac_power': same_hour['hvac_power'].mean()
+    }
+
+
+def test_matches_reference_over_rolling_window():
+    rng = np.random.default_rng(0)
+    tracker = HistoricalTracker({'24h': 96, '7d': 672})
+    history = []
+    
+    for timestamp in pd.date_range('2024-03-01', periods=800, freq='15min'):
+        state = {
+            'total_consumption': rng.uniform(10, 100),
+            'occupancy': int(rng.integers(0, 200)),
+            'indoor_temp': rng.uniform(18, 26),
+            'hvac_power': rng.uniform(0, 50)
+        }
+        tracker.add_datapoint(timestamp, state)
+        history = (history + [{'timestamp': timestamp, 'consumption': state['total_consumption'],
+                               'occupancy': state['occupancy'], 'hvac_power': state['hvac_power']}])[-672:]
+        
+        if timestamp.minute == 0:
+            for window, size in tracker.windows.items():
+                got = tracker.get_hourly_average(timestamp.hour, window)
+                expected = _reference_average(history[-size:], timestamp.hour)
+                for key in expected:
+                    assert abs(got[key] - expected[key]) < 1e-9
+    
+    assert len(tracker) == 96 and len(tracker.history) == 96
+    assert tracker.history[-1]['timestamp'] == timestamp
+
+
+def test_defaults_until_enough_history():
+    tracker = HistoricalTracker()
+    tracker.add_datapoint('2024-03-01 08:00', {'total_consumption': 10, 'occupancy': 5,
+                                               'indoor_temp': 21, 'hvac_power': 3})
+    assert tracker.get_hourly_average(8) == {'avg_consumption': 50, 'avg_occupancy': 50, 'avg_hvac_power': 50}
+
+
+def _frame(days=9):
+    rng = np.random.default_rng(1)
+    timestamps = pd.date_range('2024-03-01', periods=days * 96, freq='15min')
+    frames = []
+    for zone_id in ('library', 'engineering'):
+        frames.append(pd.DataFrame({
+            'timestamp': timestamps.astype(str),
+            'zone_id': zone_id,
+            'total_consumption': rng.uniform(10, 100, len(timestamps)),
+            'occupancy': rng.integers(0, 200, len(timestamps)),
+            'indoor_temp': rng.uniform(18, 26, len(timestamps)),
+            'hvac_power': rng.uniform(0, 50, len(timestamps)),
+            'solar_used': rng.uniform(0, 20, len(timestamps))
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_from_frame_matches_incremental_and_round_trips(tmp_path):
+    from utils.hist_tracker import save_trackers, load_trackers
+    
+    frame = _frame()
+    windows = {'24h': 96, '7d': 672}
+    trackers = HistoricalTracker.from_frame(frame, windows)
+    assert set(trackers) == {'library', 'engineering'}
+    
+    incremental = HistoricalTracker(windows)
+    for _, row in frame[frame['zone_id'] == 'engineering'].iterrows():
+        incremental.add_datapoint(pd.Timestamp(row['timestamp']), row.to_dict())
+    
+    path = tmp_path / 'baselines.npz'
+    save_trackers(trackers, path)
+    loaded = load_trackers(path)
+    
+    for tracker in (trackers['engineering'], loaded['engineering']):
+        for window in windows:
+            for hour in (0, 9, 17):
+                got = tracker.get_hourly_average(hour, window)
+                expected = incremental.get_hourly_average(hour, window)
+                for key in expected:
+                    assert abs(got[key] - expected[key]) < 1e-9
+    assert loaded['library'].history[-1] == trackers['library'].history[-1]
+
+
+if __name__ == "__main__":
+    test_matches_reference_over_rolling_window()
+    test_defaults_until_enough_history()
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        test_from_frame_matches_incremental_and_round_trips(pathlib.Path(tmp))
+    print("Historical tracker checks passed")
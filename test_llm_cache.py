@@ -0,0 +1,55 @@
+# test_llm_cache.py
+"""
+Checks for the persistent agent response cache
+"""
+import time
+from utils.llm_cache import LLMResponseCache
+
+
+def test_hit_miss_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = LLMResponseCache(path)
+    key = cache.key('mistral', 'system', 'Indoor: 22.1°C', {'temperature': 0.7})
+    
+    assert cache.get(key) is None
+    cache.put(key, '{"ok": true}')
+    assert cache.get(key) == '{"ok": true}'
+    assert cache.key('mistral', 'system', 'Indoor: 22.1°C', {'temperature': 0.2}) != key
+    cache.close()
+    
+    reopened = LLMResponseCache(path)
+    assert reopened.get(key) == '{"ok": true}'
+    assert reopened.stats()['hits'] == 1 and reopened.stats()['entries'] == 1
+
+
+def test_lru_and_size_eviction():
+    cache = LLMResponseCache(':memory:', max_entries=3)
+    for i in range(3):
+        cache.put(f'k{i}', 'x')
+        time.sleep(0.01)
+    cache.get('k0')  # k0 becomes most recently used
+    cache.put('k3', 'x')
+    
+    assert cache.get('k1') is None
+    assert cache.get('k0') == 'x'
+    assert cache.stats()['evictions'] == 1
+    
+    sized = LLMResponseCache(':memory:', max_bytes=10)
+    sized.put('a', '12345')
+    time.sleep(0.01)
+    sized.put('b', '1234567')
+    assert sized.get('a') is None and sized.get('b') == '1234567'
+
+
+def test_ttl_expiry():
+    cache = LLMResponseCache(':memory:', ttl=0.05)
+    cache.put('k', 'v')
+    assert cache.get('k') == 'v'
+    time.sleep(0.1)
+    assert cache.get('k') is None
+
+
+def test_quantized_keys_share_entries():
+    cache = LLMResponseCache(':memory:', quantize=0)
+    assert cache.key('m', 's', 'Indoor: 22.14°C', {}) == cache.key('m', 's', 'Indoor: 21.9°C', {})
+    assert cache.key('m', 's', 'Indoor: 22.14°C', {}) != cache.key('m', 's', 'Indoor: 23.6°C', {})
@@ -0,0 +1,108 @@
+# test_llm_scheduler.py
+"""
+Checks for the model-request scheduler: priority order and coalescing
+"""
+import sys
+import threading
+import time
+import pytest
+from utils.llm_scheduler import PRIORITY_ADVISORY, PRIORITY_CRITICAL, LLMScheduler
+
+URL = "http://model-server/api/generate"
+
+
+def _start(fn, *args):
+    thread = threading.Thread(target=fn, args=args)
+    thread.start()
+    return thread
+
+
+def test_waiting_requests_are_served_by_priority():
+    scheduler = LLMScheduler(concurrency=1)
+    order = []
+    holding, release = threading.Event(), threading.Event()
+    
+    def hold():
+        with scheduler.slot(URL, PRIORITY_ADVISORY):
+            holding.set()
+            release.wait()
+    
+    def request(name, priority):
+        with scheduler.slot(URL, priority):
+            order.append(name)
+    
+    threads = [_start(hold)]
+    holding.wait()
+    for name, priority in [('advice 1', PRIORITY_ADVISORY), ('advice 2', PRIORITY_ADVISORY),
+                           ('anomaly', PRIORITY_CRITICAL)]:
+        threads.append(_start(request, name, priority))
+        while scheduler._slots[URL].peak_waiting < len(threads) - 1:
+            time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    
+    assert order == ['anomaly', 'advice 1', 'advice 2']
+    summary = scheduler.summary()
+    assert summary['peak_waiting'] == 3
+    assert summary['priorities'][PRIORITY_ADVISORY]['requests'] == 3
+    assert summary['priorities'][PRIORITY_CRITICAL]['max_wait_s'] > 0
+
+
+def test_identical_in_flight_requests_are_sent_once():
+    scheduler = LLMScheduler()
+    sent, results = [], []
+    started, finish = threading.Event(), threading.Event()
+    key = scheduler.key(URL, {'prompt': 'campus solar'}, ('recommendation',))
+    
+    def generate():
+        sent.append(1)
+        started.set()
+        finish.wait()
+        return 'reply'
+    
+    leader = _start(lambda: results.append(scheduler.run(key, generate)))
+    started.wait()
+    followers = [_start(lambda: results.append(scheduler.run(key, generate))) for _ in range(3)]
+    while scheduler.coalesced < 3:
+        time.sleep(0.001)
+    finish.set()
+    for thread in [leader, *followers]:
+        thread.join()
+    
+    assert len(sent) == 1
+    assert sorted(results) == [('reply', False)] * 3 + [('reply', True)]
+    assert scheduler.run(key, lambda: 'again') == ('again', True)   # nothing in flight any more
+    assert key != scheduler.key(URL, {'prompt': 'campus solar'})
+
+
+def test_leader_errors_reach_every_caller():
+    scheduler = LLMScheduler()
+    started, finish = threading.Event(), threading.Event()
+    errors = []
+    
+    def fail():
+        started.set()
+        finish.wait()
+        raise ConnectionError("model server down")
+    
+    def call():
+        try:
+            scheduler.run('k', fail)
+        except ConnectionError as e:
+            errors.append(e)
+    
+    threads = [_start(call)]
+    started.wait()
+    threads.append(_start(call))
+    while scheduler.coalesced < 1:
+        time.sleep(0.001)
+    finish.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2
+    assert not scheduler._inflight
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
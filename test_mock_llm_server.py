@@ -0,0 +1,85 @@
+# test_mock_llm_server.py
+"""
+Checks for the mock model server: schema-valid replies, streaming and fault injection
+"""
+import json
+import random
+import sys
+import threading
+import time
+import pytest
+import requests
+from mock_llm_server import MALFORMED_KINDS, MockLLMServer, latency_sampler, malform, role_reply
+
+BATCH_PROMPT = ("You are Sherlock, the Anomaly Detection Agent\nBATCH MODE: ...\n"
+                "Zones (2):\nzone_id | temp\nlibrary | 21.0\nadmin | 22.5\n")
+
+
+def test_replies_pass_agent_schemas():
+    from agents import results
+    schemas = {'anomaly': results.AnomalyReport, 'explanation': results.Explanation,
+               'orchestrator': results.Decision, 'comfort': results.ComfortAssessment,
+               'grid': results.GridPlan, 'solar': results.SolarAdvice}
+    rng = random.Random(0)
+    for role, schema in schemas.items():
+        for _ in range(20):
+            answer = role_reply(role, rng, anomaly_rate=0.5)
+            assert schema.parse(answer)[1] == {}
+            broken = [schema.parse(malform(role_reply(role, rng), role, kind))[1] for kind in MALFORMED_KINDS]
+            assert all(broken), (role, broken)
+
+
+def test_generate_streamed_and_batched():
+    with MockLLMServer(latency=0.0, seed=1) as mock:
+        reply = requests.post(mock.url, json={'model': 'm', 'prompt': BATCH_PROMPT, 'stream': False}).json()
+        assert set(json.loads(reply['response'])) == {'library', 'admin'}
+        assert reply['done'] and reply['eval_count'] > 0
+        
+        with requests.post(mock.url, json={'model': 'm', 'prompt': 'Solar Prophet Agent'}, stream=True) as response:
+            chunks = [json.loads(line) for line in response.iter_lines() if line]
+        assert len(chunks) > 2 and chunks[-1]['done'] and not chunks[0]['done']
+        assert json.loads(''.join(chunk['response'] for chunk in chunks))['recommendation']
+        
+        stats = requests.get(mock.url.replace('generate', 'stats')).json()
+    assert stats['served'] == 2 and stats['by_role'] == {'anomaly': 1, 'solar': 1}
+
+
+def test_busy_server_rejects_past_the_queue():
+    with MockLLMServer(latency=0.3, parallel=1, max_queue=1) as mock:
+        statuses = []
+        
+        def post():
+            statuses.append(requests.post(mock.url, json={'prompt': 'Grid Oracle', 'stream': False}).status_code)
+        threads = [threading.Thread(target=post) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        stats = mock.stats()
+    assert sorted(statuses) == [200, 200, 503]
+    assert stats['peak_active'] == 1 and stats['rejected'] == 1
+
+
+def test_injected_timeouts_hang_until_the_client_gives_up():
+    with MockLLMServer(latency=0.0, timeout_rate=1.0) as mock:
+        started = time.perf_counter()
+        with pytest.raises(requests.exceptions.Timeout):
+            requests.post(mock.url, json={'prompt': 'Grid Oracle'}, timeout=0.3)
+        assert time.perf_counter() - started < 2
+        time.sleep(0.2)     # the handler notices the disconnect and frees its slot
+        assert mock.stats()['timeouts'] == 1 and mock.stats()['active'] == 0
+
+
+def test_latency_distributions():
+    rng = random.Random(0)
+    assert latency_sampler(0.2)(rng) == latency_sampler('0.2')(rng) == 0.2
+    assert all(0.1 <= latency_sampler('uniform:0.1,0.3')(rng) <= 0.3 for _ in range(100))
+    samples = sorted(latency_sampler('lognormal:0.2,0.5')(rng) for _ in range(1001))
+    assert 0.17 < samples[500] < 0.23
+    with pytest.raises(ValueError):
+        latency_sampler('gamma:1,2')
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,61 @@
+# test_profiling.py
+"""
+Checks for the phase profiler
+"""
+import json
+import sys
+import time
+import pytest
+from utils.profiling import Profiler, profile_path
+
+
+def test_nested_phases_and_counters():
+    profiler = Profiler('test')
+    for _ in range(3):
+        with profiler.phase('outer'):
+            profiler.count('rows', 10)
+            with profiler.phase('inner'):
+                time.sleep(0.01)
+                profiler.count('steps')
+    
+    report = profiler.report()
+    outer, inner = report['phases']['outer'], report['phases']['outer/inner']
+    assert outer['calls'] == inner['calls'] == 3
+    assert outer['wall_seconds'] >= inner['wall_seconds'] >= 0.03
+    assert outer['counters'] == {'rows': 30} and inner['counters'] == {'steps': 3}
+    assert report['counters'] == {'rows': 30, 'steps': 3}
+    assert inner['rates_per_second']['steps'] > 0
+    assert profile_path('out/data.parquet') == 'out/data.profile.json'
+
+
+def test_disabled_profiler_is_a_no_op(tmp_path):
+    profiler = Profiler.create(False)
+    with profiler.phase('work'):
+        profiler.count('rows', 5)
+    
+    assert profiler.phases == {} and profiler.counters == {}
+    assert profiler.write(tmp_path / 'profile.json') is None
+    assert not (tmp_path / 'profile.json').exists()
+    assert Profiler.create(profiler) is profiler
+
+
+def test_memory_and_function_capture(tmp_path):
+    profiler = Profiler('test', cprofile=True, tracemalloc=True, top_functions=5)
+    with profiler.phase('allocate'):
+        with profiler.phase('inner'):
+            block = [bytes(1024) for _ in range(2000)]
+        del block
+        sorted(range(1000), key=lambda x: -x)
+    
+    path = profiler.write(tmp_path / 'profile.json')
+    report = json.loads(path.read_text())
+    allocate = report['phases']['allocate']
+    # the inner phase's peak is carried into its parent
+    assert allocate['memory_peak_mb'] >= 1.9
+    assert 'memory_peak_mb' not in report['phases']['allocate/inner']
+    assert 0 < len(allocate['top_functions']) <= 5
+    assert any('sorted' in entry['function'] for entry in allocate['top_functions'])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
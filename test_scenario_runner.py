@@ -0,0 +1,48 @@
+# test_scenario_runner.py
+"""
+Checks for the Monte Carlo scenario runner
+"""
+from datetime import datetime
+import numpy as np
+from building_zones import MultiZoneUniversity
+from zone_data_generator import ZoneDataGenerator
+from scenario_runner import forecast_matrix, make_scenarios, run_scenarios, ScenarioStats, METRICS
+
+
+def _forecast(days=1):
+    data = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=days, seed=7).generate_dataset()
+    return forecast_matrix(data, MultiZoneUniversity().get_zone_ids())
+
+
+def test_pool_results_match_in_process_run():
+    forecast = _forecast()
+    scenarios = make_scenarios(6, seed=1)
+    
+    local = sorted(run_scenarios(forecast, scenarios, workers=0), key=lambda r: r['scenario'])
+    pooled = sorted(run_scenarios(forecast, scenarios, workers=2, batch_size=2), key=lambda r: r['scenario'])
+    
+    assert local == pooled
+    assert len({r['seed'] for r in local}) == 6
+    assert {r['policy'] for r in local} == {'occupancy', 'fixed', 'setback'}
+
+
+def test_streaming_stats_match_batch_statistics():
+    results = list(run_scenarios(_forecast(), make_scenarios(5, seed=2), workers=0))
+    stats = ScenarioStats()
+    for result in results:
+        stats.add(result)
+    
+    running = stats.running()
+    for metric in METRICS:
+        values = np.array([r[metric] for r in results], dtype=float)
+        assert np.isclose(running[metric][0], values.mean())
+        assert np.isclose(running[metric][1], values.std(ddof=1))
+    
+    summary = stats.summary(by=None)
+    assert set(summary['metric']) == set(METRICS) and (summary['scenarios'] == 5).all()
+
+
+if __name__ == "__main__":
+    test_pool_results_match_in_process_run()
+    test_streaming_stats_match_batch_statistics()
+    print("Scenario runner checks passed")
@@ -0,0 +1,71 @@
+# test_simulate_streaming.py
+"""
+Streaming output and checkpoint/resume for simulate_building_physics
+"""
+import json
+import sys
+import pandas as pd
+import pytest
+import simulate_building_data
+from zone_data_generator import ZoneDataGenerator
+from datetime import datetime
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['simulate_building_data.py'])
+    ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=2, seed=3).save('zone_forecast_data.csv')
+    return tmp_path
+
+
+def test_streamed_batches_match_summary(workdir):
+    summary = simulate_building_data.simulate_building_physics(days=2, output_file='sim.csv', batch_rows=100)
+    data = pd.read_csv('sim.csv')
+    
+    assert summary['records'] == len(data) == 2 * 96 * 8
+    assert abs(summary['total_energy'] - data['total_consumption'].sum() * 0.25) < 1e-6
+    assert abs(summary['total_cost'] - (data['grid_used'] * data['electricity_price']).sum() * 0.25) < 1e-6
+    assert not (workdir / 'sim.csv.parts').exists()
+
+
+def test_resume_after_interruption(workdir, monkeypatch):
+    simulate_building_data.simulate_building_physics(days=2, output_file='full.csv', batch_rows=200)
+    
+    save = simulate_building_data._save_checkpoint
+    calls = []
+    def interrupted(path, state):
+        save(path, state)
+        calls.append(state)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(simulate_building_data, '_save_checkpoint', interrupted)
+    
+    with pytest.raises(KeyboardInterrupt):
+        simulate_building_data.simulate_building_physics(days=2, output_file='sim.csv', batch_rows=200,
+                                                         checkpoint=True)
+    assert (workdir / 'sim.csv.checkpoint.json').exists()
+    
+    monkeypatch.setattr(simulate_building_data, '_save_checkpoint', save)
+    summary = simulate_building_data.simulate_building_physics(days=2, output_file='sim.csv', batch_rows=200,
+                                                               checkpoint=True)
+    
+    assert pd.read_csv('sim.csv').equals(pd.read_csv('full.csv'))
+    assert summary['records'] == 2 * 96 * 8
+    assert not (workdir / 'sim.csv.checkpoint.json').exists()
+
+
+
+def test_profile_report_is_written(workdir):
+    summary = simulate_building_data.simulate_building_physics(days=2, output_file='sim.csv', batch_rows=200,
+                                                               profile=True)
+    report = json.loads((workdir / 'sim.profile.json').read_text())
+    
+    assert summary['profile_file'] == 'sim.profile.json'
+    assert {'setup', 'physics', 'write'} <= set(report['phases'])
+    assert report['counters']['rows'] == summary['records']
+    assert report['phases']['physics']['counters']['zone_steps'] == 2 * 96 * 8
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
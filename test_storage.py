@@ -0,0 +1,69 @@
+# test_storage.py
+"""
+Round-trip and filtering checks for the columnar storage layer
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from utils.storage import TableWriter, write_table, read_table, resolve_path
+
+
+def _records(days=2):
+    timestamps = pd.date_range('2024-03-15', periods=days * 96, freq='15min')
+    zones = ['engineering', 'library']
+    return pd.DataFrame({
+        'timestamp': np.repeat(timestamps, len(zones)),
+        'zone_id': np.tile(zones, len(timestamps)),
+        'zone_name': np.tile(['Engineering Building', 'Main Library'], len(timestamps)),
+        'indoor_temp': np.linspace(18, 26, len(timestamps) * len(zones)),
+        'occupancy': np.arange(len(timestamps) * len(zones)),
+        'electricity_price': 0.15
+    })
+
+
+@pytest.mark.parametrize('ext', ['.parquet', '.csv'])
+def test_round_trip_types_and_filters(tmp_path, ext):
+    if ext == '.parquet':
+        pytest.importorskip('pyarrow')
+    frame = _records()
+    path = write_table(frame, str(tmp_path / f'sim{ext}'))
+    
+    loaded = read_table(path)
+    assert pd.api.types.is_datetime64_any_dtype(loaded['timestamp'])
+    assert isinstance(loaded['zone_id'].dtype, pd.CategoricalDtype)
+    assert loaded['indoor_temp'].dtype == np.float32
+    assert loaded['electricity_price'].dtype == np.float64
+    assert np.allclose(loaded['indoor_temp'], frame['indoor_temp'], atol=1e-5)
+    
+    subset = read_table(path, columns=['timestamp', 'indoor_temp'],
+                        start='2024-03-16', end='2024-03-16 06:00', zones=['library'])
+    assert list(subset.columns) == ['timestamp', 'indoor_temp']
+    assert len(subset) == 24
+    assert subset['timestamp'].min() == pd.Timestamp('2024-03-16')
+
+
+def test_csv_fallback_for_missing_parquet(tmp_path):
+    write_table(_records(), str(tmp_path / 'sim.csv'))
+    assert resolve_path(str(tmp_path / 'sim.parquet')).endswith('sim.csv')
+    assert len(read_table(str(tmp_path / 'sim.parquet'), zones=['engineering'])) == 192
+    with pytest.raises(FileNotFoundError):
+        read_table(str(tmp_path / 'missing.parquet'))
+
+
+def test_writer_without_rows_writes_nothing(tmp_path):
+    for name in ('sim.parquet', 'sim.csv'):
+        writer = TableWriter(str(tmp_path / name))
+        assert writer.close() is None
+    assert list(tmp_path.iterdir()) == []
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    for ext in ('.parquet', '.csv'):
+        with tempfile.TemporaryDirectory() as tmp:
+            test_round_trip_types_and_filters(pathlib.Path(tmp), ext)
+    with tempfile.TemporaryDirectory() as tmp:
+        test_csv_fallback_for_missing_parquet(pathlib.Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_writer_without_rows_writes_nothing(pathlib.Path(tmp))
+    print("Storage checks passed")
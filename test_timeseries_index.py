@@ -0,0 +1,66 @@
+# test_timeseries_index.py
+"""
+Checks that indexed lookups match the boolean-mask scans they replace,
+and that the optimizer forecast built on them starts at the current record
+"""
+import numpy as np
+import pandas as pd
+from utils.timeseries_index import ZoneTimeIndex
+
+
+def _records():
+    timestamps = pd.date_range('2024-03-15', periods=96, freq='15min')
+    frame = pd.DataFrame({
+        'timestamp': np.tile(timestamps, 3),
+        'zone_id': np.repeat(['library', 'engineering', 'dormitory'], len(timestamps)),
+        'total_consumption': np.arange(3 * len(timestamps), dtype=float)
+    })
+    return frame.sample(frac=1.0, random_state=0)  # index must not rely on input order
+
+
+def test_lookups_match_boolean_scans():
+    frame = _records().sort_values('timestamp', kind='stable')
+    index = ZoneTimeIndex(frame)
+    
+    for timestamp in frame['timestamp'].unique()[::7]:
+        for zone_id in ('library', 'engineering'):
+            mask = (frame['timestamp'] == timestamp) & (frame['zone_id'] == zone_id)
+            assert index.row(zone_id, timestamp)['total_consumption'] == frame[mask].iloc[0]['total_consumption']
+            
+            future = frame[(frame['timestamp'] > timestamp) & (frame['zone_id'] == zone_id)].head(16)
+            assert index.after(zone_id, timestamp)['total_consumption'].tolist() == future['total_consumption'].tolist()
+        
+        assert index.at(timestamp, ['dormitory', 'library'])['zone_id'].tolist() == ['dormitory', 'library']
+
+
+def test_missing_keys():
+    index = ZoneTimeIndex(_records())
+    assert index.row('library', '2024-03-15 00:07') is None
+    assert index.row('gym', '2024-03-15 00:00') is None
+    assert len(index.after('library', '2024-03-15 23:45')) == 0
+    assert len(index.at('2030-01-01')) == 0
+
+
+def test_optimizer_forecast_starts_at_the_current_record():
+    from main_multizone import forecast_arrays
+    
+    frame = _records().sort_values(['zone_id', 'timestamp'])
+    for column in ('occupancy', 'outdoor_temp', 'electricity_price', 'grid_carbon_intensity', 'solar_forecast'):
+        frame[column] = frame['total_consumption']
+    index = ZoneTimeIndex(frame)
+    timestamp = pd.Timestamp('2024-03-15 06:00')
+    rows = {zone_id: index.row(zone_id, timestamp) for zone_id in ('library', 'dormitory')}
+    
+    forecast = forecast_arrays(index, timestamp, rows)
+    assert forecast['occupancy'].shape == (16, 2)
+    assert forecast['occupancy'][:, 1].tolist() == frame[(frame['zone_id'] == 'dormitory') &
+                                                         (frame['timestamp'] >= timestamp)]['occupancy'].head(16).tolist()
+    assert forecast['price'][0] == rows['library']['electricity_price']
+    assert len(forecast_arrays(index, pd.Timestamp('2024-03-15 23:45'), {
+        'library': index.row('library', '2024-03-15 23:45')})['solar']) == 1
+
+
+if __name__ == "__main__":
+    test_lookups_match_boolean_scans()
+    test_missing_keys()
+    print("Timeseries index checks passed")
@@ -0,0 +1,43 @@
+# test_zone_data_generator.py
+"""
+Checks for the batch ZoneDataGenerator
+"""
+import numpy as np
+from datetime import datetime
+from zone_data_generator import ZoneDataGenerator
+
+
+def test_seeded_generation_is_reproducible():
+    first = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=7, seed=42).generate_dataset()
+    second = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=7, seed=42).generate_dataset()
+    other = ZoneDataGenerator(datetime(2024, 3, 15, 8, 0), days=7).generate_dataset(np.random.default_rng(7))
+    
+    assert first.equals(second)
+    assert not first.equals(other)
+    assert len(first) == 7 * 24 * 4
+
+
+def test_profiles_follow_time_of_day():
+    data = ZoneDataGenerator(datetime(2024, 3, 15, 0, 0), days=14, seed=1).generate_dataset()
+    hour = data['timestamp'].dt.hour
+    weekday = data['timestamp'].dt.weekday < 5
+    
+    # No solar at night, prices within tariff bands
+    assert (data.loc[(hour < 6) | (hour > 18), 'solar_forecast'] == 0).all()
+    assert data['electricity_price'].between(0.08, 0.35).all()
+    
+    # Dorms full at night, mostly empty during class hours
+    dorms = data['dorms_east_occupancy']
+    assert dorms[(hour <= 5) & weekday].min() >= int(120 * 0.7)
+    assert dorms[(hour >= 9) & (hour <= 16) & weekday].max() <= int(120 * 0.3)
+    
+    # Lunch rush in the cafeteria
+    assert data.loc[(hour == 12) & weekday, 'cafeteria_occupancy'].min() >= int(250 * 0.7)
+    for zone_id, capacity in ZoneDataGenerator.ZONE_CAPACITIES.items():
+        assert data[f'{zone_id}_occupancy'].between(0, capacity).all()
+
+
+if __name__ == "__main__":
+    test_seeded_generation_is_reproducible()
+    test_profiles_follow_time_of_day()
+    print("✅ Zone data generator tests passed")
@@ -0,0 +1,171 @@
+# utils/agent_metrics.py
+"""
+Per-call instrumentation for agent LLM requests
+
+OllamaBaseAgent records one "call" event per think()/athink() (latency,
+time queued for a model-server slot, prompt/completion tokens, retries,
+timeouts, errors, cache hits, replies shared with an identical in-flight
+request) and one "parse" event per typed result or batch (replies that
+failed validation, follow-up asks, fallbacks). Events
+are tagged with the agent name plus any tags in effect (zone, timepoint),
+kept in memory for summary() and optionally appended to a JSON-lines file
+as they happen.
+
+Tags live in a context variable. Thread pools don't carry it, so wrap
+submitted functions with tagged(fn, zone=...) to keep their tags.
+"""
+import contextlib
+import contextvars
+import json
+import threading
+import time
+import numpy as np
+
+_tags = contextvars.ContextVar('agent_metric_tags', default={})
+
+PERCENTILES = (50, 95, 99)
+
+
+@contextlib.contextmanager
+def metric_tags(**tags):
+    """Tag every event recorded in this block (nested tags are merged)"""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def tagged(fn, **tags):
+    """fn wrapped to run with the current tags plus these (for thread pools)"""
+    merged = {**_tags.get(), **tags}
+    
+    def run(*args, **kwargs):
+        token = _tags.set(merged)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _tags.reset(token)
+    return run
+
+
+def _percentiles(values, prefix):
+    if not values:
+        return {f'{prefix}_p{p}': None for p in PERCENTILES}
+    points = np.percentile(np.asarray(values, dtype=float), PERCENTILES)
+    return {f'{prefix}_p{p}': round(float(value), 4) for p, value in zip(PERCENTILES, points)}
+
+
+class AgentMetrics:
+    def __init__(self, path=None, keep_events=True):
+        """
+        path: JSON-lines file events are appended to as they are recorded
+        keep_events: also keep them in memory for summary() and export()
+        """
+        self.path = path
+        self.keep_events = keep_events
+        self.events = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8', buffering=1) if path else None
+    
+    def record(self, agent, event='call', **fields):
+        """Add one event; the current tags are merged in"""
+        entry = {'time': round(time.time(), 3), 'agent': agent, 'event': event, **_tags.get(), **fields}
+        with self._lock:
+            if self.keep_events:
+                self.events.append(entry)
+            if self._file is not None:
+                self._file.write(json.dumps(entry, default=str) + '\n')
+        return entry
+    
+    def export(self, path):
+        """Write the in-memory events as JSON lines; returns the path"""
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in events:
+                f.write(json.dumps(entry, default=str) + '\n')
+        return path
+    
+    def reset(self):
+        with self._lock:
+            self.events = []
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    def summary(self, by='agent'):
+        """
+        {group: stats} over the recorded events, grouped by an event field
+        (agent by default) plus an 'all' group
+        
+        Latency and queue-wait percentiles cover calls that reached the
+        model (cache hits and coalesced calls are counted separately).
+        Streams stopped early never receive the server's prompt count:
+        prompt_tokens sums the calls that have one (prompt_counted of them)
+        and prompt_tokens_mean averages those.
+        """
+        with self._lock:
+            events = list(self.events)
+        groups = {}
+        for entry in events:
+            groups.setdefault(entry.get(by), []).append(entry)
+        stats = {group: self._stats(entries) for group, entries in sorted(groups.items(), key=lambda g: str(g[0]))}
+        stats['all'] = self._stats(events)
+        return stats
+    
+    @staticmethod
+    def _stats(events):
+        calls = [e for e in events if e['event'] == 'call']
+        served = [e for e in calls if not e.get('cached') and not e.get('coalesced')]
+        parses = [e for e in events if e['event'] == 'parse']
+        
+        def total(entries, field):
+            return sum(e.get(field) or 0 for e in entries)
+        
+        counted = [e['prompt_tokens'] for e in served if e.get('prompt_tokens') is not None]
+        stats = {
+            'calls': len(calls),
+            'served': len(served),
+            'cache_hits': sum(1 for e in calls if e.get('cached')),
+            'coalesced': sum(1 for e in calls if e.get('coalesced')),
+            'errors': sum(1 for e in calls if e.get('error')),
+            'retries': total(calls, 'retries'),
+            'timeouts': total(calls, 'timeouts'),
+            'prompt_tokens': sum(counted),
+            'prompt_counted': len(counted),
+            'prompt_tokens_mean': round(float(np.mean(counted)), 1) if counted else None,
+            'completion_tokens': total(served, 'completion_tokens'),
+            'latency_mean': round(float(np.mean([e['latency_s'] for e in served])), 4) if served else None,
+        }
+        stats.update(_percentiles([e['latency_s'] for e in served], 'latency'))
+        stats.update(_percentiles([e.get('queue_wait_s') or 0.0 for e in served], 'queue_wait'))
+        stats.update({
+            'results': total(parses, 'results'),
+            'parse_failures': total(parses, 'failed'),
+            'reasks': total(parses, 'reasks'),
+            'fallbacks': total(parses, 'fallbacks'),
+        })
+        return stats
+    
+    def format_summary(self, by='agent'):
+        """Summary as printable lines, one per group"""
+        lines = []
+        for group, stats in self.summary(by).items():
+            if not stats['calls'] and not stats['results']:
+                continue
+            latency = "n/a" if stats['latency_p50'] is None else (
+                f"{stats['latency_p50']:.2f}/{stats['latency_p95']:.2f}/{stats['latency_p99']:.2f}s"
+            )
+            lines.append(
+                f"{group}: {stats['calls']} calls ({stats['cache_hits']} cached, {stats['coalesced']} coalesced), "
+                f"p50/p95/p99 {latency}, queue p95 {stats['queue_wait_p95'] or 0:.2f}s, "
+                f"{stats['prompt_tokens']}+{stats['completion_tokens']} tokens "
+                f"(prompt counted on {stats['prompt_counted']}/{stats['served']} calls), "
+                f"{stats['retries']} retries, {stats['timeouts']} timeouts, {stats['errors']} errors, "
+                f"{stats['parse_failures']} parse failures, {stats['fallbacks']} fallbacks"
+            )
+        return lines
@@ -1,30 +1,145 @@
 # utils/historical_tracker.py
+import json
 import pandas as pd
 import numpy as np
 
 class HistoricalTracker:
-    def __init__(self):
-        self.history = []
+    """Hour-of-day baselines over rolling windows, backed by a ring buffer
+    
+    Every window keeps running per-hour sums and counts, so add_datapoint and
+    get_hourly_average are constant time regardless of history length.
+    """
+    
+    FIELDS = ('consumption', 'occupancy', 'indoor_temp', 'hvac_power', 'solar_used')
+    
+    def __init__(self, windows=None):
+        # Window name -> number of 15-min samples (first one is the default)
+        self.windows = dict(windows or {'24h': 96})
+        self.default_window = next(iter(self.windows))
+        self.capacity = max(self.windows.values())
+        
+        # Preallocated ring buffer
+        self._values = np.zeros((self.capacity, len(self.FIELDS)))
+        self._hours = np.zeros(self.capacity, dtype=np.int64)
+        self._timestamps = np.empty(self.capacity, dtype=object)
+        self._count = 0  # samples added so far
+        
+        # Running per-hour sums/counts and window totals
+        self._hour_sums = {name: np.zeros((24, len(self.FIELDS))) for name in self.windows}
+        self._hour_counts = {name: np.zeros(24, dtype=np.int64) for name in self.windows}
+        self._totals = {name: np.zeros(len(self.FIELDS)) for name in self.windows}
+    
+    @classmethod
+    def from_frame(cls, frame, windows=None, by='zone_id'):
+        """
+        Build trackers from simulation records in one grouped pass
+        
+        Returns {zone_id: tracker} when the frame has a `by` column, otherwise
+        a single tracker. Only the most recent samples of the longest window
+        are kept, exactly as if the rows had been added one by one.
+        """
+        frame = frame.sort_values('timestamp', kind='stable')
+        if 'solar_used' in frame:
+            solar = frame['solar_used']
+        else:
+            solar = frame.get('solar_generation', pd.Series(0.0, index=frame.index))
+        columns = pd.DataFrame({
+            'consumption': frame['total_consumption'],
+            'occupancy': frame['occupancy'],
+            'indoor_temp': frame['indoor_temp'],
+            'hvac_power': frame['hvac_power'],
+            'solar_used': solar,
+            'timestamp': pd.to_datetime(frame['timestamp'])
+        })
+        
+        capacity = max((windows or {'24h': 96}).values())
+        if by is None or by not in frame:
+            tracker = cls(windows)
+            tracker._bulk_load(columns.tail(capacity))
+            return tracker
+        
+        columns[by] = frame[by]
+        recent = columns.groupby(by, sort=False, observed=True).tail(capacity)
+        trackers = {}
+        for key, group in recent.groupby(by, sort=False, observed=True):
+            trackers[key] = cls(windows)
+            trackers[key]._bulk_load(group)
+        return trackers
+    
+    def _bulk_load(self, columns):
+        """Replace the buffer with up to `capacity` rows (oldest first) and rebuild the sums"""
+        values = columns[list(self.FIELDS)].to_numpy(dtype=float)[-self.capacity:]
+        timestamps = pd.DatetimeIndex(columns['timestamp'])[-self.capacity:]
+        hours = np.asarray(timestamps.hour, dtype=np.int64)
+        count = len(values)
+        
+        self._values[:count] = values
+        self._hours[:count] = hours
+        self._timestamps[:count] = list(timestamps)
+        self._count = count
+        
+        for name, size in self.windows.items():
+            tail_values, tail_hours = values[-size:], hours[-size:]
+            self._hour_counts[name] = np.bincount(tail_hours, minlength=24).astype(np.int64)
+            sums = np.zeros((24, len(self.FIELDS)))
+            np.add.at(sums, tail_hours, tail_values)
+            self._hour_sums[name] = sums
+            self._totals[name] = tail_values.sum(axis=0)
+    
+    def _ordered(self):
+        """Buffered samples as (values, timestamps), oldest first"""
+        size = min(self._count, self.capacity)
+        slots = np.arange(self._count - size, self._count) % self.capacity
+        return self._values[slots], pd.DatetimeIndex(list(self._timestamps[slots]))
+    
+    def __len__(self):
+        return min(self._count, self.windows[self.default_window])
         
     def add_datapoint(self, timestamp, building_state):
         """Add a data point to history"""
-        self.history.append({
-            'timestamp': timestamp,
-            'consumption': building_state['total_consumption'],
-            'occupancy': building_state['occupancy'],
-            'indoor_temp': building_state['indoor_temp'],
-            'hvac_power': building_state['hvac_power'],
-            'solar_used': building_state.get('solar_used', building_state.get('solar_generation', 0))
-        })
+        values = np.array([
+            building_state['total_consumption'],
+            building_state['occupancy'],
+            building_state['indoor_temp'],
+            building_state['hvac_power'],
+            building_state.get('solar_used', building_state.get('solar_generation', 0))
+        ], dtype=float)
+        hour = timestamp.hour if hasattr(timestamp, 'hour') else pd.Timestamp(timestamp).hour
         
-        # Keep only last 96 records (24 hours at 15-min intervals)
-        if len(self.history) > 96:
-            self.history = self.history[-96:]
+        # Drop the samples that fall out of each window
+        for name, size in self.windows.items():
+            if self._count >= size:
+                old = (self._count - size) % self.capacity
+                old_hour = self._hours[old]
+                self._hour_sums[name][old_hour] -= self._values[old]
+                self._hour_counts[name][old_hour] -= 1
+                self._totals[name] -= self._values[old]
+    
+        slot = self._count % self.capacity
+        self._values[slot] = values
+        self._hours[slot] = hour
+        self._timestamps[slot] = timestamp
+        self._count += 1
+        
+        for name in self.windows:
+            self._hour_sums[name][hour] += values
+            self._hour_counts[name][hour] += 1
+            self._totals[name] += values
+    
+    @property
+    def history(self):
+        """Samples in the default window, oldest first"""
+        size = len(self)
+        slots = [(self._count - size + i) % self.capacity for i in range(size)]
+        return [{'timestamp': self._timestamps[slot],
+                 **dict(zip(self.FIELDS, self._values[slot].tolist()))} for slot in slots]
     
-    def get_hourly_average(self, current_hour):
+    def get_hourly_average(self, current_hour, window=None):
         """Get average values for the same hour from history"""
+        window = window or self.default_window
+        samples = min(self._count, self.windows[window])
         
-        if len(self.history) < 4:
+        if samples < 4:
             # Not enough history, return current as baseline
             return {
                 'avg_consumption': 50,
@@ -32,17 +147,41 @@ class HistoricalTracker:
                 'avg_hvac_power': 50
             }
         
-        df = pd.DataFrame(self.history)
-        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-        
-        # Filter to same hour
-        same_hour = df[df['hour'] == current_hour]
-        
-        if len(same_hour) == 0:
-            same_hour = df  # Fallback to all data
+        # Same hour, falling back to all data in the window
+        count = self._hour_counts[window][current_hour]
+        if count > 0:
+            means = self._hour_sums[window][current_hour] / count
+        else:
+            means = self._totals[window] / samples
         
         return {
-            'avg_consumption': float(same_hour['consumption'].mean()),
-            'avg_occupancy': float(same_hour['occupancy'].mean()),
-            'avg_hvac_power': float(same_hour['hvac_power'].mean())
-        }
\ No newline at end of file
+            'avg_consumption': float(means[0]),
+            'avg_occupancy': float(means[1]),
+            'avg_hvac_power': float(means[3])
+        }
+
+
+def save_trackers(trackers, path):
+    """Write {zone_id: tracker} baselines to a compressed .npz file"""
+    arrays = {}
+    meta = {'fields': list(HistoricalTracker.FIELDS), 'zones': [], 'windows': None}
+    for i, (zone_id, tracker) in enumerate(trackers.items()):
+        values, timestamps = tracker._ordered()
+        arrays[f'values_{i}'] = values
+        arrays[f'timestamps_{i}'] = timestamps.to_numpy(dtype='datetime64[ns]')
+        meta['zones'].append(zone_id)
+        meta['windows'] = tracker.windows
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_trackers(path):
+    """Read baselines written by save_trackers back into {zone_id: tracker}"""
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        trackers = {}
+        for i, zone_id in enumerate(meta['zones']):
+            columns = pd.DataFrame(data[f'values_{i}'], columns=meta['fields'])
+            columns['timestamp'] = pd.to_datetime(data[f'timestamps_{i}'])
+            trackers[zone_id] = HistoricalTracker(meta['windows'])
+            trackers[zone_id]._bulk_load(columns)
+    return trackers
\ No newline at end of file
@@ -0,0 +1,77 @@
+# utils/json_stream.py
+"""
+Incremental reader for a JSON object arriving in pieces
+
+Agents stream model output and stop generation once the fields they need
+are complete. The reader tracks string/nesting state as text arrives and,
+each time a top-level member is finished, parses the prefix closed with a
+brace, so `fields` always holds the members received so far.
+"""
+import json
+
+
+class JSONObjectStream:
+    def __init__(self):
+        self.text = ''
+        self.fields = {}
+        self.closed = False     # the top-level object has ended
+        self._pos = 0           # next character to scan
+        self._start = None      # index of the opening brace
+        self._end = None        # index just past the last complete member
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, chunk):
+        """Add text; returns True if a top-level member was completed"""
+        self.text += chunk
+        completed = False
+        for i in range(self._pos, len(self.text)):
+            char = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and self._start is None and char == '{':
+                    self._start = i
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    completed |= self._complete(i)
+                    self.closed = True
+                    self._pos = i + 1
+                    return completed
+            elif char == ',' and self._depth == 1:
+                completed |= self._complete(i)
+        self._pos = len(self.text)
+        return completed
+    
+    def _complete(self, end):
+        try:
+            fields = json.loads(self.text[self._start:end] + '}')
+        except ValueError:
+            return False
+        if not isinstance(fields, dict):
+            return False
+        self.fields = fields
+        self._end = end
+        return True
+    
+    def has(self, required):
+        """True once every required field has a complete value"""
+        return all(field in self.fields for field in required)
+    
+    def result(self):
+        """The object as JSON text: complete if closed, else the members received so far"""
+        if self.closed:
+            return self.text[self._start:self._pos]
+        if self._end is not None:
+            return self.text[self._start:self._end] + '}'
+        return self.text
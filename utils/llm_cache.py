@@ -0,0 +1,142 @@
+# utils/llm_cache.py
+"""
+Persistent, content-addressed cache for agent LLM responses
+
+Entries are keyed on a hash of (model, system prompt, context, options) and
+stored in SQLite, so reruns on the same building data skip the model.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+_NUMBER = re.compile(r'-?\d+\.\d+')
+
+
+class LLMResponseCache:
+    def __init__(self, path='agent_cache.sqlite', max_entries=50000, max_bytes=None,
+                 ttl=7 * 24 * 3600, quantize=None):
+        """
+        path: SQLite file (':memory:' for a throwaway cache)
+        max_entries / max_bytes: least-recently-used entries are evicted past these
+        ttl: seconds an entry stays valid (None = forever)
+        quantize: round decimals in the context to this many places before
+                  hashing, so near-identical states share an entry
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.quantize = quantize
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._db.commit()
+    
+    def _quantize_context(self, context):
+        if self.quantize is None:
+            return context
+        return _NUMBER.sub(lambda m: f"{round(float(m.group()), self.quantize):.{self.quantize}f}", context)
+    
+    def key(self, model, system_prompt, context, options):
+        """Content hash identifying one agent request"""
+        material = json.dumps([model, system_prompt, self._quantize_context(context), options],
+                              sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Cached response text, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0]
+    
+    def put(self, key, response, model=''):
+        """Store a response and evict least-recently-used entries past the limits"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict()
+            self._db.commit()
+    
+    def _evict(self):
+        entries, total_bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        
+        excess = entries - self.max_entries if self.max_entries is not None else 0
+        if excess > 0:
+            self._delete_oldest(excess)
+        
+        if self.max_bytes is not None and total_bytes > self.max_bytes:
+            oldest = self._db.execute("SELECT size FROM responses ORDER BY last_access").fetchall()
+            count = 0
+            for (size,) in oldest:
+                if total_bytes <= self.max_bytes:
+                    break
+                total_bytes -= size
+                count += 1
+            self._delete_oldest(count)
+    
+    def _delete_oldest(self, count):
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+            (count,)
+        )
+        self.evictions += count
+    
+    def stats(self):
+        """Hit/miss counters for this process plus current cache size"""
+        with self._lock:
+            entries, total_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total_bytes
+        }
+    
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,164 @@
+# utils/llm_scheduler.py
+"""
+Priority scheduling and request coalescing in front of the model server
+
+OllamaBaseAgent.think() goes through one shared scheduler when it is
+enabled (OllamaBaseAgent.enable_scheduler()):
+
+- Identical requests in flight at the same time (same server, prompt,
+  options and early-exit fields) are sent once; the other callers wait
+  for that reply instead of queueing their own copy. Per-zone agents whose
+  context is campus-wide (solar, prices) collapse to one call this way.
+- Each model server gets a budget of `concurrency` simultaneous requests.
+  Waiting requests are granted slots by priority (lower first), then in
+  arrival order, so anomaly checks and orchestrator decisions overtake
+  queued advisory calls. A retry queues again behind requests of its
+  priority that arrived meanwhile, so bursts of retries can't monopolize
+  the server.
+"""
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+
+# Agent priorities (OllamaBaseAgent.priority): lower is served first
+PRIORITY_CRITICAL = 0    # anomaly detection, orchestrator decisions
+PRIORITY_ADVISORY = 10   # solar, grid and comfort advice
+
+
+class _PrioritySlots:
+    """Counting semaphore that hands freed slots to the best waiting priority"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.peak_waiting = 0
+        self._waiting = []  # heap of (priority, arrival, event)
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+    
+    def acquire(self, priority):
+        with self._lock:
+            if self.active < self.limit and not self._waiting:
+                self.active += 1
+                return
+            event = threading.Event()
+            heapq.heappush(self._waiting, (priority, next(self._arrivals), event))
+            self.peak_waiting = max(self.peak_waiting, len(self._waiting))
+        event.wait()    # release() hands its slot over
+    
+    def release(self):
+        with self._lock:
+            if self._waiting:
+                _, _, event = heapq.heappop(self._waiting)
+                event.set()
+            else:
+                self.active -= 1
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMScheduler:
+    def __init__(self, concurrency=2, coalesce=True):
+        """
+        concurrency: simultaneous requests per model server
+        coalesce: share one reply between identical in-flight requests
+        """
+        self.concurrency = concurrency
+        self.coalesce = coalesce
+        self._slots = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {}    # priority -> {'requests', 'wait_s', 'max_wait_s'}
+        self.coalesced = 0
+    
+    @staticmethod
+    def key(url, payload, required=()):
+        """Identity of a request: identical keys get identical replies"""
+        material = json.dumps([url, payload, list(required or ())], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    def run(self, key, fn):
+        """
+        (fn(), True) for the first caller of key; (its result, False) for
+        callers arriving while it is still running (fn's exception is
+        raised in every caller)
+        """
+        if not self.coalesce:
+            return fn(), True
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        
+        try:
+            call.result = fn()
+            return call.result, True
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+    
+    def _server(self, url):
+        with self._lock:
+            if url not in self._slots:
+                self._slots[url] = _PrioritySlots(self.concurrency)
+            return self._slots[url]
+    
+    @contextlib.contextmanager
+    def slot(self, url, priority=PRIORITY_ADVISORY):
+        """Hold one of url's request slots (waits by priority)"""
+        slots = self._server(url)
+        queued = time.perf_counter()
+        slots.acquire(priority)
+        wait = time.perf_counter() - queued
+        with self._lock:
+            stats = self._stats.setdefault(priority, {'requests': 0, 'wait_s': 0.0, 'max_wait_s': 0.0})
+            stats['requests'] += 1
+            stats['wait_s'] += wait
+            stats['max_wait_s'] = max(stats['max_wait_s'], wait)
+        try:
+            yield
+        finally:
+            slots.release()
+    
+    def summary(self):
+        """Requests and queue waits per priority, plus coalesced calls"""
+        with self._lock:
+            priorities = {
+                priority: {'requests': stats['requests'],
+                           'mean_wait_s': round(stats['wait_s'] / stats['requests'], 4),
+                           'max_wait_s': round(stats['max_wait_s'], 4)}
+                for priority, stats in sorted(self._stats.items())
+            }
+            peak_waiting = max((slots.peak_waiting for slots in self._slots.values()), default=0)
+            return {'priorities': priorities, 'coalesced': self.coalesced, 'peak_waiting': peak_waiting}
+    
+    def format_summary(self):
+        """Summary as printable lines"""
+        summary = self.summary()
+        lines = [f"priority {priority}: {stats['requests']} requests, wait mean {stats['mean_wait_s']:.2f}s "
+                 f"max {stats['max_wait_s']:.2f}s" for priority, stats in summary['priorities'].items()]
+        lines.append(f"{summary['coalesced']} duplicate requests coalesced, peak queue {summary['peak_waiting']}")
+        return lines
@@ -0,0 +1,230 @@
+# utils/profiling.py
+"""
+Opt-in profiling for the simulation and analysis pipelines
+
+A Profiler times named phases (wall and CPU time, call counts), keeps
+counters such as rows or steps processed, and writes a JSON report that
+can be diffed between runs. Phases nest: a phase entered inside another is
+reported as "outer/inner". Counters bumped inside a phase are credited to
+it too, so the report gives per-phase throughput.
+
+Two heavier captures can be switched on per phase:
+    cprofile: top functions by cumulative time (cProfile)
+    tracemalloc: peak and net Python memory allocated in the phase
+Pass True for every top-level phase or a collection of phase paths.
+
+A disabled profiler (Profiler.create(False)) keeps the same interface and
+costs a few function calls per phase, so pipelines can be instrumented
+unconditionally.
+"""
+import cProfile
+import contextlib
+import datetime
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc as _tracemalloc
+
+
+class _Phase:
+    __slots__ = ('calls', 'wall', 'cpu', 'counters', 'memory_peak', 'memory_delta', 'cprofile')
+    
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.counters = {}
+        self.memory_peak = None
+        self.memory_delta = None
+        self.cprofile = None
+
+
+class Profiler:
+    def __init__(self, name='pipeline', enabled=True, cprofile=False, tracemalloc=False, top_functions=15):
+        """
+        name: label in the report
+        cprofile / tracemalloc: False, True (top-level phases) or phase paths to capture
+        top_functions: functions listed per cProfile'd phase
+        """
+        self.name = name
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.top_functions = top_functions
+        
+        self.phases = {}
+        self.counters = {}
+        self.started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cprofile_active = False
+        self._started_tracing = False
+        if enabled and tracemalloc and not _tracemalloc.is_tracing():
+            _tracemalloc.start()
+            self._started_tracing = True
+    
+    @classmethod
+    def create(cls, profile, name='pipeline'):
+        """Profiler for a `profile` argument: a Profiler, True (new one) or False/None (disabled)"""
+        if isinstance(profile, Profiler):
+            return profile
+        return cls(name, enabled=bool(profile))
+    
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+    
+    @staticmethod
+    def _wants(option, path, depth):
+        if option is True:
+            return depth == 0
+        return bool(option) and path in option
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a block; nested phases are reported as parent/child"""
+        if not self.enabled:
+            yield
+            return
+        
+        stack = self._stack()
+        path = f"{stack[-1][0]}/{name}" if stack else name
+        with self._lock:
+            phase = self.phases.setdefault(path, _Phase())
+        
+        profiler = None
+        if self._wants(self.cprofile, path, len(stack)) and not self._cprofile_active:
+            if phase.cprofile is None:
+                phase.cprofile = cProfile.Profile()
+            profiler = phase.cprofile
+            try:
+                profiler.enable()
+                self._cprofile_active = True
+            except ValueError:    # another profiler (e.g. python -m cProfile) is running
+                profiler = None
+        
+        # memory: [start, peak carried over from nested phases' resets]
+        memory = None
+        if self._wants(self.tracemalloc, path, len(stack)) and _tracemalloc.is_tracing():
+            current, peak = _tracemalloc.get_traced_memory()
+            self._carry_peak(stack, peak)
+            _tracemalloc.reset_peak()
+            memory = [current, current]
+        
+        stack.append((path, phase, memory))
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            stack.pop()
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_active = False
+            with self._lock:
+                phase.calls += 1
+                phase.wall += wall
+                phase.cpu += cpu
+            if memory is not None:
+                current, peak = _tracemalloc.get_traced_memory()
+                peak = max(peak, memory[1])
+                phase.memory_peak = max(phase.memory_peak or 0, peak - memory[0])
+                phase.memory_delta = (phase.memory_delta or 0) + current - memory[0]
+                self._carry_peak(stack, peak)
+                _tracemalloc.reset_peak()
+    
+    @staticmethod
+    def _carry_peak(stack, peak):
+        """Record a traced peak in the enclosing traced phase before the peak is reset"""
+        for _, _, memory in reversed(stack):
+            if memory is not None:
+                memory[1] = max(memory[1], peak)
+                return
+    
+    def count(self, name, n=1):
+        """Add n to a counter (and to the innermost active phase's counter)"""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if stack:
+                counters = stack[-1][1].counters
+                counters[name] = counters.get(name, 0) + n
+    
+    def report(self):
+        """The profile as a JSON-ready dict"""
+        total = time.perf_counter() - self._start
+        phases = {}
+        for path, phase in self.phases.items():
+            entry = {
+                'calls': phase.calls,
+                'wall_seconds': round(phase.wall, 6),
+                'cpu_seconds': round(phase.cpu, 6),
+                'mean_ms': round(phase.wall / max(phase.calls, 1) * 1000, 4),
+                'share': round(phase.wall / total, 4) if total > 0 else None,
+            }
+            if phase.counters:
+                entry['counters'] = dict(phase.counters)
+                entry['rates_per_second'] = {name: round(value / phase.wall, 2)
+                                             for name, value in phase.counters.items() if phase.wall > 0}
+            if phase.memory_peak is not None:
+                entry['memory_peak_mb'] = round(phase.memory_peak / 2**20, 3)
+                entry['memory_delta_mb'] = round(phase.memory_delta / 2**20, 3)
+            if phase.cprofile is not None:
+                entry['top_functions'] = self._top_functions(phase.cprofile)
+            phases[path] = entry
+        
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_seconds': round(total, 6),
+            'phases': phases,
+            'counters': dict(self.counters),
+            'rates_per_second': {name: round(value / total, 2) for name, value in self.counters.items() if total > 0}
+        }
+    
+    def _top_functions(self, profiler):
+        stats = pstats.Stats(profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top_functions]
+        return [
+            {'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+             'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)}
+            for (filename, line, function), (_, calls, tottime, cumtime, _) in rows
+        ]
+    
+    def write(self, path):
+        """Write report() as JSON; returns the path (None when disabled)"""
+        if not self.enabled:
+            return None
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        self.close()
+        return path
+    
+    def close(self):
+        """Stop tracemalloc if this profiler started it"""
+        if self._started_tracing:
+            _tracemalloc.stop()
+            self._started_tracing = False
+    
+    def format_report(self, limit=None):
+        """Phases as printable lines, slowest first"""
+        report = self.report()
+        phases = sorted(report['phases'].items(), key=lambda item: item[1]['wall_seconds'], reverse=True)
+        lines = []
+        for path, entry in phases[:limit]:
+            line = f"{path:<32} {entry['wall_seconds']:>9.3f}s {entry['share'] or 0:>6.1%}  ({entry['calls']} calls)"
+            if 'memory_peak_mb' in entry:
+                line += f"  peak {entry['memory_peak_mb']:.1f} MB"
+            lines.append(line)
+        return lines
+
+
+def profile_path(output_file):
+    """Report path next to an output file: data.parquet -> data.profile.json"""
+    return os.path.splitext(output_file)[0] + '.profile.json'
@@ -0,0 +1,260 @@
+# utils/storage.py
+"""
+Columnar storage for simulation and forecast tables
+
+Parquet (via pyarrow) is the working format: timestamps stay typed, zone
+columns are dictionary-encoded and physics columns are float32, so loads
+skip CSV parsing and can read only the columns, time range and zones a
+caller needs. CSV remains available as an export format; readers fall back
+to a .csv file with the same name when no .parquet exists.
+
+TableWriter streams large tables to disk in fixed-size batches.
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ('zone_id', 'zone_name')
+FLOAT32_COLUMNS = (
+    'hvac_setpoint', 'indoor_temp', 'hvac_power', 'base_load', 'total_consumption',
+    'solar_used', 'grid_used', 'outdoor_temp', 'solar_forecast'
+)
+FORMATS = ('.parquet', '.csv')
+
+
+def optimize_frame(frame, float32=True):
+    """Typed timestamps, categorical zone columns and float32 physics columns"""
+    frame = frame.copy()
+    if 'timestamp' in frame and not pd.api.types.is_datetime64_any_dtype(frame['timestamp']):
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    for column in CATEGORICAL_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype('category')
+    if float32:
+        for column in FLOAT32_COLUMNS:
+            if column in frame and pd.api.types.is_float_dtype(frame[column]):
+                frame[column] = frame[column].astype('float32')
+    return frame
+
+
+def resolve_path(path):
+    """path if it exists, else the same name in the other supported format"""
+    if os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(path)
+    for other in FORMATS:
+        if other != ext and os.path.exists(stem + other):
+            return stem + other
+    raise FileNotFoundError(path)
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def write_table(frame, path, float32=True, row_group_size=96 * 8 * 7):
+    """
+    Write a table as Parquet or CSV (chosen by extension); returns the path written
+    
+    Parquet rows are sorted by time so row-group statistics make time-range
+    filters cheap. Without pyarrow a .parquet request is written as CSV.
+    CSV exports keep full precision.
+    """
+    stem, ext = os.path.splitext(path)
+    
+    if ext == '.parquet':
+        pa = _arrow()
+        if pa is None:
+            print(f"   ⚠️  pyarrow not installed, writing {stem}.csv instead")
+            path, ext = stem + '.csv', '.csv'
+        else:
+            frame = optimize_frame(frame, float32=float32)
+            if 'timestamp' in frame:
+                frame = frame.sort_values('timestamp', kind='stable')
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            pa.parquet.write_table(table, path, row_group_size=row_group_size, compression='zstd')
+            return path
+    
+    if ext == '.csv':
+        frame.to_csv(path, index=False)
+        return path
+    raise ValueError(f"Unsupported table format: {path} (use one of {FORMATS})")
+
+
+def read_table(path, columns=None, start=None, end=None, zones=None, memory_map=True, float32=True):
+    """
+    Load a table written by write_table (or a legacy CSV)
+    
+    columns: only read these columns (projection)
+    start/end: keep rows with start <= timestamp < end
+    zones: keep rows whose zone_id is in this list
+    For Parquet the filters are pushed down to row groups and the file is
+    memory-mapped; for CSV they are applied after parsing.
+    """
+    path = resolve_path(path)
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    
+    if path.endswith('.parquet'):
+        pa = _arrow()
+        if pa is None:
+            raise ImportError("Reading Parquet tables requires pyarrow (pip install pyarrow)")
+        filters = []
+        if start is not None:
+            filters.append(('timestamp', '>=', start))
+        if end is not None:
+            filters.append(('timestamp', '<', end))
+        if zones is not None:
+            filters.append(('zone_id', 'in', list(zones)))
+        table = pa.parquet.read_table(path, columns=columns, filters=filters or None,
+                                      memory_map=memory_map)
+        frame = table.to_pandas()
+    else:
+        needed = None
+        if columns is not None:
+            needed = set(columns) | ({'timestamp'} if start is not None or end is not None else set())
+            needed |= {'zone_id'} if zones is not None else set()
+        frame = pd.read_csv(path, usecols=None if needed is None else lambda column: column in needed)
+        mask = pd.Series(True, index=frame.index)
+        timestamps = pd.to_datetime(frame['timestamp']) if (start is not None or end is not None) else None
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps < end
+        if zones is not None:
+            mask &= frame['zone_id'].isin(list(zones))
+        frame = frame[mask].reset_index(drop=True)
+        if columns is not None:
+            frame = frame[[column for column in columns if column in frame]]
+    
+    frame = optimize_frame(frame, float32=float32)
+    for column in CATEGORICAL_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].cat.remove_unused_categories()
+    return frame
+
+
+class TableWriter:
+    """
+    Append column batches to a table without holding the whole table in memory
+    
+    Batches are buffered until batch_rows rows are pending, then written as a
+    numbered part file in <path>.parts/. state() describes the committed parts
+    so an interrupted run can reopen the writer with resume=state and carry
+    on; close() stitches the parts into `path` one at a time.
+    """
+    def __init__(self, path, float32=True, batch_rows=50000, resume=None):
+        stem, ext = os.path.splitext(path)
+        if ext == '.parquet' and _arrow() is None:
+            print(f"   ⚠️  pyarrow not installed, writing {stem}.csv instead")
+            path, ext = stem + '.csv', '.csv'
+        if ext not in FORMATS:
+            raise ValueError(f"Unsupported table format: {path} (use one of {FORMATS})")
+        
+        self.path = path
+        self.ext = ext
+        self.float32 = float32
+        self.batch_rows = batch_rows
+        self.parts_dir = path + '.parts'
+        
+        self._buffer = []
+        self._buffered = 0
+        self.parts = resume['parts'] if resume else 0
+        self.rows_written = resume['rows'] if resume else 0
+        
+        if not resume and os.path.isdir(self.parts_dir):
+            shutil.rmtree(self.parts_dir)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        
+        # Drop parts written after the last checkpoint
+        for name in os.listdir(self.parts_dir):
+            if self._part_index(name) is None or self._part_index(name) >= self.parts:
+                os.remove(os.path.join(self.parts_dir, name))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+    
+    def _part_path(self, index):
+        return os.path.join(self.parts_dir, f'part-{index:05d}{self.ext}')
+    
+    def _part_index(self, name):
+        stem, ext = os.path.splitext(name)
+        if ext != self.ext or not stem.startswith('part-') or not stem[5:].isdigit():
+            return None
+        return int(stem[5:])
+    
+    def state(self):
+        """Committed parts and rows, for checkpointing"""
+        return {'parts': self.parts, 'rows': self.rows_written}
+    
+    def append(self, columns):
+        """Buffer a batch ({column: array}); returns True if buffered rows were flushed"""
+        self._buffer.append(columns)
+        self._buffered += len(next(iter(columns.values())))
+        if self._buffered >= self.batch_rows:
+            self.flush()
+            return True
+        return False
+    
+    def flush(self):
+        if not self._buffer:
+            return
+        frame = pd.DataFrame({column: np.concatenate([batch[column] for batch in self._buffer])
+                              for column in self._buffer[0]})
+        part = self._part_path(self.parts)
+        tmp = part + '.tmp'
+        if self.ext == '.parquet':
+            frame = optimize_frame(frame, float32=self.float32)
+            _arrow().parquet.write_table(_arrow().Table.from_pandas(frame, preserve_index=False), tmp,
+                                         compression='zstd')
+        else:
+            frame.to_csv(tmp, index=False)
+        os.replace(tmp, part)
+        
+        self.parts += 1
+        self.rows_written += len(frame)
+        self._buffer = []
+        self._buffered = 0
+    
+    def close(self):
+        """
+        Flush pending rows and merge the parts into the output file; returns
+        its path, or None when no rows were written (no file is created, as
+        an empty table has no columns to write)
+        """
+        self.flush()
+        parts = [self._part_path(i) for i in range(self.parts)]
+        if not parts:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            return None
+        
+        if self.ext == '.parquet':
+            pq = _arrow().parquet
+            writer = None
+            for part in parts:
+                table = pq.read_table(part, memory_map=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(self.path, table.schema, compression='zstd')
+                writer.write_table(table.cast(writer.schema))
+            if writer is not None:
+                writer.close()
+        else:
+            with open(self.path, 'wb') as out:
+                for i, part in enumerate(parts):
+                    with open(part, 'rb') as f:
+                        if i > 0:
+                            f.readline()  # header
+                        shutil.copyfileobj(f, out)
+        
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return self.path
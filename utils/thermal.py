@@ -0,0 +1,79 @@
+# utils/thermal.py
+"""
+Closed-form propagation of the linear zone thermal model
+
+Between control decisions HVAC power is constant, so every zone follows
+    C dT/dt = P - k (T - T_out) - G
+with C the thermal mass (kWh/°C), k the envelope loss coefficient (kW/°C)
+and G the internal heat gain (kW). One step of length dt is an affine map
+    T[n+1] = phi * T[n] + gain * (P + k T_out[n] - G[n])
+which lets N steps be computed with a few array operations instead of N
+Python-level ticks.
+"""
+import numpy as np
+
+METHODS = ('euler', 'exponential')
+
+
+def transition(thermal_mass, loss_coeff, dt=0.25, method='euler'):
+    """Per-step decay factor and input gain for each zone
+    
+    'euler' reproduces explicit Euler at step dt exactly; 'exponential' is
+    the exact solution for inputs held constant over each step.
+    """
+    thermal_mass = np.asarray(thermal_mass, dtype=float)
+    loss_coeff = np.asarray(loss_coeff, dtype=float)
+    
+    if method == 'euler':
+        phi = 1 - loss_coeff * dt / thermal_mass
+        gain = np.full_like(phi, dt) / thermal_mass
+    elif method == 'exponential':
+        phi = np.exp(-loss_coeff * dt / thermal_mass)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = np.where(loss_coeff > 0, (1 - phi) / loss_coeff, dt / thermal_mass)
+    else:
+        raise ValueError(f"Unknown integration method '{method}', expected one of {METHODS}")
+    
+    return phi, gain
+
+
+def propagate_temperature(indoor_temp, hvac_power, heat_gain, outdoor_temp, thermal_mass,
+                          loss_coeff, dt=0.25, method='euler', tolerance=None, block=64):
+    """Indoor temperature after each of N steps with HVAC power held constant
+    
+    indoor_temp, hvac_power, thermal_mass, loss_coeff: shape (Z,)
+    heat_gain: shape (N, Z); outdoor_temp: shape (N,) or (N, Z)
+    Returns an (N, Z) array. With method='exponential' and a tolerance, the
+    result is checked against Euler and a ValueError is raised if any zone
+    drifts further than tolerance (°C).
+    """
+    indoor_temp = np.atleast_1d(np.asarray(indoor_temp, dtype=float))
+    heat_gain = np.asarray(heat_gain, dtype=float)
+    n_steps = heat_gain.shape[0]
+    outdoor_temp = np.asarray(outdoor_temp, dtype=float)
+    if outdoor_temp.ndim == 1:
+        outdoor_temp = outdoor_temp[:, None]
+    
+    phi, gain = transition(thermal_mass, loss_coeff, dt, method)
+    forcing = gain * (np.asarray(hvac_power, dtype=float) + loss_coeff * outdoor_temp - heat_gain)
+    
+    # Process in blocks so the (n, n, Z) weight tensor stays small on long horizons
+    temps = np.empty((n_steps, indoor_temp.shape[0]))
+    state = indoor_temp
+    for start in range(0, n_steps, block):
+        u = forcing[start:start + block]
+        n = u.shape[0]
+        lag = np.arange(n)[:, None] - np.arange(n)[None, :]  # n - j for output n, input j
+        weights = np.where(lag[..., None] >= 0, phi ** np.maximum(lag, 0)[..., None], 0.0)
+        temps[start:start + n] = phi ** np.arange(1, n + 1)[:, None] * state + np.einsum('njz,jz->nz', weights, u)
+        state = temps[start + n - 1]
+    
+    if tolerance is not None and method != 'euler':
+        reference = propagate_temperature(indoor_temp, hvac_power, heat_gain, outdoor_temp,
+                                          thermal_mass, loss_coeff, dt, 'euler', block=block)
+        drift = np.abs(temps - reference).max() if n_steps else 0.0
+        if drift > tolerance:
+            raise ValueError(f"{method} integration drifted {drift:.4f}°C from Euler "
+                             f"(tolerance {tolerance}°C)")
+    
+    return temps
@@ -0,0 +1,67 @@
+# utils/timeseries_index.py
+"""
+(zone_id, timestamp) index over the simulation records
+
+Rows are sorted once by zone and time and each zone keeps its own sorted
+timestamp array, so the current state and the lookahead window of a zone
+are binary searches plus a contiguous slice instead of full-table scans.
+"""
+import numpy as np
+import pandas as pd
+
+
+class ZoneTimeIndex:
+    def __init__(self, frame, zone_column='zone_id', time_column='timestamp'):
+        frame = frame.copy()
+        frame[time_column] = pd.to_datetime(frame[time_column])
+        self.frame = frame.sort_values([zone_column, time_column], kind='stable').reset_index(drop=True)
+        self.zone_column = zone_column
+        self.time_column = time_column
+        
+        zones = self.frame[zone_column].to_numpy()
+        times = self.frame[time_column].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        starts = np.flatnonzero(np.r_[True, zones[1:] != zones[:-1]]) if len(zones) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(zones)]
+        
+        # zone_id -> (first row, sorted timestamps as int64 ns)
+        self._zones = {zones[s]: (s, times[s:e]) for s, e in zip(starts, ends)}
+    
+    def __len__(self):
+        return len(self.frame)
+    
+    @property
+    def zone_ids(self):
+        return list(self._zones)
+    
+    @staticmethod
+    def _key(timestamp):
+        return pd.Timestamp(timestamp).as_unit('ns').value
+    
+    def position(self, zone_id, timestamp):
+        """Row number of (zone_id, timestamp), or None if absent"""
+        if zone_id not in self._zones:
+            return None
+        start, times = self._zones[zone_id]
+        key = self._key(timestamp)
+        i = np.searchsorted(times, key)
+        if i < len(times) and times[i] == key:
+            return start + int(i)
+        return None
+    
+    def row(self, zone_id, timestamp):
+        """Record of one zone at one timestamp (Series), or None"""
+        pos = self.position(zone_id, timestamp)
+        return None if pos is None else self.frame.iloc[pos]
+    
+    def at(self, timestamp, zone_ids=None):
+        """All (or the given) zones' records at a timestamp, in zone order"""
+        positions = [self.position(zone_id, timestamp) for zone_id in (zone_ids or self._zones)]
+        return self.frame.iloc[[p for p in positions if p is not None]]
+    
+    def after(self, zone_id, timestamp, steps=16):
+        """Next `steps` records of a zone strictly after timestamp"""
+        if zone_id not in self._zones:
+            return self.frame.iloc[0:0]
+        start, times = self._zones[zone_id]
+        i = int(np.searchsorted(times, self._key(timestamp), side='right'))
+        return self.frame.iloc[start + i:start + min(i + steps, len(times))]
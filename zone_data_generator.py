@@ -1,15 +1,24 @@
 # zone_data_generator.py
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.storage import write_table, read_table, resolve_path
 
 class ZoneDataGenerator:
     """Generates realistic zone-specific occupancy and consumption patterns"""
     
-    def __init__(self, start_date, days=1):
+    # Zone capacities (people), matching MultiZoneUniversity
+    ZONE_CAPACITIES = {
+        'engineering': 150, 'library': 200, 'admin': 80,
+        'science_floor1': 100, 'science_floor2': 100,
+        'cafeteria': 250, 'dorms_east': 120, 'dorms_west': 120
+    }
+    
+    def __init__(self, start_date, days=1, seed=None):
         self.start_date = start_date
         self.days = days
         self.timesteps = int(days * 24 * 4)  # 15-min intervals
+        self.seed = seed
         
         # Zone-specific profiles
         self.zone_profiles = {
@@ -22,138 +31,153 @@ class ZoneDataGenerator:
             'dorms_east': {'peak_hours': (18, 23), 'evening_activity': 0.8, 'weekend_factor': 0.9},
             'dorms_west': {'peak_hours': (18, 23), 'evening_activity': 0.8, 'weekend_factor': 0.9},
         }
+    
+    def generate_dataset(self, rng=None):
+        """Generate zone-specific data for entire campus
         
-    def generate_dataset(self):
-        """Generate zone-specific data for entire campus"""
+        Builds every column at once from hour-of-day/weekday arrays. Pass a
+        np.random.Generator (or set seed in the constructor) for
+        reproducible output.
+        """
+        if rng is None:
+            rng = np.random.default_rng(self.seed)
         
-        timestamps = [self.start_date + timedelta(minutes=15*i) 
-                     for i in range(self.timesteps)]
+        timestamps = pd.date_range(self.start_date, periods=self.timesteps, freq='15min')
+        hour = (timestamps.hour + timestamps.minute / 60).to_numpy(dtype=float)
         
-        data = []
-        for i, ts in enumerate(timestamps):
-            hour = ts.hour + ts.minute / 60
-            
+        data = {
+            'timestamp': timestamps,
             # Campus-wide data
-            solar = self._generate_solar(hour)
-            outdoor_temp = self._generate_temperature(hour)
-            price = self._generate_price(hour)
-            carbon_intensity = self._generate_carbon_intensity(hour)
-            
-            # Zone-specific occupancy
-            zone_occupancies = {}
-            for zone_id, profile in self.zone_profiles.items():
-                zone_occupancies[zone_id] = self._generate_zone_occupancy(ts, zone_id, profile)
-            
-            data.append({
-                'timestamp': ts,
-                'solar_forecast': solar,
-                'outdoor_temp': outdoor_temp,
-                'electricity_price': price,
-                'grid_carbon_intensity': carbon_intensity,
-                **{f'{zone_id}_occupancy': occ for zone_id, occ in zone_occupancies.items()}
-            })
+            'solar_forecast': self._generate_solar(hour, rng),
+            'outdoor_temp': self._generate_temperature(hour, rng),
+            'electricity_price': self._generate_price(hour, rng),
+            'grid_carbon_intensity': self._generate_carbon_intensity(hour, rng),
+        }
+        
+        # Zone-specific occupancy (timestamp x zone)
+        occupancy = self.generate_occupancy_matrix(timestamps, rng)
+        for i, zone_id in enumerate(self.zone_profiles):
+            data[f'{zone_id}_occupancy'] = occupancy[:, i]
         
         return pd.DataFrame(data)
     
-    def save_to_csv(self, filename='zone_forecast_data.csv'):
-        """Generate and save dataset to CSV file"""
+    def generate_occupancy_matrix(self, timestamps, rng):
+        """Occupancy for every timestamp and zone, shape (len(timestamps), zones)"""
+        hour = np.asarray(timestamps.hour)
+        is_weekend = np.asarray(timestamps.weekday) >= 5
+        
+        return np.column_stack([
+            self._generate_zone_occupancy(hour, is_weekend, zone_id, profile, rng)
+            for zone_id, profile in self.zone_profiles.items()
+        ])
+    
+    def save(self, filename='zone_forecast_data.parquet'):
+        """Generate and save dataset (Parquet or CSV, by extension)"""
         print(f"📊 Generating zone forecast data...")
         data = self.generate_dataset()
-        data.to_csv(filename, index=False)
+        filename = write_table(data, filename, float32=False)
         print(f"✅ Saved {len(data)} timesteps to {filename}")
         return data
     
+    def save_to_csv(self, filename='zone_forecast_data.csv'):
+        """Generate and save dataset to CSV file"""
+        return self.save(filename)
+    
     @staticmethod
-    def load_from_csv(filename='zone_forecast_data.csv'):
-        """Load previously generated dataset from CSV"""
+    def load(filename='zone_forecast_data.parquet', columns=None, start=None, end=None):
+        """Load previously generated dataset (falls back to a CSV with the same name)"""
         try:
-            data = pd.read_csv(filename)
-            data['timestamp'] = pd.to_datetime(data['timestamp'])
-            print(f"✅ Loaded {len(data)} timesteps from {filename}")
+            data = read_table(filename, columns=columns, start=start, end=end, float32=False)
+            print(f"✅ Loaded {len(data)} timesteps from {resolve_path(filename)}")
             return data
         except FileNotFoundError:
-            print(f"❌ File {filename} not found. Generate new data with save_to_csv()")
+            print(f"❌ File {filename} not found. Generate new data with save()")
             return None
     
-    def _generate_zone_occupancy(self, timestamp, zone_id, profile):
-        """Generate realistic occupancy for specific zone"""
-        hour = timestamp.hour
-        day_of_week = timestamp.weekday()
+    @staticmethod
+    def load_from_csv(filename='zone_forecast_data.csv'):
+        """Load previously generated dataset from CSV"""
+        return ZoneDataGenerator.load(filename)
+    
+    def _generate_zone_occupancy(self, hour, is_weekend, zone_id, profile, rng):
+        """Generate realistic occupancy for specific zone (hour: integer hour array)"""
+        n = len(hour)
         
         # Get zone capacity
-        capacities = {
-            'engineering': 150, 'library': 200, 'admin': 80,
-            'science_floor1': 100, 'science_floor2': 100,
-            'cafeteria': 250, 'dorms_east': 120, 'dorms_west': 120
-        }
-        capacity = capacities.get(zone_id, 100)
+        capacity = self.ZONE_CAPACITIES.get(zone_id, 100)
         
         # Weekend factor
-        is_weekend = day_of_week >= 5
-        weekend_mult = profile['weekend_factor'] if is_weekend else 1.0
+        weekend_mult = np.where(is_weekend, profile['weekend_factor'], 1.0)
         
         # Time-based occupancy
         peak_start, peak_end = profile['peak_hours']
+        peak = (peak_start <= hour) & (hour <= peak_end)
+        evening = (peak_end < hour) & (hour <= 22)
         
-        if peak_start <= hour <= peak_end:
-            # Peak hours
-            base_occupancy = np.random.uniform(0.5, 0.8) * capacity
-        elif peak_end < hour <= 22:
-            # Evening
-            base_occupancy = profile['evening_activity'] * capacity * np.random.uniform(0.3, 0.7)
-        else:
-            # Night/early morning
-            base_occupancy = np.random.uniform(0, 0.1) * capacity
+        base_occupancy = np.select(
+            [peak, evening],
+            [rng.uniform(0.5, 0.8, n) * capacity,  # Peak hours
+             profile['evening_activity'] * capacity * rng.uniform(0.3, 0.7, n)],  # Evening
+            rng.uniform(0, 0.1, n) * capacity  # Night/early morning
+        )
         
         # Special case for cafeteria - meal peaks
         if zone_id == 'cafeteria':
-            if 7 <= hour <= 9:  # Breakfast
-                base_occupancy = capacity * np.random.uniform(0.3, 0.5)
-            elif 11.5 <= hour <= 13.5:  # Lunch peak
-                base_occupancy = capacity * np.random.uniform(0.7, 0.95)
-            elif 17.5 <= hour <= 19:  # Dinner
-                base_occupancy = capacity * np.random.uniform(0.5, 0.7)
-            elif 19 < hour or hour < 7:
-                base_occupancy = capacity * np.random.uniform(0, 0.05)
+            base_occupancy = np.select(
+                [(7 <= hour) & (hour <= 9),  # Breakfast
+                 (11.5 <= hour) & (hour <= 13.5),  # Lunch peak
+                 (17.5 <= hour) & (hour <= 19),  # Dinner
+                 (19 < hour) | (hour < 7)],
+                [capacity * rng.uniform(0.3, 0.5, n),
+                 capacity * rng.uniform(0.7, 0.95, n),
+                 capacity * rng.uniform(0.5, 0.7, n),
+                 capacity * rng.uniform(0, 0.05, n)],
+                base_occupancy
+            )
         
         # Dorms have inverse pattern - more people at night
         if 'dorm' in zone_id:
-            if 0 <= hour <= 7 or hour >= 22:  # Sleep hours
-                base_occupancy = capacity * np.random.uniform(0.7, 0.95)
-            elif 8 <= hour <= 17:  # Class hours - mostly empty
-                base_occupancy = capacity * np.random.uniform(0.1, 0.3)
-            else:  # Evening - people returning
-                base_occupancy = capacity * np.random.uniform(0.4, 0.7)
+            base_occupancy = np.select(
+                [((0 <= hour) & (hour <= 7)) | (hour >= 22),  # Sleep hours
+                 (8 <= hour) & (hour <= 17)],  # Class hours - mostly empty
+                [capacity * rng.uniform(0.7, 0.95, n),
+                 capacity * rng.uniform(0.1, 0.3, n)],
+                capacity * rng.uniform(0.4, 0.7, n)  # Evening - people returning
+            )
         
-        final_occupancy = int(base_occupancy * weekend_mult)
-        return max(0, final_occupancy)
+        final_occupancy = (base_occupancy * weekend_mult).astype(int)
+        return np.maximum(0, final_occupancy)
     
-    def _generate_solar(self, hour):
+    def _generate_solar(self, hour, rng):
         """Solar generation pattern (kW)"""
-        if 6 <= hour <= 18:
-            return 300 * np.sin(np.pi * (hour - 6) / 12) * np.random.uniform(0.8, 1.0)
-        return 0
+        daylight = (6 <= hour) & (hour <= 18)
+        solar = 300 * np.sin(np.pi * (hour - 6) / 12) * rng.uniform(0.8, 1.0, len(hour))
+        return np.where(daylight, solar, 0.0)
     
-    def _generate_temperature(self, hour):
+    def _generate_temperature(self, hour, rng):
         """Outdoor temperature (°C)"""
         base_temp = 18
         variation = 8 * np.sin(np.pi * (hour - 6) / 12)
-        return base_temp + variation + np.random.uniform(-1, 1)
+        return base_temp + variation + rng.uniform(-1, 1, len(hour))
     
-    def _generate_price(self, hour):
+    def _generate_price(self, hour, rng):
         """Electricity price ($/kWh)"""
-        if (9 <= hour <= 11) or (17 <= hour <= 20):
-            return np.random.uniform(0.25, 0.35)  # Peak
-        elif 0 <= hour <= 6:
-            return np.random.uniform(0.08, 0.12)  # Off-peak
-        else:
-            return np.random.uniform(0.15, 0.20)  # Mid-peak
+        n = len(hour)
+        return np.select(
+            [((9 <= hour) & (hour <= 11)) | ((17 <= hour) & (hour <= 20)),  # Peak
+             (0 <= hour) & (hour <= 6)],  # Off-peak
+            [rng.uniform(0.25, 0.35, n),
+             rng.uniform(0.08, 0.12, n)],
+            rng.uniform(0.15, 0.20, n)  # Mid-peak
+        )
     
-    def _generate_carbon_intensity(self, hour):
+    def _generate_carbon_intensity(self, hour, rng):
         """Grid carbon intensity (gCO2/kWh)"""
-        if 17 <= hour <= 21:
-            return np.random.uniform(600, 800)
-        elif 10 <= hour <= 15:
-            return np.random.uniform(300, 450)
-        else:
-            return np.random.uniform(450, 600)
+        n = len(hour)
+        return np.select(
+            [(17 <= hour) & (hour <= 21),
+             (10 <= hour) & (hour <= 15)],
+            [rng.uniform(600, 800, n),
+             rng.uniform(300, 450, n)],
+            rng.uniform(450, 600, n)
+        )